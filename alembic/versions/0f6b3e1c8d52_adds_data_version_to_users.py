@@ -0,0 +1,27 @@
+"""Adds data_version to users
+
+Revision ID: 0f6b3e1c8d52
+Revises: d81c2f4a9e07
+Create Date: 2026-10-16 11:24:03.118570
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0f6b3e1c8d52"
+down_revision = "d81c2f4a9e07"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "user",
+        sa.Column("data_version", sa.BigInteger(), server_default="0", nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_column("user", "data_version")
@@ -0,0 +1,45 @@
+"""Adds page validators and when metadata was last fetched to links
+
+Revision ID: 2b7e9c4f1a38
+Revises: 8d4c7b2e5f16
+Create Date: 2026-10-17 16:42:11.904512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "2b7e9c4f1a38"
+down_revision = "8d4c7b2e5f16"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "link", sa.Column("metadata_checked_at", sa.DateTime(), nullable=True)
+    )
+    op.add_column("link", sa.Column("etag", sa.String(length=256), nullable=True))
+    op.add_column(
+        "link", sa.Column("last_modified", sa.String(length=64), nullable=True)
+    )
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_link_metadata_refresh",
+            "link",
+            ["read", sa.text("date_added DESC"), sa.text("id DESC")],
+            postgresql_where=sa.text("metadata_checked_at IS NOT NULL"),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_link_metadata_refresh", table_name="link", postgresql_concurrently=True
+        )
+    op.drop_column("link", "last_modified")
+    op.drop_column("link", "etag")
+    op.drop_column("link", "metadata_checked_at")
@@ -0,0 +1,128 @@
+"""Adds url_hash to links
+
+Revision ID: 3e8f1a6c0d94
+Revises: 6c2d9a7e4b13
+Create Date: 2026-10-17 10:41:26.853190
+
+"""
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "3e8f1a6c0d94"
+down_revision = "6c2d9a7e4b13"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+# URL normalization as of this revision (copied from src.links.urls, which
+# may change later without changing what this backfill does):
+TRACKING_PARAMS = {
+    "fbclid",
+    "gclid",
+    "dclid",
+    "msclkid",
+    "yclid",
+    "igshid",
+    "mc_cid",
+    "mc_eid",
+    "_hsenc",
+    "_hsmi",
+    "ref_src",
+}
+TRACKING_PARAM_PREFIXES = ("utm_",)
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def is_tracking_param(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PARAM_PREFIXES)
+
+
+def normalize_url(url):
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+
+    path = parts.path.rstrip("/") or "/"
+    params = sorted(
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not is_tracking_param(name)
+    )
+    query = f"?{urlencode(params)}" if params else ""
+    fragment = f"#{parts.fragment}" if parts.fragment[:1] in ("!", "/") else ""
+
+    prefix = "" if scheme in DEFAULT_PORTS else f"{scheme}://"
+    return f"{prefix}{host}{path}{query}{fragment}"
+
+
+def url_hash(url):
+    return hashlib.sha1(normalize_url(url).encode("utf-8")).hexdigest()
+
+
+def upgrade():
+    op.add_column("link", sa.Column("url_hash", sa.String(length=40), nullable=True))
+
+    # Hash existing URLs in batches (normalizing them needs Python):
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.text(
+                "SELECT id, url FROM link WHERE id > :last_id ORDER BY id LIMIT :limit"
+            ),
+            {"last_id": last_id, "limit": BATCH_SIZE},
+        ).fetchall()
+        if not rows:
+            break
+        connection.execute(
+            sa.text("UPDATE link SET url_hash = :url_hash WHERE id = :id"),
+            [{"id": row.id, "url_hash": url_hash(row.url)} for row in rows],
+        )
+        last_id = rows[-1].id
+
+    # Only the most recently added copy of an already-duplicated URL keeps its
+    # hash, so the unique index can be built:
+    op.execute(
+        """
+        UPDATE link SET url_hash = NULL
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY user_id, url_hash
+                    ORDER BY date_added DESC, id DESC
+                ) AS copy_number
+                FROM link
+                WHERE url_hash IS NOT NULL
+            ) AS copies
+            WHERE copy_number > 1
+        )
+        """
+    )
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_link_user_url_hash",
+            "link",
+            ["user_id", "url_hash"],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_link_user_url_hash", table_name="link", postgresql_concurrently=True
+        )
+    op.drop_column("link", "url_hash")
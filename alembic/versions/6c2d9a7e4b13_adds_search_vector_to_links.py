@@ -0,0 +1,55 @@
+"""Adds search_vector to links
+
+Revision ID: 6c2d9a7e4b13
+Revises: 0f6b3e1c8d52
+Create Date: 2026-10-17 09:12:48.204716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "6c2d9a7e4b13"
+down_revision = "0f6b3e1c8d52"
+branch_labels = None
+depends_on = None
+
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B') || "
+    "setweight(to_tsvector('simple', regexp_replace("
+    "regexp_replace(url, '^[a-z]+://(www\\.)?', '', 'i'), "
+    "'[^[:alnum:]]+', ' ', 'g')), 'C')"
+)
+
+
+def upgrade():
+    # Adding a stored generated column rewrites the link table, filling in
+    # search_vector for existing links:
+    op.add_column(
+        "link",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed(SEARCH_VECTOR, persisted=True),
+            nullable=True,
+        ),
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_link_search_vector",
+            "link",
+            ["search_vector"],
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_link_search_vector", table_name="link", postgresql_concurrently=True
+        )
+    op.drop_column("link", "search_vector")
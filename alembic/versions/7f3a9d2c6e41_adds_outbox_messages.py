@@ -0,0 +1,32 @@
+"""Adds the outbox of tasks to send to the broker
+
+Revision ID: 7f3a9d2c6e41
+Revises: 2b7e9c4f1a38
+Create Date: 2026-10-17 18:05:37.220914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "7f3a9d2c6e41"
+down_revision = "2b7e9c4f1a38"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "outbox_message",
+        sa.Column("id", sa.BigInteger(), nullable=False),
+        sa.Column("task", sa.String(length=255), nullable=False),
+        sa.Column("args", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade():
+    op.drop_table("outbox_message")
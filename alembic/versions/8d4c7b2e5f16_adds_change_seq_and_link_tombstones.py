@@ -0,0 +1,73 @@
+"""Adds change_seq to links and collections, and link tombstones
+
+Revision ID: 8d4c7b2e5f16
+Revises: 3e8f1a6c0d94
+Create Date: 2026-10-17 12:18:04.517326
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "8d4c7b2e5f16"
+down_revision = "3e8f1a6c0d94"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows start at 0, so they're all included in a first sync:
+    op.add_column(
+        "link",
+        sa.Column("change_seq", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "collection",
+        sa.Column("change_seq", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+    op.create_table(
+        "link_tombstone",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("link_id", sa.Integer(), nullable=False),
+        sa.Column("change_seq", sa.BigInteger(), nullable=False),
+        sa.Column("deleted_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_link_tombstone_user_change_seq",
+        "link_tombstone",
+        ["user_id", "change_seq", "id"],
+    )
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_link_user_change_seq",
+            "link",
+            ["user_id", "change_seq", "id"],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_collection_user_change_seq",
+            "collection",
+            ["user_id", "change_seq", "id"],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_collection_user_change_seq",
+            table_name="collection",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_link_user_change_seq", table_name="link", postgresql_concurrently=True
+        )
+    op.drop_index("ix_link_tombstone_user_change_seq", table_name="link_tombstone")
+    op.drop_table("link_tombstone")
+    op.drop_column("collection", "change_seq")
+    op.drop_column("link", "change_seq")
@@ -0,0 +1,63 @@
+"""Adds link counters to users and collections
+
+Revision ID: b4e5d0f3fedb
+Revises: a5ce356ac45f
+Create Date: 2026-10-16 09:12:40.318224
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b4e5d0f3fedb"
+down_revision = "a5ce356ac45f"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ("user", "collection"):
+        op.add_column(
+            table,
+            sa.Column("link_count", sa.Integer(), server_default="0", nullable=False),
+        )
+        op.add_column(
+            table,
+            sa.Column(
+                "read_link_count", sa.Integer(), server_default="0", nullable=False
+            ),
+        )
+
+    # Backfill counters from existing links:
+    op.execute(
+        """
+        update "user" set
+            link_count = (select count(*) from link where link.user_id = "user".id),
+            read_link_count = (
+                select count(*) from link where link.user_id = "user".id and link.read
+            )
+        """
+    )
+    op.execute(
+        """
+        update collection set
+            link_count = (
+                select count(*) from link
+                where link.collection_id = collection.id
+                and link.user_id = collection.user_id
+            ),
+            read_link_count = (
+                select count(*) from link
+                where link.collection_id = collection.id
+                and link.user_id = collection.user_id
+                and link.read
+            )
+        """
+    )
+
+
+def downgrade():
+    for table in ("collection", "user"):
+        op.drop_column(table, "read_link_count")
+        op.drop_column(table, "link_count")
@@ -0,0 +1,61 @@
+"""Adds indexes for link listing
+
+Revision ID: d81c2f4a9e07
+Revises: b4e5d0f3fedb
+Create Date: 2026-10-16 10:02:17.540391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d81c2f4a9e07"
+down_revision = "b4e5d0f3fedb"
+branch_labels = None
+depends_on = None
+
+NEWEST_FIRST = [sa.text("date_added DESC"), sa.text("id DESC")]
+NO_COLLECTION = sa.text("collection_id IS NULL")
+
+
+def upgrade():
+    # Build indexes without locking the link table against writes:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_link_user_read_collection_date",
+            "link",
+            ["user_id", "read", "collection_id", *NEWEST_FIRST],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_link_user_collection_date",
+            "link",
+            ["user_id", "collection_id", *NEWEST_FIRST],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_link_user_read_date_no_collection",
+            "link",
+            ["user_id", "read", *NEWEST_FIRST],
+            postgresql_where=NO_COLLECTION,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_link_user_date_no_collection",
+            "link",
+            ["user_id", *NEWEST_FIRST],
+            postgresql_where=NO_COLLECTION,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for index_name in (
+            "ix_link_user_date_no_collection",
+            "ix_link_user_read_date_no_collection",
+            "ix_link_user_collection_date",
+            "ix_link_user_read_collection_date",
+        ):
+            op.drop_index(index_name, table_name="link", postgresql_concurrently=True)
@@ -0,0 +1,2 @@
+"""Micro-benchmarks for hot paths. Not run as part of the test suite.
+"""
@@ -0,0 +1,130 @@
+"""Compares the two ways of serving a page of links from GET /links:
+
+- orm: Link instances dumped with MultipleLinkSchema() and jsonify (the
+  original path)
+- fast: plain rows in LinkRecords, dumped with the compiled serializer and a
+  reused JSON encoder (see src/links/serializers.py)
+
+Serialization is always benchmarked, using synthetic links. Pass --user-id to
+also benchmark loading a page from the database (i.e. after seeding with
+`flask admin dummy --links 1000`):
+
+    $ python -m benchmarks.bench_link_listing --per-page 100 --user-id 1
+"""
+
+import argparse
+import timeit
+from datetime import datetime, timedelta
+from flask import jsonify
+from src import create_app
+from src.model import Link, db
+from src.links.service import LinkService
+from src.links.serializers import (
+    LinkRecord,
+    link_columns,
+    link_page_response,
+    record_columns,
+)
+from src.model import MultipleLinkSchema
+
+
+def synthetic_page(per_page: int) -> tuple:
+    """Returns equivalent pages of Link instances and LinkRecords."""
+    now = datetime.utcnow()
+    values = [
+        {
+            "id": n,
+            "date_added": now - timedelta(hours=n),
+            "url": f"https://example.com/articles/{n}",
+            "user_id": 1,
+            "title": f"An article worth reading later, part {n}",
+            "read": n % 2 == 0,
+            "description": "A description of the article. " * 5,
+            "collection_id": None,
+        }
+        for n in range(per_page)
+    ]
+    column_names = tuple(values[0])
+    page = {
+        "total_links": per_page * 10,
+        "page": 1,
+        "total_pages": 10,
+        "next_page": 2,
+        "per_page": per_page,
+        "next_cursor": (values[-1]["date_added"], values[-1]["id"]),
+    }
+    orm_page = {**page, "links": [Link(**value) for value in values]}
+    rows = [tuple(value.values()) for value in values]
+    fast_page = {**page, "links": LinkRecord.from_rows(column_names, rows)}
+    return orm_page, fast_page
+
+
+def report(name: str, timings: dict, number: int):
+    print(f"\n{name} ({number} runs, best of 5):")
+    for label, seconds in timings.items():
+        print(f"  {label:<5} {seconds / number * 1000:8.3f} ms per page")
+    orm, fast = timings["orm"], timings["fast"]
+    print(f"  fast path is {orm / fast:.1f}x faster")
+
+
+def bench_serialization(per_page: int, number: int):
+    orm_page, fast_page = synthetic_page(per_page)
+    assert (
+        jsonify(MultipleLinkSchema().dump(orm_page)).get_data()
+        == link_page_response(fast_page).get_data()
+    )
+    timings = {
+        "orm": min(
+            timeit.repeat(
+                lambda: jsonify(MultipleLinkSchema().dump(orm_page)).get_data(),
+                number=number,
+                repeat=5,
+            )
+        ),
+        "fast": min(
+            timeit.repeat(
+                lambda: link_page_response(fast_page).get_data(),
+                number=number,
+                repeat=5,
+            )
+        ),
+    }
+    report(f"Serializing {per_page} links", timings, number)
+
+
+def bench_loading(user_id: int, per_page: int, number: int):
+    link_query = (
+        LinkService()
+        .filter_links(user_id, "all")
+        .order_by(Link.date_added.desc(), Link.id.desc())
+        .limit(per_page)
+    )
+    column_names = record_columns()
+
+    def load_orm():
+        db.session.expunge_all()
+        return link_query.all()
+
+    def load_fast():
+        rows = link_query.with_entities(*link_columns(column_names)).all()
+        return LinkRecord.from_rows(column_names, rows)
+
+    timings = {
+        "orm": min(timeit.repeat(load_orm, number=number, repeat=5)),
+        "fast": min(timeit.repeat(load_fast, number=number, repeat=5)),
+    }
+    report(f"Loading {len(load_fast())} links for user {user_id}", timings, number)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--per-page", type=int, default=100)
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args()
+
+    app = create_app("src.config.ProdConfig")
+    with app.app_context():
+        bench_serialization(args.per_page, args.number)
+        if args.user_id:
+            bench_loading(args.user_id, args.per_page, args.number)
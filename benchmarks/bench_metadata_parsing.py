@@ -0,0 +1,100 @@
+"""Compares the two ways of reading a page's title and description:
+
+- parsel: the downloaded text parsed into a DOM with parsel and queried with
+  XPath (the original path)
+- head: the downloaded text fed in chunks to the incremental head parser,
+  which stops as soon as it has what it needs (see src/links/html.py)
+
+Both are given what iter_page_head would download, i.e. the page up to
+`</head>` (or all of it, for pages that don't close their head).
+
+Pages are read from a corpus of saved HTML files, benchmarks/fixtures/html by
+default. Pass --fixtures to benchmark a directory of your own (i.e. pages
+saved from real traffic):
+
+    $ python -m benchmarks.bench_metadata_parsing --number 50
+"""
+
+import argparse
+import codecs
+import timeit
+from pathlib import Path
+from parsel import Selector
+from src.links.fetch import CHUNK_SIZE, HEAD_END
+from src.links.html import parse_head
+
+FIXTURES = Path(__file__).parent / "fixtures" / "html"
+
+
+def parsel_metadata(html: str) -> dict:
+    selector = Selector(text=html)
+    title = selector.xpath("//title/text()").get()
+    description = selector.xpath('//meta[@property="og:description"]/@content').get()
+    if not description:
+        description = selector.xpath('//meta[@name="description"]/@content').get()
+    return {
+        "title": title.strip() if title else None,
+        "description": description.strip() if description else None,
+    }
+
+
+def head_metadata(html: str) -> dict:
+    chunks = (html[i : i + CHUNK_SIZE] for i in range(0, len(html), CHUNK_SIZE))
+    metadata = parse_head(chunks)
+    return {"title": metadata["title"], "description": metadata["description"]}
+
+
+def load_page(path: Path) -> str:
+    body = path.read_bytes()
+    head_end = HEAD_END.search(body)
+    if head_end:
+        body = body[: head_end.end()]
+    encoding = "iso-8859-1" if b"charset=iso-8859-1" in body[:1024] else "utf-8"
+    return codecs.decode(body, encoding)
+
+
+def report(name: str, size: int, timings: dict, number: int):
+    print(f"\n{name} ({size / 1024:.0f} KB, {number} runs, best of 5):")
+    for label, seconds in timings.items():
+        per_page = seconds / number
+        print(
+            f"  {label:<6} {per_page * 1000:8.3f} ms per page"
+            f" {size / per_page / 1024 / 1024:8.1f} MB/s"
+        )
+    parsel, head = timings["parsel"], timings["head"]
+    print(f"  head parser is {parsel / head:.1f}x faster")
+
+
+def bench_page(path: Path, number: int) -> dict:
+    html = load_page(path)
+    parsed = parsel_metadata(html)
+    assert head_metadata(html) == parsed, (path.name, head_metadata(html), parsed)
+    timings = {
+        "parsel": min(
+            timeit.repeat(lambda: parsel_metadata(html), number=number, repeat=5)
+        ),
+        "head": min(
+            timeit.repeat(lambda: head_metadata(html), number=number, repeat=5)
+        ),
+    }
+    report(path.name, len(html), timings, number)
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES)
+    parser.add_argument("--number", type=int, default=50)
+    args = parser.parse_args()
+
+    totals = {"parsel": 0.0, "head": 0.0}
+    size = 0
+    pages = sorted(args.fixtures.glob("*.html"))
+    for path in pages:
+        for label, seconds in bench_page(path, args.number).items():
+            totals[label] += seconds
+        size += len(load_page(path))
+    # Per page, on average:
+    report(
+        f"All {len(pages)} pages", size / len(pages), totals, args.number * len(pages)
+    )
@@ -1,4 +1,14 @@
-from src import celery, create_app
+from celery.signals import worker_process_init
+from src import create_app, init_celery
+from src.model import db
 
 app = create_app()
-app.app_context().push()
+celery = init_celery(app)
+
+
+@worker_process_init.connect
+def reset_database_connections(**kwargs):
+    # Worker processes are forked from this one, and mustn't share its
+    # database connections (which are left open for it):
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -0,0 +1,22 @@
+"""Gunicorn settings for the API (picked up automatically when running
+`gunicorn` from the project directory).
+
+Workers are gevent-based, so requests waiting on the network don't hold a
+worker each. That matters most for GET /v1/events streams, which stay open
+(mostly idle) for as long as a client is connected.
+"""
+
+import os
+
+worker_class = "gevent"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+# Open connections (including event streams) per worker:
+worker_connections = int(os.getenv("WORKER_CONNECTIONS", "1000"))
+
+
+def post_fork(server, worker):
+    # gevent patches sockets, but psycopg2 talks to Postgres from C, so its
+    # waits have to be made cooperative separately:
+    from psycogreen.gevent import patch_psycopg
+
+    patch_psycopg()
@@ -1,7 +1,7 @@
 from marshmallow import ValidationError
 from sqlalchemy.exc import SQLAlchemyError
-from flask import Flask, g
-from celery import Celery
+from flask import Flask, g, has_app_context
+from celery import Celery, Task
 from flask_limiter import Limiter
 from flask_cors import CORS
 from flask_migrate import Migrate
@@ -16,7 +16,33 @@ if find_dotenv():
     load_dotenv()
 
 migrate = Migrate()
-celery = Celery(__name__, broker=CeleryConfig.broker_url)
+
+
+class AppContextTask(Task):
+    """Base class for Celery tasks, running each one in its own app context
+    (pushed from the worker process's app, see init_celery), so its database
+    session is removed once it's done (with the context) instead of being
+    kept across tasks.
+    """
+
+    def __call__(self, *args, **kwargs):
+        # Tasks called directly (i.e. in tests) use the current context:
+        if has_app_context():
+            return super().__call__(*args, **kwargs)
+        with celery.flask_app.app_context():
+            return super().__call__(*args, **kwargs)
+
+
+celery = Celery(__name__, broker=CeleryConfig.broker_url, task_cls=AppContextTask)
+celery.flask_app = None
+
+
+def init_celery(app: Flask) -> Celery:
+    """Sets the app Celery tasks run with in this process (created once per
+    worker, see celery_worker.py).
+    """
+    celery.flask_app = app
+    return celery
 
 
 def create_app(config="src.config.DevConfig", test_config=None):
@@ -35,6 +61,8 @@ def create_app(config="src.config.DevConfig", test_config=None):
     from src.links.blueprint import link_bp
     from src.importer.blueprint import importer_bp
     from src.collections.blueprint import collection_bp
+    from src.sync.blueprint import sync_bp
+    from src.events.blueprint import events_bp
 
     app = Flask(__name__)
     # Load configuration from an object. Note that all sensitive values
@@ -60,6 +88,7 @@ def create_app(config="src.config.DevConfig", test_config=None):
     limiter.limit(link_bp)
     limiter.limit(auth_bp)
     limiter.limit(general_bp)
+    limiter.limit(sync_bp)
     # Enable CORS on all endpoints:
     CORS(app)
     # Register all of our view functions with the app:
@@ -68,6 +97,8 @@ def create_app(config="src.config.DevConfig", test_config=None):
     app.register_blueprint(link_bp, url_prefix="/v1/links")
     app.register_blueprint(importer_bp, url_prefix="/v1/import")
     app.register_blueprint(collection_bp, url_prefix="/v1/collections")
+    app.register_blueprint(sync_bp, url_prefix="/v1/sync")
+    app.register_blueprint(events_bp, url_prefix="/v1/events")
     app.register_blueprint(admin_bp)
     app.teardown_appcontext(teardown_handler)
     # Register error handlers shared across all routes:
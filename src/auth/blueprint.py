@@ -6,6 +6,7 @@ from flask import Blueprint, jsonify, g
 
 from src.exceptions import AuthError
 from src.model import User, UserSchema, db
+from src.conditional import conditional_on_data_version
 
 from .decorators import require_jwt, requires_auth
 from .service import AuthService, current_uid, current_user
@@ -16,11 +17,12 @@ auth_bp = Blueprint("auth_bp", __name__)
 
 @auth_bp.route("/user", methods=["GET"])
 @requires_auth(allowed=["jwt", "api-key"])
+@conditional_on_data_version
 def get_user():
     """Returns information about the user to display on the UI."""
     user = current_user()
     user_details = UserSchema().dump(user)
-    return jsonify(**user_details, links=len(user.links)), 200
+    return jsonify(**user_details, links=user.link_count), 200
 
 
 @auth_bp.route("/check_user", methods=["POST"])
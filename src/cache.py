@@ -0,0 +1,297 @@
+"""Redis-backed caching for read-heavy responses and lookups.
+"""
+
+import hashlib
+import json
+import time
+from typing import Iterable, List, Optional
+import redis
+from flask import current_app
+from src.model import Link, LinkQuerySchema, User, db
+
+_clients = {}
+
+
+def get_redis() -> Optional[redis.Redis]:
+    """Returns a (shared) client for the cache Redis database, or None if one
+    isn't configured.
+    """
+    url = current_app.config.get("CACHE_REDIS_URL")
+    if not url:
+        return None
+    if url not in _clients:
+        _clients[url] = redis.Redis.from_url(
+            url, socket_connect_timeout=1, socket_timeout=1
+        )
+    return _clients[url]
+
+
+class LinkPageCache:
+    """Caches serialized GET /links responses per user and query parameters.
+
+    Keys include the user's data version, which is bumped on every write to
+    their links or collections. Any write therefore invalidates all of a
+    user's cached pages at once; the stale entries are never read again and
+    expire on their own. Cache errors are logged and treated as misses.
+    """
+
+    HITS_KEY = "cache:links:hits"
+    MISSES_KEY = "cache:links:misses"
+
+    def __init__(self):
+        self.redis = get_redis()
+        self.enabled = current_app.config["LINK_CACHE_ENABLED"] and bool(self.redis)
+        self.ttl = current_app.config["LINK_CACHE_TTL"]
+
+    @staticmethod
+    def key_for(user: User, params: dict) -> str:
+        """Cache key for a page of links, given the user and the validated
+        query parameters for the request.
+        """
+        canonical_params = json.dumps(LinkQuerySchema().dump(params), sort_keys=True)
+        digest = hashlib.sha1(canonical_params.encode("utf-8")).hexdigest()
+        return f"cache:links:{user.id}:{user.data_version}:{digest}"
+
+    def get(self, user: User, params: dict) -> Optional[bytes]:
+        """Returns a cached response body, or None on a miss."""
+        if not self.enabled:
+            return None
+        try:
+            body = self.redis.get(self.key_for(user, params))
+            self.redis.incr(self.HITS_KEY if body is not None else self.MISSES_KEY)
+            return body
+        except redis.RedisError as e:
+            current_app.logger.warning(f"Link cache read failed: {e}")
+            return None
+
+    def set(self, user: User, params: dict, body: bytes) -> None:
+        if not self.enabled:
+            return
+        try:
+            self.redis.set(self.key_for(user, params), body, ex=self.ttl)
+        except redis.RedisError as e:
+            current_app.logger.warning(f"Link cache write failed: {e}")
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters for the cache."""
+        counters = self.redis.mget(self.HITS_KEY, self.MISSES_KEY)
+        hits, misses = (int(counter or 0) for counter in counters)
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": (hits / total) if total else 0.0,
+        }
+
+    def reset_stats(self) -> None:
+        self.redis.delete(self.HITS_KEY, self.MISSES_KEY)
+
+
+class LinkUrlFilter:
+    """A Bloom filter per user over the url_hash of every link they've saved,
+    so checking whether URLs are saved can rule most of them out without a
+    database query. It may report URLs that aren't saved (including deleted
+    links), but never misses one that is, so positives must be confirmed.
+
+    Filters are built from the database on first use and expire after
+    LINK_URL_FILTER_TTL seconds, which also clears out deleted links.
+    LinkService adds URLs as links are saved, to filters that exist (missing
+    ones are built with them on first use), refreshing their expiry. The
+    last bit of each filter marks it as complete: if a filter expires just as
+    URLs are added to it, the key is recreated without it, and treated as
+    missing rather than trusted.
+    """
+
+    KEY = "bloom:links:{user_id}"
+
+    def __init__(self):
+        self.redis = get_redis()
+        self.enabled = bool(self.redis)
+        self.size = current_app.config["LINK_URL_FILTER_BITS"]
+        self.num_hashes = current_app.config["LINK_URL_FILTER_HASHES"]
+        self.ttl = current_app.config["LINK_URL_FILTER_TTL"]
+
+    def positions(self, url_hash: str) -> List[int]:
+        """Bit positions for a URL hash, derived from two halves of it (see
+        Kirsch & Mitzenmacher, "Less Hashing, Same Performance").
+        """
+        first, second = int(url_hash[:20], 16), int(url_hash[20:], 16) | 1
+        return [(first + i * second) % self.size for i in range(self.num_hashes)]
+
+    def might_contain(self, user_id: int, url_hashes: List[str]) -> List[bool]:
+        """Returns, for each URL hash, whether the user may have saved it. If
+        the filter is unavailable, every URL may have been.
+        """
+        if not self.enabled or not url_hashes:
+            return [True] * len(url_hashes)
+        try:
+            complete, bits = self._read_bits(user_id, url_hashes)
+            if not complete:
+                self.build(user_id)
+                complete, bits = self._read_bits(user_id, url_hashes)
+        except redis.RedisError as e:
+            current_app.logger.warning(f"Link URL filter read failed: {e}")
+            complete = False
+        if not complete:
+            return [True] * len(url_hashes)
+        k = self.num_hashes
+        return [all(bits[i * k : (i + 1) * k]) for i in range(len(url_hashes))]
+
+    def _read_bits(self, user_id: int, url_hashes: List[str]) -> tuple:
+        """Returns whether a user's filter is complete, and the bits at every
+        position for the given URL hashes.
+        """
+        key = self.KEY.format(user_id=user_id)
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.getbit(key, self.size)
+        for url_hash in url_hashes:
+            for position in self.positions(url_hash):
+                pipeline.getbit(key, position)
+        complete, *bits = pipeline.execute()
+        return complete, bits
+
+    def add(self, user_id: int, url_hashes: Iterable[str]) -> None:
+        """Adds newly saved (and committed) URL hashes to a user's filter."""
+        if not self.enabled:
+            return
+        key = self.KEY.format(user_id=user_id)
+        try:
+            # Setting bits on a missing key would create a whole filter, that
+            # never expires, for users who may never look URLs up:
+            if not self.redis.exists(key):
+                return
+            pipeline = self.redis.pipeline()
+            for url_hash in url_hashes:
+                for position in self.positions(url_hash):
+                    pipeline.setbit(key, position, 1)
+            pipeline.expire(key, self.ttl)
+            pipeline.execute()
+        except redis.RedisError as e:
+            current_app.logger.warning(f"Link URL filter write failed: {e}")
+            # Missing URLs would be reported as not saved, so drop the
+            # filter (to be rebuilt) if possible:
+            self.clear(user_id)
+
+    def build(self, user_id: int) -> None:
+        """Builds a user's filter from the URL hashes of their saved links."""
+        key = self.KEY.format(user_id=user_id)
+        data_version = self._data_version(user_id)
+        bits = bytearray(self.size // 8 + 1)
+        url_hashes = (
+            db.session.query(Link.url_hash)
+            .filter(Link.user_id == user_id, Link.url_hash != None)
+            .execution_options(stream_results=True)
+            .yield_per(10000)
+        )
+        for (url_hash,) in url_hashes:
+            for position in self.positions(url_hash):
+                bits[position >> 3] |= 0x80 >> (position & 7)
+        bits[self.size >> 3] |= 0x80 >> (self.size & 7)
+        self.redis.set(key, bytes(bits), ex=self.ttl)
+        # Links committed after the version was read may have been missed
+        # (their URLs were added before this filter replaced the old one),
+        # so don't keep it if anything's changed:
+        if self._data_version(user_id) != data_version:
+            self.redis.delete(key)
+
+    def clear(self, user_id: int) -> None:
+        try:
+            self.redis.delete(self.KEY.format(user_id=user_id))
+        except redis.RedisError as e:
+            current_app.logger.warning(f"Link URL filter delete failed: {e}")
+
+    @staticmethod
+    def _data_version(user_id: int) -> int:
+        return db.session.query(User.data_version).filter(User.id == user_id).scalar()
+
+
+class UrlMetadataCache:
+    """Caches the title and description found for a URL, shared between users
+    and keyed by the hash of the normalized URL (see src.links.urls), so a
+    popular page is only fetched once in a while however many users save it.
+
+    Entries record when the page was fetched and whether fetching it failed.
+    Pages with metadata are kept for METADATA_CACHE_TTL seconds, and pages
+    without any (or that couldn't be fetched) for METADATA_CACHE_NEGATIVE_TTL
+    seconds. Every entry expires, so they can also be evicted under memory
+    pressure (with a `volatile-*` maxmemory policy). Cache errors are logged
+    and treated as misses.
+    """
+
+    KEY = "cache:metadata:url:{url_hash}"
+    HITS_KEY = "cache:metadata:hits"
+    NEGATIVE_HITS_KEY = "cache:metadata:negative_hits"
+    MISSES_KEY = "cache:metadata:misses"
+
+    def __init__(self):
+        self.redis = get_redis()
+        self.ttl = current_app.config["METADATA_CACHE_TTL"]
+        self.negative_ttl = current_app.config["METADATA_CACHE_NEGATIVE_TTL"]
+        self.enabled = bool(self.redis) and self.ttl > 0
+
+    def get(self, url_hash: str) -> Optional[dict]:
+        """Returns the cached entry for a URL, with `title`, `description`,
+        `etag`, `last_modified`, `fetched_at` (a UNIX timestamp) and `failed`
+        keys, or None on a miss.
+        """
+        if not self.enabled:
+            return None
+        try:
+            entry = self.redis.get(self.KEY.format(url_hash=url_hash))
+            entry = json.loads(entry) if entry is not None else None
+            if entry is None:
+                self.redis.incr(self.MISSES_KEY)
+            elif entry["failed"] or not (entry["title"] or entry["description"]):
+                self.redis.incr(self.NEGATIVE_HITS_KEY)
+            else:
+                self.redis.incr(self.HITS_KEY)
+            return entry
+        except redis.RedisError as e:
+            current_app.logger.warning(f"Metadata cache read failed: {e}")
+            return None
+
+    def set(self, url_hash: str, metadata: dict, failed: bool = False) -> None:
+        """Caches the metadata found for a URL (or, if `failed`, that it
+        couldn't be fetched).
+        """
+        if not self.enabled:
+            return
+        entry = {
+            "title": metadata.get("title"),
+            "description": metadata.get("description"),
+            "etag": metadata.get("etag"),
+            "last_modified": metadata.get("last_modified"),
+            "fetched_at": int(time.time()),
+            "failed": failed,
+        }
+        found = not failed and (entry["title"] or entry["description"])
+        try:
+            self.redis.set(
+                self.KEY.format(url_hash=url_hash),
+                json.dumps(entry),
+                ex=self.ttl if found else self.negative_ttl,
+            )
+        except redis.RedisError as e:
+            current_app.logger.warning(f"Metadata cache write failed: {e}")
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters for the cache. Hits on pages without
+        metadata are counted in both `hits` and `negative_hits`.
+        """
+        counters = self.redis.mget(
+            self.HITS_KEY, self.NEGATIVE_HITS_KEY, self.MISSES_KEY
+        )
+        positive_hits, negative_hits, misses = (
+            int(counter or 0) for counter in counters
+        )
+        hits = positive_hits + negative_hits
+        total = hits + misses
+        return {
+            "hits": hits,
+            "negative_hits": negative_hits,
+            "misses": misses,
+            "hit_rate": (hits / total) if total else 0.0,
+        }
+
+    def reset_stats(self) -> None:
+        self.redis.delete(self.HITS_KEY, self.NEGATIVE_HITS_KEY, self.MISSES_KEY)
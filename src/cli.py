@@ -3,9 +3,14 @@ over the Flask CLI.
 """
 
 from typing import Optional
+import time
 import click
 from flask import Blueprint, current_app
 from src.model import db
+from src.counters import CounterService
+from src.cache import LinkPageCache, UrlMetadataCache
+from src.sync.service import SyncService
+from src.outbox import Outbox
 import src.manager.seed as seed
 
 # You can run these with `flask admin <command here>`:
@@ -49,6 +54,78 @@ def dummy_data(email: str, name: str, users: int, links: int):
         click.echo(f"API Key: {api_key}")
 
 
+@admin_bp.cli.command("recount_links")
+@click.option("--user-id", type=int, default=None, help="Only recount this user")
+def recount_links(user_id: Optional[int]):
+    """Recomputes link counters for users and collections."""
+    click.echo("Recounting links... ", nl=False)
+    users, collections = CounterService().recount(user_id=user_id)
+    click.echo("Complete.")
+    click.echo(f"Corrected {users} user(s) and {collections} collection(s).")
+
+
+@admin_bp.cli.command("prune_tombstones")
+@click.option(
+    "--days",
+    type=int,
+    default=None,
+    help="Keep tombstones this recent (defaults to SYNC_TOMBSTONE_DAYS)",
+)
+def prune_tombstones(days: Optional[int]):
+    """Deletes old tombstones of deleted links, kept for syncing."""
+    click.echo("Pruning tombstones... ", nl=False)
+    deleted_count = SyncService().prune_tombstones(days=days)
+    click.echo("Complete.")
+    click.echo(f"Deleted {deleted_count} tombstone(s).")
+
+
+@admin_bp.cli.command("cache_stats")
+@click.option("--reset", is_flag=True, help="Reset the counters after printing")
+def cache_stats(reset: bool):
+    """Shows hit/miss counters for the link listing and URL metadata caches."""
+    page_cache = LinkPageCache()
+    if not page_cache.redis:
+        click.echo("No cache Redis is configured (set CACHE_REDIS_URL).", err=True)
+        return
+    stats = page_cache.stats()
+    click.echo("Link listing cache:")
+    click.echo(f"  Enabled: {page_cache.enabled}")
+    click.echo(f"  Hits: {stats['hits']}")
+    click.echo(f"  Misses: {stats['misses']}")
+    click.echo(f"  Hit rate: {stats['hit_rate']:.1%}")
+
+    metadata_cache = UrlMetadataCache()
+    stats = metadata_cache.stats()
+    click.echo("URL metadata cache:")
+    click.echo(f"  Enabled: {metadata_cache.enabled}")
+    click.echo(f"  Hits: {stats['hits']} ({stats['negative_hits']} without metadata)")
+    click.echo(f"  Misses: {stats['misses']}")
+    click.echo(f"  Hit rate: {stats['hit_rate']:.1%}")
+    if reset:
+        page_cache.reset_stats()
+        metadata_cache.reset_stats()
+        click.echo("Counters reset.")
+
+
+@admin_bp.cli.command("relay_outbox")
+@click.option(
+    "--interval",
+    type=float,
+    default=None,
+    help="Keep relaying, checking this often (in seconds) once the outbox is empty",
+)
+def relay_outbox(interval: Optional[float]):
+    """Sends tasks queued in the outbox to the broker."""
+    while True:
+        relayed = Outbox().relay()
+        if interval is None:
+            click.echo(f"Relayed {relayed} task(s).")
+            return
+        if relayed:
+            click.echo(f"Relayed {relayed} task(s).")
+        time.sleep(interval)
+
+
 @admin_bp.cli.command("clear_tables")
 def clear_tables():
     """Deletes all data."""
@@ -59,6 +136,8 @@ def clear_tables():
     click.echo("Deleting all data...", nl=False)
     try:
         db.engine.execute('delete from "link"')
+        db.engine.execute('delete from "link_tombstone"')
+        db.engine.execute('delete from "outbox_message"')
         db.engine.execute('delete from "user"')
         click.echo("Complete")
     except Exception as e:
@@ -78,6 +157,8 @@ def drop_tables():
     try:
         db.engine.execute("drop table alembic_version;")
         db.engine.execute('drop table "link"')
+        db.engine.execute('drop table "link_tombstone"')
+        db.engine.execute('drop table "outbox_message"')
         db.engine.execute('drop table "user"')
         click.echo("Complete.")
     except Exception as e:
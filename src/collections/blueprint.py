@@ -2,6 +2,7 @@ from flask import Blueprint, jsonify, request
 from src.model import CollectionSchema
 from .service import CollectionService
 from src.auth.decorators import requires_auth
+from src.conditional import conditional_on_data_version
 from src.auth.service import current_user
 from src.exceptions import AuthError
 
@@ -11,6 +12,7 @@ schema = CollectionSchema()
 
 @collection_bp.route("", methods=["GET"])
 @requires_auth(allowed=["api-key", "jwt"])
+@conditional_on_data_version
 def get_collections():
     user = current_user()
     collections = CollectionService().get_collections_for_user(user.id)
@@ -1,4 +1,5 @@
 from src.model import Collection, Link, User, db
+from src.counters import CounterService
 from datetime import datetime, timezone
 from typing import List
 
@@ -39,6 +40,7 @@ class CollectionService:
             icon=icon,
             archived=False,
             order=order,
+            change_seq=User.bump_data_version(user_id),
         )
         db.session.add(collection)
         db.session.commit()
@@ -49,10 +51,17 @@ class CollectionService:
         to keep a continuous order."""
 
         collection = Collection.query.get(collection_id)
+        change_seq = User.bump_data_version(collection.user_id)
         links = Link.query.filter_by(collection_id=collection_id)
+        moves = []
         for link in links:
+            counter_key = CounterService.key_for(link)
             link.collection_id = None
+            link.change_seq = change_seq
+            moves.append((counter_key, CounterService.key_for(link)))
+        CounterService().links_moved(moves)
         collection.archived = True
+        collection.change_seq = change_seq
         db.session.commit()
         self.reset_collection_order(collection.user_id)
 
@@ -107,9 +116,15 @@ class CollectionService:
 
         # TODO: Need lots of checks to make sure orders actually exist and
         # will be sequential
-        for collection_update in document.items():
-            new_order, collection_id = collection_update
-            collection = Collection.query.get(collection_id)
+        collections = {
+            new_order: Collection.query.get(collection_id)
+            for new_order, collection_id in document.items()
+        }
+        change_seqs = {
+            user_id: User.bump_data_version(user_id)
+            for user_id in sorted({c.user_id for c in collections.values()})
+        }
+        for new_order, collection in collections.items():
             collection.order = new_order
-
+            collection.change_seq = change_seqs[collection.user_id]
         db.session.commit()
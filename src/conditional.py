@@ -0,0 +1,48 @@
+"""Support for conditional GET requests. Read endpoints are tagged with the
+current user's data version, so clients re-polling for changes get a `304 Not
+Modified` without the underlying data being queried or serialized again.
+"""
+
+from functools import partial, wraps
+from typing import Callable
+from flask import make_response, request
+from src.auth.service import current_user
+
+
+def data_version_etag(user) -> str:
+    """The ETag for any read of a user's data: changes whenever their links or
+    collections do.
+    """
+    return f"{user.id}.{user.data_version}"
+
+
+def conditional_on_data_version(f=None, *, check: Callable = None):
+    """Wraps a read-only view function to answer `If-None-Match` requests with
+    a 304 if the user's data hasn't changed since, and to tag every response
+    with a weak ETag otherwise. Must be applied after `requires_auth`.
+
+    Views that read a single item should pass a `check`, called with the
+    view's arguments before answering with a 304, which raises if the item
+    doesn't exist or isn't the user's (the data version only covers their
+    own items).
+    """
+    if f is None:
+        return partial(conditional_on_data_version, check=check)
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        etag = data_version_etag(current_user())
+        if request.if_none_match.contains_weak(etag):
+            if check:
+                check(*args, **kwargs)
+            response = make_response("", 304)
+        else:
+            response = make_response(f(*args, **kwargs))
+        if response.status_code in (200, 304):
+            response.set_etag(etag, weak=True)
+            # Responses are per-user, and must be revalidated before reuse:
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+        return response
+
+    return decorated_function
@@ -26,6 +26,90 @@ class Config:
     else:
         RATELIMIT_STORAGE_URL = "memory://"
 
+    # Redis database used for application caches (left unset, caching is off):
+    if os.getenv("REDIS_URL"):
+        CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", os.getenv("REDIS_URL") + "/2")
+    else:
+        CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL")
+
+    # Opt-in cache for GET /links responses, and how long (seconds) to keep them:
+    LINK_CACHE_ENABLED = bool(int(os.getenv("LINK_CACHE_ENABLED", "0")))
+    LINK_CACHE_TTL = int(os.getenv("LINK_CACHE_TTL", "300"))
+
+    # Size (in bits) of each user's Bloom filter of saved URLs, the number of
+    # hash functions, and how long (seconds) before it's rebuilt. The defaults
+    # give under 1% false positives for users with up to ~100,000 links:
+    LINK_URL_FILTER_BITS = int(os.getenv("LINK_URL_FILTER_BITS", str(2**20)))
+    LINK_URL_FILTER_HASHES = int(os.getenv("LINK_URL_FILTER_HASHES", "7"))
+    LINK_URL_FILTER_TTL = int(os.getenv("LINK_URL_FILTER_TTL", "86400"))
+
+    # What saving a URL the user already has does: "existing" returns their
+    # saved link as-is, "bump" also moves it to the top of their unread links:
+    DUPLICATE_LINKS = os.getenv("DUPLICATE_LINKS", "existing")
+
+    # How long (days) deleted links are remembered for GET /sync. Clients that
+    # haven't synced for longer have to sync again from scratch:
+    SYNC_TOMBSTONE_DAYS = int(os.getenv("SYNC_TOMBSTONE_DAYS", "90"))
+
+    # Live link events (GET /events) also go through the cache Redis. Idle
+    # streams get a keep-alive every LINK_EVENTS_HEARTBEAT seconds, and are
+    # closed after LINK_EVENTS_MAX_AGE seconds (clients reconnect on their own):
+    LINK_EVENTS_HEARTBEAT = int(os.getenv("LINK_EVENTS_HEARTBEAT", "15"))
+    LINK_EVENTS_MAX_AGE = int(os.getenv("LINK_EVENTS_MAX_AGE", "600"))
+
+    # Limits on fetching pages for link titles and descriptions: timeouts
+    # (seconds) to connect and between reads, the most time spent reading a
+    # page, and the most bytes read (reading also stops after the <head>):
+    METADATA_CONNECT_TIMEOUT = float(os.getenv("METADATA_CONNECT_TIMEOUT", "3.05"))
+    METADATA_READ_TIMEOUT = float(os.getenv("METADATA_READ_TIMEOUT", "5"))
+    METADATA_FETCH_DEADLINE = float(os.getenv("METADATA_FETCH_DEADLINE", "10"))
+    METADATA_MAX_BYTES = int(os.getenv("METADATA_MAX_BYTES", str(512 * 1024)))
+    # Fetches from each host are limited to METADATA_HOST_CONCURRENCY at once
+    # and METADATA_HOST_RATE per second (across workers, through the cache
+    # Redis), waiting up to METADATA_HOST_MAX_WAIT seconds before being put
+    # off. Hosts answering with 429/5xx errors (or not at all) are backed off
+    # from METADATA_HOST_BACKOFF seconds, doubling up to METADATA_HOST_MAX_BACKOFF,
+    # and skipped for METADATA_HOST_CIRCUIT_SECONDS after METADATA_HOST_FAILURES
+    # failures in a row:
+    METADATA_HOST_CONCURRENCY = int(os.getenv("METADATA_HOST_CONCURRENCY", "4"))
+    METADATA_HOST_RATE = int(os.getenv("METADATA_HOST_RATE", "2"))
+    METADATA_HOST_MAX_WAIT = float(os.getenv("METADATA_HOST_MAX_WAIT", "5"))
+    METADATA_HOST_BACKOFF = float(os.getenv("METADATA_HOST_BACKOFF", "1"))
+    METADATA_HOST_MAX_BACKOFF = float(os.getenv("METADATA_HOST_MAX_BACKOFF", "300"))
+    METADATA_HOST_FAILURES = int(os.getenv("METADATA_HOST_FAILURES", "5"))
+    METADATA_HOST_CIRCUIT_SECONDS = int(
+        os.getenv("METADATA_HOST_CIRCUIT_SECONDS", "600")
+    )
+    # Titles and descriptions found for each URL are cached (in the cache
+    # Redis) for all users, for METADATA_CACHE_TTL seconds. Pages without
+    # any, or that couldn't be fetched, are retried after
+    # METADATA_CACHE_NEGATIVE_TTL seconds. A TTL of 0 turns the cache off:
+    METADATA_CACHE_TTL = int(os.getenv("METADATA_CACHE_TTL", str(7 * 86400)))
+    METADATA_CACHE_NEGATIVE_TTL = int(os.getenv("METADATA_CACHE_NEGATIVE_TTL", "3600"))
+    # Batches of title-less links (i.e. from imports) are fetched with up to
+    # METADATA_BATCH_WORKERS pages in flight at once. Links that aren't done
+    # after METADATA_BATCH_DEADLINE seconds are sent off in a new batch:
+    METADATA_BATCH_WORKERS = int(os.getenv("METADATA_BATCH_WORKERS", "100"))
+    METADATA_BATCH_DEADLINE = float(os.getenv("METADATA_BATCH_DEADLINE", "60"))
+    # Every METADATA_REFRESH_INTERVAL seconds, up to METADATA_REFRESH_BUDGET
+    # links whose metadata was taken from their pages more than
+    # METADATA_REFRESH_DAYS days ago are checked again (with conditional
+    # requests), unread and recently saved links first:
+    METADATA_REFRESH_INTERVAL = int(os.getenv("METADATA_REFRESH_INTERVAL", "3600"))
+    METADATA_REFRESH_BUDGET = int(os.getenv("METADATA_REFRESH_BUDGET", "200"))
+    METADATA_REFRESH_DAYS = int(os.getenv("METADATA_REFRESH_DAYS", "7"))
+    # Tasks queued in the outbox (see src.outbox) are relayed to the broker
+    # every OUTBOX_RELAY_INTERVAL seconds, OUTBOX_BATCH_SIZE at a time:
+    OUTBOX_RELAY_INTERVAL = float(os.getenv("OUTBOX_RELAY_INTERVAL", "1"))
+    OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+    # Links queued with POST /links?async=1 are saved every
+    # QUICK_SAVE_INTERVAL seconds, QUICK_SAVE_BATCH_SIZE at a time:
+    QUICK_SAVE_INTERVAL = float(os.getenv("QUICK_SAVE_INTERVAL", "1"))
+    QUICK_SAVE_BATCH_SIZE = int(os.getenv("QUICK_SAVE_BATCH_SIZE", "500"))
+    # Responses to requests with an Idempotency-Key are kept (in the cache
+    # Redis) for IDEMPOTENCY_TTL seconds. A TTL of 0 turns this off:
+    IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "86400"))
+
 
 class CeleryConfig:
     if os.getenv("REDIS_URL"):
@@ -35,6 +119,20 @@ class CeleryConfig:
     broker_url = os.getenv("BROKER_URL", broker_string)
     timezone = "America/Toronto"
     enable_utc = True
+    beat_schedule = {
+        "refresh-links-metadata": {
+            "task": "src.tasks.refresh_links_metadata",
+            "schedule": Config.METADATA_REFRESH_INTERVAL,
+        },
+        "relay-outbox": {
+            "task": "src.tasks.relay_outbox",
+            "schedule": Config.OUTBOX_RELAY_INTERVAL,
+        },
+        "save-queued-links": {
+            "task": "src.tasks.save_queued_links",
+            "schedule": Config.QUICK_SAVE_INTERVAL,
+        },
+    }
 
 
 class DevConfig(Config):
@@ -0,0 +1,181 @@
+"""Maintains the denormalized link counters stored on users and collections, so
+totals can be read without loading (or counting) every link.
+
+Counter changes are issued as relative UPDATEs in the caller's transaction, so
+they're committed or rolled back along with the link writes they describe.
+"""
+
+from collections import Counter
+from typing import Iterable, Mapping, Optional, Tuple
+from sqlalchemy import and_, func, select, update
+from src.model import User, Collection, Link, db
+
+# A link's position in the counters: (user_id, collection_id, read)
+CounterKey = Tuple[int, Optional[int], bool]
+
+
+class CounterService:
+    def link_added(self, link: Link) -> None:
+        """Counts a new link."""
+        self.apply(Counter({self.key_for(link): 1}))
+
+    def links_added(self, links: Iterable[Link]) -> None:
+        """Counts a batch of new links, with one UPDATE per user/collection
+        touched rather than one per link.
+        """
+        self.apply(Counter(self.key_for(link) for link in links))
+
+    def link_removed(self, link: Link) -> None:
+        """Stops counting a link that's being deleted."""
+        self.apply(Counter({self.key_for(link): -1}))
+
+    def bulk_links_removed(self, counts: Mapping[CounterKey, int]) -> None:
+        """Stops counting links deleted in bulk, given how many were deleted
+        per counter key.
+        """
+        self.apply(Counter({key: -count for key, count in counts.items()}))
+
+    def link_moved(self, before: CounterKey, after: CounterKey) -> None:
+        """Moves a link between counters, i.e. when it's marked as read or
+        moved to another collection.
+        """
+        self.links_moved([(before, after)])
+
+    def links_moved(self, moves: Iterable[Tuple[CounterKey, CounterKey]]) -> None:
+        """Moves a batch of links between counters, given (before, after)
+        pairs of counter keys.
+        """
+        self.bulk_links_moved((before, after, 1) for before, after in moves)
+
+    def bulk_links_moved(
+        self, moves: Iterable[Tuple[CounterKey, CounterKey, int]]
+    ) -> None:
+        """Moves links updated in bulk between counters, given (before,
+        after, count) triples, i.e. from a grouped UPDATE ... RETURNING.
+        """
+        deltas = Counter()
+        for before, after, count in moves:
+            if before != after:
+                deltas[before] -= count
+                deltas[after] += count
+        self.apply(deltas)
+
+    @staticmethod
+    def key_for(link: Link) -> CounterKey:
+        return (link.user_id, link.collection_id, bool(link.read))
+
+    def apply(self, deltas: Counter) -> None:
+        """Applies a set of counter changes, keyed by (user_id, collection_id,
+        read). Does not commit. Users' data versions should already have been
+        bumped for the change.
+        """
+        user_deltas = Counter()
+        user_read_deltas = Counter()
+        collection_deltas = Counter()
+        collection_read_deltas = Counter()
+        for (user_id, collection_id, read), delta in deltas.items():
+            user_deltas[user_id] += delta
+            user_read_deltas[user_id] += delta if read else 0
+            if collection_id is not None:
+                collection_deltas[(user_id, collection_id)] += delta
+                collection_read_deltas[(user_id, collection_id)] += delta if read else 0
+
+        for user_id, delta in user_deltas.items():
+            read_delta = user_read_deltas[user_id]
+            if delta or read_delta:
+                db.session.execute(
+                    update(User)
+                    .where(User.id == user_id)
+                    .values(
+                        link_count=User.link_count + delta,
+                        read_link_count=User.read_link_count + read_delta,
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+
+        for (user_id, collection_id), delta in collection_deltas.items():
+            read_delta = collection_read_deltas[(user_id, collection_id)]
+            if delta or read_delta:
+                db.session.execute(
+                    update(Collection)
+                    .where(
+                        Collection.id == collection_id, Collection.user_id == user_id
+                    )
+                    .values(
+                        link_count=Collection.link_count + delta,
+                        read_link_count=Collection.read_link_count + read_delta,
+                        # Counters are synced too (see src.sync), so mark the
+                        # collection as changed at the owner's data version:
+                        change_seq=select(User.data_version)
+                        .where(User.id == Collection.user_id)
+                        .scalar_subquery(),
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+
+    def recount(self, user_id: int = None) -> Tuple[int, int]:
+        """Recomputes counters from the link table, for one user or everyone,
+        and commits. Only rows that have drifted are written, and the data
+        versions of their users are bumped (with corrected collections marked
+        as changed at the new version), so cached and synced counts are
+        replaced too.
+
+        Returns:
+            A tuple of (users corrected, collections corrected)
+        """
+        user_total = self._count_links(Link.user_id == User.id)
+        user_read = self._count_links(Link.user_id == User.id, Link.read == True)
+        user_drifted = (User.link_count != user_total) | (
+            User.read_link_count != user_read
+        )
+
+        in_collection = and_(
+            Link.collection_id == Collection.id, Link.user_id == Collection.user_id
+        )
+        collection_total = self._count_links(in_collection)
+        collection_read = self._count_links(in_collection, Link.read == True)
+        collection_drifted = (Collection.link_count != collection_total) | (
+            Collection.read_link_count != collection_read
+        )
+
+        drifted_users = select(User.id).where(user_drifted)
+        drifted_collection_users = select(Collection.user_id).where(collection_drifted)
+        if user_id is not None:
+            drifted_users = drifted_users.where(User.id == user_id)
+            drifted_collection_users = drifted_collection_users.where(
+                Collection.user_id == user_id
+            )
+        user_ids = set(db.session.execute(drifted_users).scalars())
+        user_ids |= set(db.session.execute(drifted_collection_users).scalars())
+        # Bumping versions locks the users' rows, so their counters can't
+        # change again until this commits:
+        for drifted_user_id in sorted(user_ids):
+            User.bump_data_version(drifted_user_id)
+
+        users_query = (
+            update(User)
+            .where(User.id.in_(user_ids), user_drifted)
+            .values(link_count=user_total, read_link_count=user_read)
+            .execution_options(synchronize_session=False)
+        )
+        collections_query = (
+            update(Collection)
+            .where(Collection.user_id.in_(user_ids), collection_drifted)
+            .values(
+                link_count=collection_total,
+                read_link_count=collection_read,
+                change_seq=select(User.data_version)
+                .where(User.id == Collection.user_id)
+                .scalar_subquery(),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        users_corrected = db.session.execute(users_query).rowcount
+        collections_corrected = db.session.execute(collections_query).rowcount
+        db.session.commit()
+        return (users_corrected, collections_corrected)
+
+    @staticmethod
+    def _count_links(*criteria):
+        """Correlated count(*) subquery over links matching criteria."""
+        return select(func.count(Link.id)).where(*criteria).scalar_subquery()
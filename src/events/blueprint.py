@@ -0,0 +1,36 @@
+"""Blueprint for streaming changes to a user's links as they happen.
+"""
+
+from flask import Blueprint, current_app
+from src.auth.service import current_user
+from src.auth.decorators import requires_auth
+from src.exceptions import InvalidUsage
+from src.model import db
+from .service import LinkEvents
+
+events_bp = Blueprint("events_bp", __name__)
+
+
+@events_bp.route("", methods=["GET"])
+@requires_auth(allowed=["jwt", "api-key"])
+def stream_events():
+    """Streams the current user's link events as server-sent events:
+    `link_created`, `link_updated` (i.e. once a new link's title and
+    description are filled in), `link_deleted` and `links_changed` (after
+    bulk changes). Events missed while disconnected aren't replayed, so
+    clients should sync (GET /sync) when they reconnect.
+    """
+    user = current_user()
+    link_events = LinkEvents()
+    if not link_events.enabled:
+        raise InvalidUsage("Live events aren't available", status_code=503)
+    stream = link_events.stream(user.id)
+    # The stream may stay open for a long time, and doesn't need the
+    # database, so give back the connection now:
+    db.session.remove()
+
+    response = current_app.response_class(stream, mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    # Stop proxies like nginx from buffering events:
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,169 @@
+"""Pushes changes to a user's links to their open event streams (GET /events)
+as server-sent events, so clients don't have to poll for them (i.e. while
+waiting for a new link's metadata to be filled in).
+
+Events are published to a Redis pub/sub channel per user. Each web process
+subscribes once, to every user's channel, and fans events out to the streams
+it has open, so an idle stream costs a queue rather than a Redis connection.
+Events aren't stored: a client that reconnects should catch up with GET /sync.
+"""
+
+import json
+import queue
+import threading
+import time
+from typing import Iterator
+import redis
+from flask import current_app
+from src.cache import get_redis
+
+_hubs = {}
+_hubs_lock = threading.Lock()
+
+
+class LinkEvents:
+    """Publishes link events and streams them to clients. Publishing errors
+    are logged and otherwise ignored, since events are only a convenience.
+    """
+
+    CHANNEL = "events:links:{user_id}"
+
+    def __init__(self):
+        self.redis = get_redis()
+        self.enabled = bool(self.redis)
+        self.heartbeat = current_app.config["LINK_EVENTS_HEARTBEAT"]
+        self.max_age = current_app.config["LINK_EVENTS_MAX_AGE"]
+        self.logger = current_app.logger
+
+    def link_created(self, user_id: int, link: dict) -> None:
+        """Sends a new link, serialized like GET /links/:id."""
+        self.publish(user_id, "link_created", {"link": link})
+
+    def link_updated(self, user_id: int, link: dict) -> None:
+        """Sends an updated link, serialized like GET /links/:id."""
+        self.publish(user_id, "link_updated", {"link": link})
+
+    def link_deleted(self, user_id: int, link_id: int) -> None:
+        self.publish(user_id, "link_deleted", {"link_id": link_id})
+
+    def links_changed(self, user_id: int) -> None:
+        """Tells a user's clients that many links changed at once (i.e. in a
+        bulk update or an import), so they should sync.
+        """
+        self.publish(user_id, "links_changed")
+
+    def publish(self, user_id: int, event: str, data: dict = None) -> None:
+        """Sends an event to a user's open streams. Should only be called
+        once the change it describes has been committed.
+        """
+        if not self.enabled:
+            return
+        try:
+            self.redis.publish(
+                self.CHANNEL.format(user_id=user_id), self.format(event, data or {})
+            )
+        except redis.RedisError as e:
+            self.logger.warning(f"Link event publish failed: {e}")
+
+    @staticmethod
+    def format(event: str, data: dict) -> str:
+        """Formats an event as it's sent on the wire. Events are published
+        already formatted, so they're only encoded once however many streams
+        they go out to.
+        """
+        payload = json.dumps(data, sort_keys=True, separators=(",", ":"))
+        return f"event: {event}\ndata: {payload}\n\n"
+
+    def stream(self, user_id: int) -> Iterator[str]:
+        """Yields a user's events as they're published, starting with a
+        `ready` event once subscribed. Comments are sent while idle to keep
+        the connection open, and the stream ends after LINK_EVENTS_MAX_AGE
+        seconds (or if the client falls too far behind), for clients to
+        reconnect. Doesn't need an app context once created.
+        """
+        hub = LinkEventHub.for_redis(self.redis)
+        subscription = hub.subscribe(user_id)
+        try:
+            yield f"retry: {self.heartbeat * 1000}\n" + self.format("ready", {})
+            ends_at = time.monotonic() + self.max_age
+            while time.monotonic() < ends_at and not subscription.overflowed:
+                try:
+                    yield subscription.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+        finally:
+            hub.unsubscribe(user_id, subscription)
+
+
+class Subscription(queue.Queue):
+    """Events waiting to be sent on one stream. If the client doesn't keep up,
+    further events are dropped and the stream is ended.
+    """
+
+    def __init__(self, maxsize: int = 100):
+        super().__init__(maxsize)
+        self.overflowed = False
+
+
+class LinkEventHub:
+    """Receives every user's link events in this process, from a single
+    Redis subscription, and hands them to the streams open for that user.
+    """
+
+    def __init__(self, redis_client: redis.Redis):
+        self.subscriptions = {}
+        self.lock = threading.Lock()
+        self.pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.psubscribe(LinkEvents.CHANNEL.format(user_id="*"))
+        self.thread = threading.Thread(
+            target=self._run, name="link-event-hub", daemon=True
+        )
+        self.thread.start()
+
+    @classmethod
+    def for_redis(cls, redis_client: redis.Redis) -> "LinkEventHub":
+        """Returns this process's hub for a Redis client, starting it if
+        needed.
+        """
+        with _hubs_lock:
+            if redis_client not in _hubs:
+                _hubs[redis_client] = cls(redis_client)
+            return _hubs[redis_client]
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription()
+        with self.lock:
+            self.subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, user_id: int, subscription: Subscription) -> None:
+        with self.lock:
+            user_subscriptions = self.subscriptions.get(user_id, set())
+            user_subscriptions.discard(subscription)
+            if not user_subscriptions:
+                self.subscriptions.pop(user_id, None)
+
+    def dispatch(self, channel: str, event: str) -> None:
+        """Hands an event published on a user's channel to their streams."""
+        user_id = int(channel.rsplit(":", 1)[1])
+        with self.lock:
+            user_subscriptions = list(self.subscriptions.get(user_id, ()))
+        for subscription in user_subscriptions:
+            try:
+                subscription.put_nowait(event)
+            except queue.Full:
+                subscription.overflowed = True
+
+    def _run(self) -> None:
+        while True:
+            try:
+                message = self.pubsub.get_message(timeout=1.0)
+            except redis.RedisError:
+                # The connection (and subscription) is restored on the next
+                # read; events published in the meantime are lost:
+                time.sleep(1.0)
+                continue
+            if message is not None:
+                self.dispatch(
+                    message["channel"].decode("utf-8"), message["data"].decode("utf-8")
+                )
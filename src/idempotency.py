@@ -0,0 +1,145 @@
+"""Support for idempotent requests. Clients retrying a write (i.e. after a
+dropped connection) can send the same `Idempotency-Key` header, and get back
+the response to the first request instead of running it again.
+
+Responses are stored per user, endpoint and key in the cache Redis for
+IDEMPOTENCY_TTL seconds. Without a cache Redis (or if it's failing), requests
+are run as usual.
+"""
+
+import base64
+import hashlib
+import json
+from functools import wraps
+from typing import Optional
+import redis
+from flask import current_app, make_response, request
+from src.auth.service import current_user
+from src.cache import get_redis
+from src.exceptions import InvalidUsage
+
+# How long a request holds its key while it runs, in case it dies without
+# releasing it:
+IN_PROGRESS_SECONDS = 60
+# Headers replayed along with the body:
+REPLAYED_HEADERS = ("Content-Type", "Location")
+
+
+class IdempotencyStore:
+    KEY = "idempotency:{user_id}:{endpoint}:{key_hash}"
+
+    def __init__(self):
+        self.redis = get_redis()
+        self.ttl = current_app.config["IDEMPOTENCY_TTL"]
+        self.enabled = bool(self.redis) and self.ttl > 0
+
+    def key(self, user_id: int, endpoint: str, idempotency_key: str) -> str:
+        key_hash = hashlib.sha1(idempotency_key.encode("utf-8")).hexdigest()
+        return self.KEY.format(user_id=user_id, endpoint=endpoint, key_hash=key_hash)
+
+    def claim(self, key: str, fingerprint: str) -> Optional[dict]:
+        """Marks a key as in progress, and returns None, unless it's been
+        used already: then, returns its entry, with the request's
+        `fingerprint` and a `response` (unless it's still in progress).
+        """
+        entry = {"fingerprint": fingerprint, "response": None}
+        if self.redis.set(key, json.dumps(entry), nx=True, ex=IN_PROGRESS_SECONDS):
+            return None
+        existing = self.redis.get(key)
+        # If the first request just failed and released it, this one is
+        # turned away as in progress, and can be retried:
+        return json.loads(existing) if existing is not None else entry
+
+    def complete(self, key: str, fingerprint: str, response) -> None:
+        """Stores the response to the request that claimed a key."""
+        headers = {
+            name: response.headers[name]
+            for name in REPLAYED_HEADERS
+            if name in response.headers
+        }
+        entry = {
+            "fingerprint": fingerprint,
+            "response": {
+                "status": response.status_code,
+                "headers": headers,
+                "body": base64.b64encode(response.get_data()).decode("ascii"),
+            },
+        }
+        self.redis.set(key, json.dumps(entry), ex=self.ttl)
+
+    def release(self, key: str) -> None:
+        """Frees a key whose request failed, so it can be retried."""
+        self.redis.delete(key)
+
+
+def idempotent(f):
+    """Wraps a view function that makes changes so that requests with an
+    `Idempotency-Key` header run once: repeats get the first response back
+    (marked with an `Idempotent-Replayed` header), or a 409 while the first
+    is still running. Reusing a key for a different request is a 422. Errors
+    (5xx responses or exceptions) aren't stored, so the request can be
+    retried. Must be applied after `requires_auth`.
+    """
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        idempotency_key = request.headers.get("Idempotency-Key")
+        if idempotency_key is None:
+            return f(*args, **kwargs)
+        if not 0 < len(idempotency_key) <= 255:
+            raise InvalidUsage("Idempotency-Key must be 1 to 255 characters long")
+        store = IdempotencyStore()
+        if not store.enabled:
+            return f(*args, **kwargs)
+
+        key = store.key(current_user().id, request.endpoint, idempotency_key)
+        fingerprint = hashlib.sha256(
+            request.full_path.encode("utf-8") + b"\n" + request.get_data()
+        ).hexdigest()
+        try:
+            entry = store.claim(key, fingerprint)
+        except redis.RedisError as e:
+            current_app.logger.warning(f"Idempotency key read failed: {e}")
+            return f(*args, **kwargs)
+        if entry is not None:
+            return _replay(entry, fingerprint)
+
+        try:
+            response = make_response(f(*args, **kwargs))
+        except Exception:
+            _release(store, key)
+            raise
+        try:
+            if response.status_code < 500:
+                store.complete(key, fingerprint, response)
+            else:
+                store.release(key)
+        except redis.RedisError as e:
+            current_app.logger.warning(f"Idempotency key write failed: {e}")
+        return response
+
+    return decorated_function
+
+
+def _replay(entry: dict, fingerprint: str):
+    stored = entry["response"]
+    if stored is None:
+        raise InvalidUsage(
+            "A request with this Idempotency-Key is still in progress",
+            status_code=409,
+        )
+    if entry["fingerprint"] != fingerprint:
+        raise InvalidUsage(
+            "This Idempotency-Key was used for a different request", status_code=422
+        )
+    response = make_response(base64.b64decode(stored["body"]), stored["status"])
+    response.headers.update(stored["headers"])
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _release(store: IdempotencyStore, key: str) -> None:
+    try:
+        store.release(key)
+    except redis.RedisError as e:
+        current_app.logger.warning(f"Idempotency key write failed: {e}")
@@ -6,7 +6,9 @@ from typing import List, Optional
 from collections import namedtuple
 from src.model import Link
 
-ImportStats = namedtuple("ImportStats", ["imported", "errors"])
+ImportStats = namedtuple(
+    "ImportStats", ["imported", "errors", "duplicates"], defaults=[0]
+)
 
 
 class BaseImporter(metaclass=abc.ABCMeta):
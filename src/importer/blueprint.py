@@ -1,6 +1,7 @@
 from flask import Blueprint, jsonify, request
 from src.auth.decorators import requires_auth
 from src.auth.service import current_user
+from src.idempotency import idempotent
 from .service import JSONImporter
 
 importer_bp = Blueprint("importer_bp", __name__)
@@ -8,6 +9,7 @@ importer_bp = Blueprint("importer_bp", __name__)
 
 @importer_bp.route("/json", methods=["POST"])
 @requires_auth(allowed=["jwt", "api-key"])
+@idempotent
 def post_json_import():
     """Imports a JSON file full of links. JSON is one of the standard formats
     this app exports for a backup.
@@ -22,4 +24,5 @@ def post_json_import():
         message="Import complete",
         links_imported=import_results.imported,
         errors=import_results.errors,
+        duplicates=import_results.duplicates,
     )
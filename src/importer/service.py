@@ -2,6 +2,9 @@ from logging import error
 from . import BaseImporter, ImportStats
 from typing import List, Optional
 from src.model import LinkSchema, Link, db
+from src.counters import CounterService
+from src.links.service import LinkService
+from src.events.service import LinkEvents
 from marshmallow import EXCLUDE
 
 
@@ -18,15 +21,26 @@ class JSONImporter(BaseImporter):
         return result
 
     def load_links(self, links: List[Link]) -> ImportStats:
+        """Inserts links in batches, skipping any the user has already saved."""
         success_counter = 0
         error_counter = 0
-        for link in links:
-            db.session.add(link)
-            success_counter += 1
         try:
+            inserted = LinkService().insert_links(links)
+            success_counter = len(inserted)
+            CounterService().links_added(inserted)
             db.session.commit()
+            LinkService.remember_urls(inserted)
+            link_events = LinkEvents()
+            for user_id in {link.user_id for link in inserted}:
+                link_events.links_changed(user_id)
         except Exception as e:
             # TODO: better handling
             print("Exception occured while importing")
+            db.session.rollback()
             success_counter = 0
-        return ImportStats(imported=success_counter, errors=error_counter)
+            return ImportStats(imported=success_counter, errors=error_counter)
+        return ImportStats(
+            imported=success_counter,
+            errors=error_counter,
+            duplicates=len(links) - success_counter,
+        )
@@ -1,12 +1,41 @@
 """Blueprint for all endpoints that manipulate individual links.
 """
 
-from flask import Blueprint, jsonify, request, make_response, url_for
+from flask import (
+    Blueprint,
+    current_app,
+    jsonify,
+    request,
+    make_response,
+    stream_with_context,
+    url_for,
+)
 from marshmallow import ValidationError
 from src.auth.service import AuthService, current_user
 from .service import LinkService
-from src.model import LinkSchema, LinkQuerySchema, MultipleLinkSchema
+from .quick_save import QuickSaveQueue, looks_like_url
+from .serializers import (
+    compile_link_serializer,
+    gzip_chunks,
+    link_page_response,
+    link_schema_for,
+    ndjson_chunks,
+)
+from src.model import (
+    LinkSchema,
+    LinkBatchSchema,
+    LinkBulkUpdateSchema,
+    LinkFieldsSchema,
+    LinkLookupSchema,
+    LinkQuerySchema,
+    LinkSearchQuerySchema,
+    LinkSearchResultsSchema,
+    LinkSelectionSchema,
+)
 from src.auth.decorators import requires_auth
+from src.conditional import conditional_on_data_version
+from src.idempotency import idempotent
+from src.cache import LinkPageCache
 
 
 link_bp = Blueprint("link_bp", __name__)
@@ -15,11 +44,14 @@ link_schema = LinkSchema()
 
 @link_bp.route("", methods=["GET"])
 @requires_auth(allowed=["jwt", "api-key"])
+@conditional_on_data_version
 def get_links():
     """Returns a list of links for the current user (and pointers
     to another page of links) The `show` URL param controls
     whether archived links are returned, and can be one of `all`, `read`,
-    or `unread` (default "unread")
+    or `unread` (default "unread"). Passing the `next_cursor` from a previous
+    response as `cursor` switches to keyset pagination. The `fields` URL param
+    can restrict which link fields are returned (i.e. `fields=id,url,title`)
     """
     user = current_user()
     link_service = LinkService()
@@ -31,41 +63,209 @@ def get_links():
             "per_page": request.args.get("per_page", 20),
             "show": request.args.get("show", "unread"),
             "collection": request.args.get("collection"),
+            "cursor": request.args.get("cursor"),
+            "fields": request.args.get("fields"),
         }
     )
 
+    page_cache = LinkPageCache()
+    cached_body = page_cache.get(user, query_params)
+    if cached_body is not None:
+        return current_app.response_class(cached_body, mimetype="application/json")
+
     # Return a response with the fetched links, and pagination
     # information as well for the next request:
     link_response = link_service.get_many_links(user.id, query_params)
     # Serialize according to schema:
-    return jsonify(MultipleLinkSchema().dump(link_response))
+    response = link_page_response(link_response, query_params.get("field_names"))
+    page_cache.set(user, query_params, response.get_data())
+    return response
+
+
+@link_bp.route("/search", methods=["GET"])
+@requires_auth(allowed=["jwt", "api-key"])
+@conditional_on_data_version
+def search_links():
+    """Searches the current user's links by title, description and URL with
+    the `q` URL param, best matches first. Accepts the same `show`,
+    `collection`, `per_page`, `cursor` and `fields` params as GET /links.
+    """
+    user = current_user()
+    query_params = LinkSearchQuerySchema().load(
+        {
+            "q": request.args.get("q"),
+            "per_page": request.args.get("per_page", 20),
+            "show": request.args.get("show", "unread"),
+            "collection": request.args.get("collection"),
+            "cursor": request.args.get("cursor"),
+            "fields": request.args.get("fields"),
+        }
+    )
+    results = LinkService().search_links(user.id, query_params)
+    return link_page_response(
+        results, query_params.get("field_names"), LinkSearchResultsSchema
+    )
+
+
+@link_bp.route("/export", methods=["GET"])
+@requires_auth(allowed=["jwt", "api-key"])
+def export_links():
+    """Streams all of the current user's links as newline-delimited JSON,
+    gzip-compressed if the client accepts it. Each line can be imported again
+    with the JSON importer.
+    """
+    user = current_user()
+    body = ndjson_chunks(LinkService().iter_links(user.id))
+    compress = "gzip" in request.accept_encodings
+    if compress:
+        body = gzip_chunks(body)
+
+    response = current_app.response_class(
+        stream_with_context(body), mimetype="application/x-ndjson"
+    )
+    response.headers["Content-Disposition"] = 'attachment; filename="links.ndjson"'
+    response.vary.add("Accept-Encoding")
+    if compress:
+        response.content_encoding = "gzip"
+    return response
 
 
 @link_bp.route("", methods=["POST"])
 @requires_auth(allowed=["jwt", "api-key"])
+@idempotent
 def post_link():
-    """Creates a new link in the database."""
+    """Creates a new link in the database. With `async=1`, the link is only
+    queued, to be saved shortly (see QuickSaveQueue), and a provisional ID
+    comes back with a 202.
+    """
     link_service = LinkService()
     user = current_user()
     # Collect information via the JSON body of the request
     body = request.get_json()
+    if request.args.get("async") in ("1", "true") and isinstance(body, dict):
+        if not looks_like_url(body.get("url")):
+            raise ValidationError({"url": ["Not a valid URL."]})
+        entry_id = QuickSaveQueue().push(user.id, body)
+        # Without the queue, the link is saved as usual:
+        if entry_id is not None:
+            return jsonify(id=entry_id, url=body["url"], status="queued"), 202
     if body:
         body["user_id"] = user.id
-    link = link_service.create_link(link_schema.load(body))
+    pending_link = link_schema.load(body)
+    link = link_service.create_link(pending_link)
+    # If the URL was already saved, the user's existing link comes back:
+    status_code = 201 if link is pending_link else 200
 
-    response = make_response(link_schema.dump(link), 201)
+    response = make_response(link_schema.dump(link), status_code)
     response.headers["Location"] = url_for("link_bp.get_link", id=link.id)
     return response
 
 
+@link_bp.route("", methods=["PATCH"])
+@requires_auth(allowed=["jwt", "api-key"])
+def update_links():
+    """Makes the same changes to many links at once, picked by `ids` or by a
+    `filter` with the same params as GET /links.
+    """
+    user = current_user()
+    body = LinkBulkUpdateSchema().load(request.get_json() or {})
+    changes = body.pop("changes")
+    updated_count = LinkService().update_links(user.id, body, changes)
+    return jsonify(message="Links updated successfully", links_updated=updated_count)
+
+
+@link_bp.route("", methods=["DELETE"])
+@requires_auth(allowed=["jwt", "api-key"])
+def delete_links():
+    """Deletes many links at once, picked by `ids` or by a `filter` with the
+    same params as GET /links.
+    """
+    user = current_user()
+    selection = LinkSelectionSchema().load(request.get_json() or {})
+    deleted_count = LinkService().delete_links(user.id, selection)
+    return jsonify(message="Links deleted successfully", links_deleted=deleted_count)
+
+
+@link_bp.route("/lookup", methods=["POST"])
+@requires_auth(allowed=["jwt", "api-key"])
+def lookup_links():
+    """Checks which of a list of URLs the current user has already saved,
+    returning the ID of the saved link (or null) for each one.
+    """
+    user = current_user()
+    urls = LinkLookupSchema().load(request.get_json() or {})["urls"]
+    link_ids = LinkService().lookup_urls(user.id, urls)
+    return jsonify(
+        results=[
+            {"url": url, "link_id": link_id} for url, link_id in zip(urls, link_ids)
+        ]
+    )
+
+
+@link_bp.route("/batch", methods=["POST"])
+@requires_auth(allowed=["jwt", "api-key"])
+@idempotent
+def post_links_batch():
+    """Creates many links at once. Each link is validated separately, and
+    results are returned per link, in the order they were sent.
+    """
+    user = current_user()
+    body = LinkBatchSchema().load(request.get_json() or {})
+
+    links = []
+    issues = {}
+    for index, item in enumerate(body["links"]):
+        try:
+            links.append(link_schema.load({**item, "user_id": user.id}))
+        except ValidationError as e:
+            issues[index] = e.messages
+    created = iter(LinkService().create_links(links))
+
+    serialize_link = compile_link_serializer()
+    results = []
+    created_count = 0
+    for index in range(len(body["links"])):
+        if index in issues:
+            results.append({"status": 422, "issues": issues[index]})
+            continue
+        # Links already saved come back with a 200:
+        link, is_new = next(created)
+        created_count += is_new
+        results.append({"status": 201 if is_new else 200, "link": serialize_link(link)})
+
+    if not issues:
+        status_code = 201
+    elif links:
+        status_code = 207
+    else:
+        status_code = 422
+    return (
+        jsonify(results=results, links_created=created_count, errors=len(issues)),
+        status_code,
+    )
+
+
+def check_link_access(id):
+    """Checks that a link exists and belongs to the current user, loading
+    only its IDs.
+    """
+    link = LinkService().get_link(id, field_names=("id",))
+    AuthService.check_link_access(current_user().id, link)
+
+
 @link_bp.route("/<int:id>", methods=["GET"])
 @requires_auth(allowed=["jwt", "api-key"])
+@conditional_on_data_version(check=check_link_access)
 def get_link(id):
-    """Retrieves and serializes a link at a given ID."""
+    """Retrieves and serializes a link at a given ID. The `fields` URL param
+    can restrict which fields are returned (i.e. `fields=id,url,title`)
+    """
     user = current_user()
-    link = LinkService().get_link(id)
+    field_names = LinkFieldsSchema().load({"fields": request.args.get("fields")})
+    field_names = field_names.get("field_names")
+    link = LinkService().get_link(id, field_names=field_names)
     AuthService.check_link_access(user.id, link)
-    return jsonify(link_schema.dump(link))
+    return jsonify(link_schema_for(field_names).dump(link))
 
 
 @link_bp.route("/<int:id>", methods=["PATCH"])
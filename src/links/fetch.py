@@ -0,0 +1,159 @@
+"""Fetches just enough of a web page to read its metadata.
+
+Titles and descriptions live in the document's `<head>`, so pages are
+streamed and reading stops as soon as `</head>` has arrived (or the head
+parser has seen enough), or after a byte cap or deadline (some pages are
+huge, and some never end). Only the bytes read are decoded, and responses
+that aren't HTML aren't read at all. Pages can also be fetched conditionally,
+so re-fetching one that hasn't changed costs a `304` and nothing to parse.
+"""
+
+import codecs
+import re
+import time
+from itertools import chain
+from typing import Iterator, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from requests.utils import get_encoding_from_headers
+from flask import current_app
+from .html import parse_head
+
+HEAD_END = re.compile(rb"</head\s*>", re.IGNORECASE)
+# A charset declared in the page itself, i.e. `<meta charset="utf-8">` or
+# `<meta http-equiv="Content-Type" content="text/html; charset=utf-8">`:
+META_CHARSET = re.compile(rb"<meta[^>]+charset=[\"']?([\w-]+)", re.IGNORECASE)
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+CHUNK_SIZE = 16 * 1024
+
+
+def fetch_session(max_connections: int) -> requests.Session:
+    """Returns a Session for fetching many pages at once (i.e. from several
+    threads), which keeps up to `max_connections` connections per host open
+    for reuse, for up to as many hosts.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=max_connections, pool_maxsize=max_connections
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def fetch_page_metadata(
+    url: str, session: requests.Session = None, validators: dict = None
+) -> Optional[dict]:
+    """Returns the metadata of an HTML page (see HeadParser.metadata), parsed
+    as it's downloaded, with the page's `etag` and `last_modified` validators.
+    Returns None if the URL isn't an HTML page, or if it hasn't changed since
+    the given validators (see open_page).
+    """
+    with open_page(url, session, validators) as response:
+        if response.status_code == 304:
+            return None
+        chunks = iter_page_head(response)
+        first_chunk = next(chunks, None)
+        if first_chunk is None:
+            return None
+        # Downloading stops once parsing finishes (which may be early):
+        metadata = parse_head(chain([first_chunk], chunks))
+    metadata["etag"] = response.headers.get("ETag")
+    metadata["last_modified"] = response.headers.get("Last-Modified")
+    return metadata
+
+
+def open_page(
+    url: str, session: requests.Session = None, validators: dict = None
+) -> requests.Response:
+    """Starts downloading a page, to read with iter_page_head (and close, i.e.
+    in a `with` block). Raises a requests.RequestException if it can't be
+    fetched, including for HTTP error responses.
+
+    Given `etag` and/or `last_modified` validators from an earlier response,
+    the request is conditional, and the response is a `304 Not Modified`
+    (without a body) if the page hasn't changed since.
+    """
+    config = current_app.config
+    headers = {"Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.1"}
+    if validators and validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators and validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    response = (session or requests).get(
+        url,
+        stream=True,
+        timeout=(config["METADATA_CONNECT_TIMEOUT"], config["METADATA_READ_TIMEOUT"]),
+        headers=headers,
+    )
+    try:
+        # Error pages have titles too, but not the page's:
+        response.raise_for_status()
+    except requests.HTTPError:
+        response.close()
+        raise
+    return response
+
+
+def iter_page_head(response: requests.Response) -> Iterator[str]:
+    """Yields the beginning of a page (see open_page) as text, chunk by chunk,
+    up to the end of its `<head>` (or until METADATA_MAX_BYTES or
+    METADATA_FETCH_DEADLINE seconds since the request, which are checked
+    between chunks, are reached). Yields nothing if it isn't an HTML page.
+    """
+    config = current_app.config
+    max_bytes = config["METADATA_MAX_BYTES"]
+    deadline = (
+        time.monotonic()
+        + config["METADATA_FETCH_DEADLINE"]
+        - response.elapsed.total_seconds()
+    )
+
+    content_type = response.headers.get("Content-Type", "text/html")
+    if not content_type.lower().startswith(HTML_CONTENT_TYPES):
+        return
+
+    decoder = None
+    bytes_read = 0
+    # The end of the previous chunk, in case `</head>` is split across two:
+    tail = b""
+    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+        chunk = chunk[: max_bytes - bytes_read]
+        bytes_read += len(chunk)
+        head_end = HEAD_END.search(tail + chunk)
+        if head_end:
+            chunk = chunk[: head_end.end() - len(tail)]
+        if decoder is None:
+            # The first chunk is enough to find a declared charset in:
+            decoder = codecs.getincrementaldecoder(page_encoding(response, chunk))(
+                errors="replace"
+            )
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+        if head_end or bytes_read >= max_bytes or time.monotonic() >= deadline:
+            break
+        tail = chunk[-16:]
+    if decoder is not None:
+        text = decoder.decode(b"", final=True)
+        if text:
+            yield text
+
+
+def page_encoding(response: requests.Response, body: bytes) -> str:
+    """Returns the encoding of a page: from its Content-Type header if it
+    gives a charset, otherwise from the page itself, otherwise UTF-8.
+    """
+    if "charset" in response.headers.get("Content-Type", "").lower():
+        return _known_encoding(get_encoding_from_headers(response.headers))
+    declared = META_CHARSET.search(body)
+    if declared:
+        return _known_encoding(declared.group(1).decode("ascii"))
+    return "utf-8"
+
+
+def _known_encoding(name: Optional[str]) -> str:
+    try:
+        return codecs.lookup(name).name
+    except (LookupError, TypeError):
+        return "utf-8"
@@ -0,0 +1,162 @@
+"""Reads a page's metadata (title, description and canonical URL) from its
+`<head>` in a single pass, as chunks of HTML arrive, without building a DOM.
+
+Only the few tags metadata is read from are parsed: everything else is
+skipped over with regular expressions (taking care not to find tags inside
+comments, scripts and styles). Parsing stops once the head is over, so the
+rest of the page can be skipped.
+"""
+
+import re
+from html import unescape
+from typing import Iterable, Optional
+
+# The start of a comment, or of a tag that's parsed or skipped over:
+MARKUP = re.compile(
+    r"<(?:(!--)|(/head|body|link|meta|script|style|title)(?=[\s/>]))", re.IGNORECASE
+)
+# The rest of a tag, allowing for quoted attribute values containing `>`:
+TAG_END = re.compile(r"""(?:[^>"']|"[^"]*"|'[^']*')*>""")
+ATTRIBUTE = re.compile(
+    r"""([^\s"'=/>]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+)))?"""
+)
+CLOSING_TAGS = {
+    name: re.compile(rf"</{name}\s*>", re.IGNORECASE)
+    for name in ("script", "style", "title")
+}
+CUT_OFF_TITLE = re.compile(r"<title\b[^>]*>(.*)", re.IGNORECASE | re.DOTALL)
+
+
+class HeadParser:
+    """An incremental parser for the metadata in a page's `<head>`. Feed it
+    chunks of text until `done` is set (at `</head>` or `<body>`, or as soon
+    as everything it looks for has been found), then read `metadata()`.
+    """
+
+    def __init__(self):
+        self.done = False
+        self.title = None
+        self.og_title = None
+        self.description = None
+        self.og_description = None
+        self.canonical_url = None
+        # The end of the text so far, if it's a comment or tag that hasn't
+        # fully arrived yet:
+        self._pending = ""
+
+    def feed(self, data: str) -> None:
+        if self.done:
+            return
+        text = self._pending + data
+        self._pending = text[self._parse(text) :]
+
+    def close(self) -> None:
+        # The page may have been cut off in the middle of the title:
+        if not self.done and self.title is None:
+            title = CUT_OFF_TITLE.match(self._pending)
+            if title:
+                self.title = unescape(title.group(1))
+        self._pending = ""
+
+    def _parse(self, text: str) -> int:
+        """Parses as much of `text` as possible, and returns where it stopped."""
+        position = 0
+        while not self.done:
+            markup = MARKUP.search(text, position)
+            if markup is None:
+                # Keep what may be the start of a tag split across chunks:
+                start = text.rfind("<", position)
+                return start if start >= 0 else len(text)
+            if markup.group(1):
+                end = text.find("-->", markup.end())
+                if end < 0:
+                    return markup.start()
+                position = end + 3
+                continue
+
+            tag_end = TAG_END.match(text, markup.end())
+            if tag_end is None:
+                return markup.start()
+            name = markup.group(2).lower()
+            if name in CLOSING_TAGS:
+                closing_tag = CLOSING_TAGS[name].search(text, tag_end.end())
+                if closing_tag is None:
+                    return markup.start()
+                if name == "title" and self.title is None:
+                    self.title = unescape(text[tag_end.end() : closing_tag.start()])
+                position = closing_tag.end()
+            else:
+                self._handle_tag(name, text[markup.end() : tag_end.end() - 1])
+                position = tag_end.end()
+            self._end_head_if_complete()
+        return len(text)
+
+    def _handle_tag(self, name: str, attributes: str) -> None:
+        if name in ("/head", "body"):
+            self.done = True
+        elif name == "meta":
+            # Most meta tags (viewport, twitter:*, etc.) are of no interest:
+            lowered = attributes.lower()
+            if "description" in lowered or "og:title" in lowered:
+                self._handle_meta(_attributes(attributes))
+        elif name == "link" and self.canonical_url is None:
+            if "canonical" in attributes.lower():
+                attrs = _attributes(attributes)
+                if "canonical" in (attrs.get("rel") or "").lower().split():
+                    self.canonical_url = attrs.get("href")
+
+    def _handle_meta(self, attrs: dict) -> None:
+        content = attrs.get("content")
+        if content is None:
+            return
+        if attrs.get("property") == "og:description":
+            self.og_description = self.og_description or content
+        elif attrs.get("property") == "og:title":
+            self.og_title = self.og_title or content
+        elif attrs.get("name") == "description":
+            self.description = self.description or content
+
+    def _end_head_if_complete(self) -> None:
+        # Nothing later in the head would be preferred over these:
+        if _clean(self.title) and _clean(self.og_description) and self.canonical_url:
+            self.done = True
+
+    def metadata(self) -> dict:
+        """Returns the page's `title` (from `<title>`, or `og:title`), its
+        `description` (from `og:description`, or the `description` meta
+        tag) and `canonical_url`, each stripped, or None if missing.
+        """
+        return {
+            "title": _clean(self.title) or _clean(self.og_title),
+            "description": _clean(self.og_description) or _clean(self.description),
+            "canonical_url": _clean(self.canonical_url),
+        }
+
+
+def parse_head(chunks: Iterable[str]) -> dict:
+    """Parses metadata from chunks of a page's HTML (or a whole page, as a
+    single chunk), consuming only as many chunks as needed.
+    """
+    parser = HeadParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+        if parser.done:
+            break
+    parser.close()
+    return parser.metadata()
+
+
+def _attributes(text: str) -> dict:
+    """Returns a tag's attributes, with lowercase names and unescaped values
+    (only the first of repeated attributes is kept, as browsers do).
+    """
+    attrs = {}
+    for name, double_quoted, single_quoted, unquoted in ATTRIBUTE.findall(text):
+        value = double_quoted or single_quoted or unquoted
+        attrs.setdefault(name.lower(), unescape(value))
+    return attrs
+
+
+def _clean(value: Optional[str]) -> Optional[str]:
+    value = value.strip() if value else None
+    return value or None
@@ -0,0 +1,97 @@
+"""Queues links saved with POST /links?async=1 ("quick saves") in the cache
+Redis, so the request only has to append them to a list. They're saved later,
+in batches, by whichever worker holds the queue's lock (see
+LinkService.save_queued_links).
+
+Entries are only removed from the queue once their batch is committed, so a
+worker dying mid-batch leaves them for the next one (saving a link twice only
+finds the first, see LinkService.create_links).
+"""
+
+import json
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+from urllib.parse import urlsplit
+import redis
+from flask import current_app
+from src.cache import get_redis
+
+
+class QuickSaveQueue:
+    KEY = "queue:links:quick_save"
+    LOCK_KEY = "queue:links:quick_save:lock"
+
+    def __init__(self):
+        self.redis = get_redis()
+        self.enabled = bool(self.redis)
+
+    def push(self, user_id: int, link: dict) -> Optional[str]:
+        """Queues a link to save for a user, as it was sent. Returns its
+        provisional ID, or None if it couldn't be queued.
+        """
+        if not self.enabled:
+            return None
+        entry_id = uuid.uuid4().hex
+        entry = {
+            "id": entry_id,
+            "user_id": user_id,
+            "link": link,
+            "queued_at": time.time(),
+        }
+        try:
+            self.redis.rpush(self.KEY, json.dumps(entry))
+        except redis.RedisError as e:
+            current_app.logger.warning(f"Quick save queue write failed: {e}")
+            return None
+        return entry_id
+
+    def peek(self, count: int) -> List[dict]:
+        """Returns up to `count` of the oldest entries, without removing them."""
+        return [
+            json.loads(entry) for entry in self.redis.lrange(self.KEY, 0, count - 1)
+        ]
+
+    def remove(self, count: int) -> None:
+        """Removes the `count` oldest entries, once they've been saved."""
+        self.redis.ltrim(self.KEY, count, -1)
+
+    @contextmanager
+    def lock(self, seconds: int) -> Iterator[bool]:
+        """Takes the queue's lock for up to `seconds`, yielding whether it was
+        taken (entries are peeked and removed by position, so only one worker
+        can save them at a time).
+        """
+        token = uuid.uuid4().hex
+        locked = self.redis.set(self.LOCK_KEY, token, nx=True, ex=seconds)
+        try:
+            yield bool(locked)
+        finally:
+            if locked:
+                self._unlock(token)
+
+    def _unlock(self, token: str) -> None:
+        # Only release the lock if it's still ours (it may have expired):
+        with self.redis.pipeline() as pipe:
+            try:
+                pipe.watch(self.LOCK_KEY)
+                if pipe.get(self.LOCK_KEY) == token.encode():
+                    pipe.multi()
+                    pipe.delete(self.LOCK_KEY)
+                    pipe.execute()
+            except redis.WatchError:
+                pass
+
+
+def looks_like_url(url) -> bool:
+    """A cheap check that a quick save's URL is worth queueing. It's validated
+    properly (see LinkSchema) once it's saved.
+    """
+    if not isinstance(url, str) or len(url) > 2048:
+        return False
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return False
+    return parts.scheme in ("http", "https") and "." in (parts.hostname or "")
@@ -0,0 +1,236 @@
+"""Spreads out page fetches per host, coordinated through the cache Redis so
+every worker (and every thread) shares the same view of each host.
+
+Each host gets at most METADATA_HOST_CONCURRENCY fetches at once and
+METADATA_HOST_RATE fetches per second. Hosts that answer with a 429 or 5xx
+error, or can't be reached, are backed off exponentially, and once they've
+failed METADATA_HOST_FAILURES times in a row their circuit is opened: fetches
+fail straight away for METADATA_HOST_CIRCUIT_SECONDS. After that, a single
+failure reopens it, and a success closes it.
+
+Without a cache Redis (or if it's failing), fetches aren't held back.
+"""
+
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from urllib.parse import urlsplit
+import redis
+import requests
+from flask import current_app
+from src.cache import get_redis
+
+# How long to wait before checking again for a free slot on a busy host:
+SLOT_POLL_INTERVAL = 0.5
+
+
+class HostBusy(Exception):
+    """Raised when a host can't be fetched from yet (it's at its limits, or
+    backing off), so the fetch should be retried after `retry_after` seconds.
+    """
+
+    def __init__(self, host: str, retry_after: float):
+        super().__init__(f"{host} is busy, retry after {retry_after:.1f}s")
+        self.host = host
+        self.retry_after = retry_after
+
+
+class HostUnavailable(Exception):
+    """Raised instead of fetching from a host whose circuit is open."""
+
+    def __init__(self, host: str):
+        super().__init__(f"{host} keeps failing, not fetching from it for now")
+        self.host = host
+
+
+class FetchScheduler:
+    """Hands out slots to fetch from each host (see slot)."""
+
+    KEY = "fetch:host:{host}:{name}"
+
+    def __init__(self):
+        config = current_app.config
+        self.redis = get_redis()
+        self.enabled = bool(self.redis)
+        self.concurrency = config["METADATA_HOST_CONCURRENCY"]
+        self.rate = config["METADATA_HOST_RATE"]
+        self.backoff = config["METADATA_HOST_BACKOFF"]
+        self.max_backoff = config["METADATA_HOST_MAX_BACKOFF"]
+        self.failure_threshold = config["METADATA_HOST_FAILURES"]
+        self.circuit_seconds = config["METADATA_HOST_CIRCUIT_SECONDS"]
+        self.max_wait = config["METADATA_HOST_MAX_WAIT"]
+        # Slots are released after each fetch, but expire in case a worker
+        # dies mid-fetch:
+        self.lease_seconds = 2 * config["METADATA_FETCH_DEADLINE"]
+
+    def key(self, host: str, name: str) -> str:
+        return self.KEY.format(host=host, name=name)
+
+    @contextmanager
+    def slot(self, url: str) -> Iterator[None]:
+        """Waits (up to METADATA_HOST_MAX_WAIT seconds) for a slot to fetch
+        a URL from its host, then records how the fetch went.
+
+        Raises HostUnavailable if the host's circuit is open, or HostBusy if
+        there's no slot in time, or if the host answered with a 429 error.
+        Hosts are backed off after 429 and 5xx errors, and connection errors
+        and timeouts (which are raised as usual).
+        """
+        host = (urlsplit(url).hostname or "").lower()
+        if not self.enabled or not host:
+            yield
+            return
+
+        token = self._wait_for_slot(host)
+        try:
+            yield
+        except requests.HTTPError as e:
+            status = e.response.status_code if e.response is not None else 0
+            if status == 429:
+                # The page is fine, it just has to wait its turn:
+                retry_after = self._record_failure(host, _retry_after(e.response))
+                raise HostBusy(host, retry_after) from e
+            if status >= 500:
+                self._record_failure(host, _retry_after(e.response))
+            else:
+                # The host is up, the page just isn't there:
+                self._record_success(host)
+            raise
+        except (requests.ConnectionError, requests.Timeout):
+            self._record_failure(host)
+            raise
+        else:
+            self._record_success(host)
+        finally:
+            if token:
+                self._release(host, token)
+
+    def _wait_for_slot(self, host: str) -> Optional[str]:
+        """Returns the token of the slot taken, or None if slots can't be
+        tracked right now.
+        """
+        token = uuid.uuid4().hex
+        give_up_at = time.monotonic() + self.max_wait
+        while True:
+            try:
+                wait = self._try_acquire(host, token)
+            except redis.RedisError as e:
+                current_app.logger.warning(f"Fetch scheduler read failed: {e}")
+                return None
+            if not wait:
+                return token
+            if time.monotonic() + wait > give_up_at:
+                raise HostBusy(host, wait)
+            time.sleep(wait)
+
+    def _try_acquire(self, host: str, token: str) -> float:
+        """Takes a slot for a host if it's free, and returns 0, otherwise
+        returns how long to wait before trying again. Raises HostUnavailable
+        if the host's circuit is open.
+        """
+        circuit_ms, backoff_ms = (
+            self.redis.pipeline(transaction=False)
+            .pttl(self.key(host, "circuit"))
+            .pttl(self.key(host, "backoff"))
+            .execute()
+        )
+        if circuit_ms > 0:
+            raise HostUnavailable(host)
+        if backoff_ms > 0:
+            return backoff_ms / 1000
+
+        now = time.time()
+        # Slots are a sorted set of tokens by expiry, so slots all expire in
+        # the order they were taken, and the rank of a new one is how many
+        # were taken before it:
+        slots_key = self.key(host, "slots")
+        _, _, rank, _ = (
+            self.redis.pipeline()
+            .zremrangebyscore(slots_key, "-inf", now)
+            .zadd(slots_key, {token: now + self.lease_seconds})
+            .zrank(slots_key, token)
+            .expire(slots_key, int(self.lease_seconds) + 1)
+            .execute()
+        )
+        if rank >= self.concurrency:
+            self.redis.zrem(slots_key, token)
+            return SLOT_POLL_INTERVAL
+
+        # Fetches started this second, in a window that expires on its own
+        # (counted once there's a slot, so waiting doesn't use up the rate):
+        rate_key = self.key(host, f"rate:{int(now)}")
+        fetches, _ = (
+            self.redis.pipeline(transaction=False)
+            .incr(rate_key)
+            .expire(rate_key, 2)
+            .execute()
+        )
+        if fetches > self.rate:
+            self.redis.zrem(slots_key, token)
+            return int(now) + 1 - now
+        return 0
+
+    def _release(self, host: str, token: str) -> None:
+        try:
+            self.redis.zrem(self.key(host, "slots"), token)
+        except redis.RedisError as e:
+            current_app.logger.warning(f"Fetch scheduler write failed: {e}")
+
+    def _record_success(self, host: str) -> None:
+        try:
+            self.redis.delete(self.key(host, "failures"))
+        except redis.RedisError as e:
+            current_app.logger.warning(f"Fetch scheduler write failed: {e}")
+
+    def _record_failure(self, host: str, retry_after: float = None) -> float:
+        """Backs a host off after a failed fetch (for longer with each
+        failure in a row, or as long as it asked for in a Retry-After header,
+        up to METADATA_HOST_MAX_BACKOFF seconds), opening its circuit after
+        too many. Returns how long the host is backed off for.
+        """
+        failures_key = self.key(host, "failures")
+        try:
+            failures, _ = (
+                self.redis.pipeline()
+                .incr(failures_key)
+                .expire(failures_key, 2 * self.circuit_seconds)
+                .execute()
+            )
+            backoff = self.backoff * 2 ** (failures - 1)
+            backoff = min(max(backoff, retry_after or 0), self.max_backoff)
+            if backoff > 0:
+                self.redis.set(self.key(host, "backoff"), 1, px=int(backoff * 1000))
+
+            if failures >= self.failure_threshold:
+                current_app.logger.warning(
+                    f"Opening the circuit for {host} after {failures} failures"
+                )
+                # Once it closes again, the next failure reopens it:
+                (
+                    self.redis.pipeline()
+                    .set(self.key(host, "circuit"), 1, ex=self.circuit_seconds)
+                    .set(
+                        failures_key,
+                        self.failure_threshold - 1,
+                        ex=2 * self.circuit_seconds,
+                    )
+                    .execute()
+                )
+                return self.circuit_seconds
+            return backoff
+        except redis.RedisError as e:
+            current_app.logger.warning(f"Fetch scheduler write failed: {e}")
+            return retry_after or self.backoff
+
+
+def _retry_after(response: Optional[requests.Response]) -> Optional[float]:
+    """Returns the number of seconds in a response's Retry-After header
+    (HTTP dates aren't supported), if any.
+    """
+    if response is None:
+        return None
+    try:
+        return max(float(response.headers["Retry-After"]), 0)
+    except (KeyError, ValueError):
+        return None
@@ -2,34 +2,93 @@
 and the database itself for links. Handles data CRUD operations.
 """
 
-from src.model import User, Link, db, DISALLOWED_UPDATE_FIELDS
+from src.model import (
+    User,
+    Link,
+    LinkSchema,
+    LinkTombstone,
+    db,
+    DISALLOWED_UPDATE_FIELDS,
+)
 from src.tweet.service import TwitterService
 from src.collections.service import CollectionService
-from src.signals import link_created
-from parsel import Selector
-from typing import Union
-from datetime import datetime, timezone
+from src.counters import CounterService
+from src.signals import link_created, links_created
+from src.cache import LinkUrlFilter, UrlMetadataCache
+from src.events.service import LinkEvents
+from src.exceptions import InvalidUsage
+from .serializers import (
+    LinkRecord,
+    compile_link_serializer,
+    link_columns,
+    record_columns,
+)
+from .urls import url_hash
+from .fetch import fetch_page_metadata, fetch_session
+from .scheduler import FetchScheduler, HostBusy
+from .quick_save import QuickSaveQueue
+from flask import current_app
+from marshmallow import ValidationError
+from sqlalchemy import (
+    BigInteger,
+    Float,
+    Integer,
+    cast,
+    column,
+    delete,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    tuple_,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import load_only
+from sqlalchemy.sql.expression import Values
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from itertools import islice, zip_longest
+from urllib.parse import urlsplit
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, wait
+from logging import Logger
 import requests
+import time
+
+logger = Logger(__name__)
+
+# How long a worker may hold the quick save queue (see save_queued_links):
+QUICK_SAVE_LOCK_SECONDS = 60
+
+# What extract_metadata_from_url returns:
+METADATA_KEYS = ("title", "description", "etag", "last_modified")
 
 
 class LinkService:
-    def get_link(self, link_id: int) -> Link:
+    def find_link(self, link_id: int) -> Optional[Link]:
+        """Returns the link at a given ID, or None if it doesn't exist (i.e.
+        for background tasks, where there's no request to 404).
+        """
+        return db.session.get(Link, link_id)
+
+    def get_link(self, link_id: int, field_names: tuple = None) -> Link:
         """Attempts to retrieve a link at a given ID. Raises a 404
-        error if not found
+        error if not found. If field_names are given, only those columns
+        (and the owner's ID) are loaded.
         """
-        link = Link.query.get_or_404(link_id)
+        link_query = Link.query
+        if field_names:
+            link_query = link_query.options(self._load_only(field_names, "user_id"))
+        link = link_query.get_or_404(link_id)
         return link
 
-    def get_many_links(self, user_id: int, params: dict) -> dict:
-        """Retrieves a collection of links added by the user, and handles
-        pagination (pagination params given by params dict). Returns links
-        within pagination window, and pagination information for the current
-        request.
+    def filter_links(self, user_id: int, show: str, collection_id: int = None):
+        """Returns a query for a user's links, filtered by read status
+        (`show` is one of `all`, `read` or `unread`) and collection.
         """
-
-        page, per_page, show = params["page"], params["per_page"], params["show"]
-        collection_id = params.get("collection")
-
         link_query = Link.query.filter(Link.user_id == user_id)
         if show == "read":
             link_query = link_query.filter(Link.read == True)
@@ -43,12 +102,61 @@ class LinkService:
         else:
             link_query = link_query.filter(Link.collection_id == None)
 
-        # Paginate results:
-        link_query = link_query.order_by(Link.date_added.desc()).paginate(
-            page=page, per_page=per_page
+        return link_query
+
+    def get_many_links(self, user_id: int, params: dict) -> dict:
+        """Retrieves a collection of links added by the user, and handles
+        pagination (pagination params given by params dict). Returns links
+        within pagination window, and pagination information for the current
+        request.
+
+        If a `cursor` is present in params, keyset pagination on
+        `(date_added, id)` is used instead of page numbers, so every page
+        costs the same regardless of how deep it is. Either way, a
+        `next_cursor` is returned to continue from.
+
+        Links are returned as lightweight LinkRecords rather than Link
+        instances (see serializers.py).
+        """
+
+        page, per_page, show = params["page"], params["per_page"], params["show"]
+        collection_id = params.get("collection")
+        cursor = params.get("cursor")
+        field_names = params.get("field_names")
+
+        link_query = self.filter_links(user_id, show, collection_id).order_by(
+            Link.date_added.desc(), Link.id.desc()
         )
+        # Links are selected as plain rows rather than ORM instances, and only
+        # the columns requested (plus those needed for the next cursor):
+        column_names = record_columns(field_names, "id", "date_added")
+        link_query = link_query.with_entities(*link_columns(column_names))
+        total_links = User.query.get(user_id).link_count
 
-        total_links = len(User.query.get(user_id).links)
+        if cursor:
+            # Fetch one extra row to find out whether there's another page,
+            # without having to count everything:
+            rows = (
+                link_query.filter(tuple_(Link.date_added, Link.id) < cursor)
+                .limit(per_page + 1)
+                .all()
+            )
+            links = LinkRecord.from_rows(column_names, rows)
+            has_next = len(links) > per_page
+            links = links[:per_page]
+            return {
+                "total_links": total_links,
+                "page": None,
+                "total_pages": None,
+                "next_page": None,
+                "per_page": per_page,
+                "next_cursor": self._cursor_for(links[-1]) if has_next else None,
+                "links": links,
+            }
+
+        # Paginate results:
+        link_query = link_query.paginate(page=page, per_page=per_page)
+        links = LinkRecord.from_rows(column_names, link_query.items)
 
         return {
             "total_links": total_links,
@@ -56,19 +164,110 @@ class LinkService:
             "total_pages": link_query.pages,
             "next_page": link_query.next_num,
             "per_page": per_page,
-            "links": link_query.items,
+            "next_cursor": (
+                self._cursor_for(links[-1]) if link_query.has_next else None
+            ),
+            "links": links,
         }
 
+    def search_links(self, user_id: int, params: dict) -> dict:
+        """Searches a user's links by title, description and URL, filtered
+        like get_many_links. Results are ordered by relevance and paginated
+        with a `(rank, id)` cursor.
+        """
+        per_page = params["per_page"]
+        column_names = record_columns(params.get("field_names"), "id")
+        link_query = self._search_query(user_id, params, column_names)
+        rows = link_query.limit(per_page + 1).all()
+
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        links = LinkRecord.from_rows(column_names, [row[1:] for row in rows])
+        return {
+            "per_page": per_page,
+            "next_cursor": (rows[-1][0], rows[-1].id) if has_next else None,
+            "links": links,
+        }
+
+    def _search_query(self, user_id: int, params: dict, column_names: tuple):
+        """Query for search_links: the rank, then the given columns, of the
+        links matching the search terms after the cursor, best first.
+        """
+        # Titles and descriptions are stemmed as English, but URL words
+        # aren't, so match either interpretation of the search terms:
+        terms = func.websearch_to_tsquery("english", params["q"]).op("||")(
+            func.websearch_to_tsquery("simple", params["q"])
+        )
+        # As a float8, so ranks round-trip exactly through the cursor (a real
+        # is compared at a higher precision than it's returned with):
+        rank = cast(func.ts_rank_cd(Link.search_vector, terms), Float(53))
+
+        link_query = (
+            self.filter_links(user_id, params["show"], params.get("collection"))
+            .filter(Link.search_vector.op("@@")(terms))
+            .order_by(rank.desc(), Link.id.desc())
+            .with_entities(rank, *link_columns(column_names))
+        )
+        if params.get("cursor"):
+            link_query = link_query.filter(tuple_(rank, Link.id) < params["cursor"])
+        return link_query
+
+    def iter_links(self, user_id: int, batch_size: int = 1000) -> Iterator[LinkRecord]:
+        """Yields all of a user's links as LinkRecords, oldest first. Rows are
+        streamed from a server-side cursor in batches, so memory use doesn't
+        grow with the number of links.
+        """
+        column_names = record_columns()
+        rows = iter(
+            Link.query.filter(Link.user_id == user_id)
+            .order_by(Link.id)
+            .with_entities(*link_columns(column_names))
+            .execution_options(stream_results=True)
+            .yield_per(batch_size)
+        )
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return
+            yield from LinkRecord.from_rows(column_names, batch)
+
+    @staticmethod
+    def _load_only(field_names: tuple, *required_fields: str):
+        """Query option to load only the given Link columns."""
+        columns = set(field_names) | set(required_fields)
+        return load_only(*(getattr(Link, column) for column in sorted(columns)))
+
+    @staticmethod
+    def _cursor_for(link: Union[Link, LinkRecord]) -> tuple:
+        """Returns the keyset position of a link, to continue pagination after it."""
+        return (link.date_added, link.id)
+
     def create_link(self, link: Link) -> Link:
         """Creates a new link in the database. Accepts a pending
         Link instance and returns a persisted one to serialize to JSON
         later using Marshmallow.
+
+        If the user already saved the same URL (once normalized, see
+        src.links.urls), their existing link is returned instead.
         """
         link.date_added = datetime.now(timezone.utc)
+        link.url_hash = url_hash(link.url)
+        # Bumped first, so the insert commits in order (see bump_data_version):
+        link.change_seq = User.bump_data_version(link.user_id)
 
-        db.session.add(link)
-        db.session.commit()
+        try:
+            # Insert under a savepoint, so a duplicate only undoes this insert:
+            with db.session.begin_nested():
+                db.session.add(link)
+        except IntegrityError as e:
+            if not self._is_duplicate_url(e):
+                raise
+            existing = Link.query.filter_by(
+                user_id=link.user_id, url_hash=link.url_hash
+            ).one()
+            return self._resave_link(existing)
 
+        CounterService().link_added(link)
         link_created.send(
             self,
             **{
@@ -78,11 +277,418 @@ class LinkService:
                 "link_description": link.description,
             },
         )
+        db.session.commit()
+        self.remember_urls([link])
+        LinkEvents().link_created(link.user_id, compile_link_serializer()(link))
+
+        return link
+
+    def create_links(self, links: List[Link]) -> List[Tuple[LinkRecord, bool]]:
+        """Creates a batch of pending Link instances with a single multi-row
+        INSERT, in one transaction. Returns (link, created) pairs as
+        LinkRecords, in the order links were given. URLs the user had already
+        saved come back as their existing link, with created set to False.
+        """
+        if not links:
+            return []
+        date_added = datetime.now(timezone.utc)
+        for link in links:
+            link.date_added = date_added
+        inserted = {
+            (link.user_id, link.url_hash): link for link in self.insert_links(links)
+        }
+
+        CounterService().links_added(inserted.values())
+
+        duplicate_keys = {
+            (link.user_id, link.url_hash) for link in links
+        } - inserted.keys()
+        changed_keys = inserted.keys()
+        existing = {}
+        if duplicate_keys:
+            column_names = record_columns(None, "user_id", "url_hash")
+            rows = (
+                Link.query.filter(
+                    tuple_(Link.user_id, Link.url_hash).in_(list(duplicate_keys))
+                )
+                .with_entities(*link_columns(column_names))
+                .all()
+            )
+            existing = {
+                (link.user_id, link.url_hash): link
+                for link in LinkRecord.from_rows(column_names, rows)
+            }
+            if current_app.config["DUPLICATE_LINKS"] == "bump":
+                self._bump_links(existing.values(), date_added)
+                changed_keys = inserted.keys() | existing.keys()
+        links_created.send(
+            self,
+            links=[
+                {
+                    "link_id": link.id,
+                    "link_url": link.url,
+                    "link_title": link.title,
+                    "link_description": link.description,
+                }
+                for link in inserted.values()
+            ],
+        )
+        db.session.commit()
+        self.remember_urls(inserted.values())
+        link_events = LinkEvents()
+        for user_id in {user_id for user_id, _ in changed_keys}:
+            link_events.links_changed(user_id)
+
+        results = []
+        returned = set()
+        for link in links:
+            key = (link.user_id, link.url_hash)
+            if key in inserted and key not in returned:
+                results.append((inserted[key], True))
+            else:
+                # Already saved before, or repeated in this batch:
+                results.append((existing.get(key) or inserted[key], False))
+            returned.add(key)
+        return results
+
+    def insert_links(
+        self, links: List[Link], batch_size: int = 1000
+    ) -> List[LinkRecord]:
+        """Inserts pending Link instances with multi-row INSERTs, skipping
+        URLs the user already saved (or that are repeated in links). Returns
+        the inserted links as LinkRecords, with their user_id and url_hash.
+        Bumps the users' data versions, but doesn't count the links or commit.
+        """
+        column_names = record_columns(None, "user_id", "url_hash")
+        inserted = []
+        # Core INSERTs don't autoflush, and links may refer to pending rows:
+        db.session.flush()
+        # Users are locked in a consistent order, so concurrent batches
+        # can't deadlock:
+        change_seqs = {
+            user_id: User.bump_data_version(user_id)
+            for user_id in sorted({link.user_id for link in links})
+        }
+        for start in range(0, len(links), batch_size):
+            values = []
+            for link in links[start : start + batch_size]:
+                link.url_hash = url_hash(link.url)
+                values.append(
+                    {
+                        "url": link.url,
+                        "url_hash": link.url_hash,
+                        "user_id": link.user_id,
+                        "title": link.title,
+                        "read": bool(link.read),
+                        "description": link.description,
+                        "collection_id": link.collection_id,
+                        "date_added": link.date_added or datetime.now(timezone.utc),
+                        "change_seq": change_seqs[link.user_id],
+                    }
+                )
+            rows = db.session.execute(
+                pg_insert(Link)
+                .values(values)
+                .on_conflict_do_nothing(index_elements=[Link.user_id, Link.url_hash])
+                .returning(*link_columns(column_names))
+            ).all()
+            inserted.extend(LinkRecord.from_rows(column_names, rows))
+        return inserted
+
+    def save_queued_links(self, batch_size: int) -> dict:
+        """Saves links queued as quick saves (see QuickSaveQueue), up to
+        `batch_size` at a time with create_links, until the queue is empty (or
+        this has run for half of QUICK_SAVE_LOCK_SECONDS). Each link is
+        validated like with create_link, and a `quick_save_done` event (with
+        the ID of the saved link) or a `quick_save_failed` event (with the
+        issues) is published for its provisional ID.
+
+        Returns how many links were `saved` and how many `failed`. Does
+        nothing if another worker is already saving them.
+        """
+        queue = QuickSaveQueue()
+        counts = {"saved": 0, "failed": 0}
+        if not queue.enabled:
+            return counts
+        link_schema = LinkSchema()
+        with queue.lock(QUICK_SAVE_LOCK_SECONDS) as locked:
+            if not locked:
+                return counts
+            stop_at = time.monotonic() + QUICK_SAVE_LOCK_SECONDS / 2
+            while time.monotonic() < stop_at:
+                entries = queue.peek(batch_size)
+                if not entries:
+                    break
+                valid_entries = []
+                links = []
+                issues = []
+                for entry in entries:
+                    try:
+                        links.append(
+                            link_schema.load(
+                                {**entry["link"], "user_id": entry["user_id"]}
+                            )
+                        )
+                        valid_entries.append(entry)
+                    except ValidationError as e:
+                        issues.append((entry, e.messages))
+                saved = self._save_queued_batch(valid_entries, links, issues)
+                # Only once they're committed:
+                queue.remove(len(entries))
+
+                link_events = LinkEvents()
+                for entry, link in saved:
+                    link_events.publish(
+                        entry["user_id"],
+                        "quick_save_done",
+                        {"id": entry["id"], "link_id": link.id},
+                    )
+                for entry, messages in issues:
+                    link_events.publish(
+                        entry["user_id"],
+                        "quick_save_failed",
+                        {"id": entry["id"], "issues": messages},
+                    )
+                counts["saved"] += len(saved)
+                counts["failed"] += len(issues)
+        return counts
+
+    def _save_queued_batch(
+        self, entries: List[dict], links: List[Link], issues: list
+    ) -> List[Tuple[dict, LinkRecord]]:
+        """Saves a batch of queued links (see save_queued_links), returning
+        (entry, link) pairs. If the database rejects the batch, i.e. for a
+        link whose user was deleted after queueing it, links are
+        saved one at a time instead, and the ones it rejects are added to
+        `issues`, so one bad link can't hold up the queue.
+        """
+        try:
+            return [
+                (entry, link)
+                for entry, (link, _) in zip(entries, self.create_links(links))
+            ]
+        except (DataError, IntegrityError):
+            db.session.rollback()
+
+        saved = []
+        for entry, link in zip(entries, links):
+            try:
+                [(saved_link, _)] = self.create_links([link])
+                saved.append((entry, saved_link))
+            except (DataError, IntegrityError) as e:
+                db.session.rollback()
+                logger.warning(f"Couldn't save queued link {entry['id']}: {e}")
+                issues.append((entry, {"_schema": ["This link couldn't be saved."]}))
+        return saved
+
+    def lookup_urls(self, user_id: int, urls: List[str]) -> List[Optional[int]]:
+        """Returns the ID of the user's link for each URL (once normalized),
+        or None where they haven't saved it. URLs that the user's LinkUrlFilter
+        rules out aren't looked up in the database.
+        """
+        url_hashes = [url_hash(url) for url in urls]
+        candidates = {
+            candidate
+            for candidate, maybe_saved in zip(
+                url_hashes, LinkUrlFilter().might_contain(user_id, url_hashes)
+            )
+            if maybe_saved
+        }
+        saved = {}
+        if candidates:
+            saved = dict(
+                Link.query.filter(
+                    Link.user_id == user_id, Link.url_hash.in_(candidates)
+                ).with_entities(Link.url_hash, Link.id)
+            )
+        return [saved.get(link_url_hash) for link_url_hash in url_hashes]
+
+    @staticmethod
+    def remember_urls(links: Iterable[Union[Link, LinkRecord]]) -> None:
+        """Adds the URLs of newly saved (and committed) links to their users'
+        LinkUrlFilter.
+        """
+        url_hashes = {}
+        for link in links:
+            url_hashes.setdefault(link.user_id, []).append(link.url_hash)
+        url_filter = LinkUrlFilter()
+        for user_id, user_url_hashes in url_hashes.items():
+            url_filter.add(user_id, user_url_hashes)
 
+    def _resave_link(self, link: Link) -> Link:
+        """Handles a user saving a URL they already have, according to the
+        DUPLICATE_LINKS setting, and returns their existing link.
+        """
+        if current_app.config["DUPLICATE_LINKS"] == "bump":
+            self.update_link(
+                link, {"date_added": datetime.now(timezone.utc), "read": False}
+            )
         return link
 
+    def _bump_links(self, links: Iterable[LinkRecord], date_added: datetime) -> None:
+        """Moves already-saved links to the top of their users' unread links.
+        Doesn't commit.
+        """
+        by_user = {}
+        for link in links:
+            by_user.setdefault(link.user_id, []).append(link)
+        for user_id, user_links in by_user.items():
+            self._update_links(
+                user_id,
+                {"ids": [link.id for link in user_links]},
+                {"date_added": date_added, "read": False},
+            )
+            for link in user_links:
+                link.date_added, link.read = date_added, False
+
+    @staticmethod
+    def _is_duplicate_url(error: IntegrityError) -> bool:
+        diag = getattr(error.orig, "diag", None)
+        return getattr(diag, "constraint_name", None) == "ix_link_user_url_hash"
+
+    def update_links(self, user_id: int, selection: dict, changes: dict) -> int:
+        """Applies the same changes (i.e. `read` or `collection_id`) to a
+        selection of a user's links (see LinkSelectionSchema) with a single
+        UPDATE, and returns how many links were changed.
+        """
+        updated_count = self._update_links(user_id, selection, changes)
+        db.session.commit()
+        if updated_count:
+            LinkEvents().links_changed(user_id)
+        return updated_count
+
+    def _update_links(self, user_id: int, selection: dict, changes: dict) -> int:
+        """Does the work of update_links, without committing."""
+        change_seq = User.bump_data_version(user_id)
+        criteria = self._selection_criteria(user_id, selection)
+        # Skip links that already have the new values:
+        criteria.append(
+            or_(
+                *(
+                    getattr(Link, key).is_distinct_from(value)
+                    for key, value in changes.items()
+                )
+            )
+        )
+        # Lock and capture the old values too, so counters can be moved along:
+        before = (
+            select(Link.id, Link.collection_id, Link.read)
+            .where(*criteria)
+            .with_for_update()
+            .subquery("before")
+        )
+        updated = (
+            update(Link)
+            .where(Link.id == before.c.id)
+            .values(**changes, change_seq=change_seq)
+            .returning(
+                before.c.collection_id.label("collection_id_before"),
+                before.c.read.label("read_before"),
+                Link.collection_id,
+                Link.read,
+            )
+            .cte("updated")
+        )
+        moves = db.session.execute(
+            select(updated, func.count()).group_by(*updated.c)
+        ).all()
+
+        updated_count = sum(row[-1] for row in moves)
+        if updated_count:
+            CounterService().bulk_links_moved(
+                (
+                    (user_id, collection_id_before, read_before),
+                    (user_id, collection_id, read),
+                    count,
+                )
+                for collection_id_before, read_before, collection_id, read, count in moves
+            )
+        return updated_count
+
+    def delete_links(self, user_id: int, selection: dict) -> int:
+        """Deletes a selection of a user's links (see LinkSelectionSchema)
+        with a single DELETE, and returns how many links were deleted.
+        A LinkTombstone is left for each of them.
+        """
+        change_seq = User.bump_data_version(user_id)
+        deleted = (
+            delete(Link)
+            .where(*self._selection_criteria(user_id, selection))
+            .returning(Link.id, Link.collection_id, Link.read)
+            .cte("deleted")
+        )
+        tombstones = (
+            insert(LinkTombstone)
+            .from_select(
+                ["user_id", "link_id", "change_seq", "deleted_at"],
+                select(
+                    literal(user_id),
+                    deleted.c.id,
+                    literal(change_seq),
+                    literal(datetime.now(timezone.utc)),
+                ),
+            )
+            .returning(LinkTombstone.link_id)
+            .cte("tombstones")
+        )
+        counts = db.session.execute(
+            select(deleted.c.collection_id, deleted.c.read, func.count())
+            .join(tombstones, tombstones.c.link_id == deleted.c.id)
+            .group_by(deleted.c.collection_id, deleted.c.read)
+        ).all()
+
+        deleted_count = sum(row[-1] for row in counts)
+        if deleted_count:
+            CounterService().bulk_links_removed(
+                {
+                    (user_id, collection_id, read): count
+                    for collection_id, read, count in counts
+                }
+            )
+        db.session.commit()
+        if deleted_count:
+            LinkEvents().links_changed(user_id)
+        return deleted_count
+
+    @staticmethod
+    def _selection_criteria(user_id: int, selection: dict) -> list:
+        """Returns WHERE criteria for a selection of a user's links, loaded
+        with LinkSelectionSchema.
+        """
+        criteria = [Link.user_id == user_id]
+        if "ids" in selection:
+            criteria.append(Link.id.in_(selection["ids"]))
+            return criteria
+
+        link_filter = selection["filter"]
+        if link_filter["show"] == "read":
+            criteria.append(Link.read == True)
+        elif link_filter["show"] == "unread":
+            criteria.append(Link.read == False)
+        # Unlike GET /links, an unknown collection shouldn't widen the
+        # selection to every link, so it simply matches nothing:
+        criteria.append(Link.collection_id == link_filter.get("collection"))
+        return criteria
+
     def update_link(self, link: Link, changes: dict) -> None:
-        """Updates a link given a set of changes in a dict."""
+        """Updates a link given a set of changes in a dict. Raises an
+        InvalidUsage error if the URL is changed to one the user already saved.
+        """
+        if "url" in changes and changes["url"] != link.url:
+            new_url_hash = url_hash(changes["url"])
+            duplicate = Link.query.filter(
+                Link.user_id == link.user_id,
+                Link.url_hash == new_url_hash,
+                Link.id != link.id,
+            ).first()
+            if duplicate:
+                raise InvalidUsage(
+                    "This URL has already been saved",
+                    status_code=409,
+                    payload={"link_id": duplicate.id},
+                )
+            link.url_hash = new_url_hash
+        counter_key = CounterService.key_for(link)
         change_counter = 0
         for key, value in changes.items():
             if hasattr(link, key) and getattr(link, key) != value:
@@ -91,55 +697,410 @@ class LinkService:
                     # if the values actually differ (and are allowed)
                     setattr(link, key, value)
                     change_counter += 1
+                    if key in ("title", "description"):
+                        # It's not the page's metadata anymore, so it isn't
+                        # refreshed from the page (see refresh_links_metadata):
+                        link.metadata_checked_at = None
+                        link.etag = link.last_modified = None
         # If we've made any changes, commit them:
         if change_counter > 0:
+            link.change_seq = User.bump_data_version(link.user_id)
+            CounterService().link_moved(counter_key, CounterService.key_for(link))
             db.session.commit()
+            if "url" in changes:
+                self.remember_urls([link])
+            LinkEvents().link_updated(link.user_id, compile_link_serializer()(link))
 
     def delete_link(self, link: Link) -> None:
-        """Deletes a given Link instance."""
+        """Deletes a given Link instance, leaving a LinkTombstone."""
 
         try:
+            change_seq = User.bump_data_version(link.user_id)
+            CounterService().link_removed(link)
+            db.session.add(
+                LinkTombstone(
+                    user_id=link.user_id,
+                    link_id=link.id,
+                    change_seq=change_seq,
+                    deleted_at=datetime.now(timezone.utc),
+                )
+            )
+            user_id, link_id = link.user_id, link.id
             db.session.delete(link)
             db.session.commit()
+            LinkEvents().link_deleted(user_id, link_id)
         except Exception as e:
             print(f"Delete exception: {e}")
             raise
 
     @staticmethod
-    def extract_metadata_from_url(url: str) -> dict:
+    def extract_metadata_from_url(url: str, session: requests.Session = None) -> dict:
         """Attempts to extract information about a website given a URL. If a specific
         service is available to fetch custom metadata, it will be used. Otherwise,
         the page's HTML will be analyzed directly.
 
         Args:
             url: The URL to check.
+            session: A requests Session to fetch the page with, if any.
 
         Returns:
-            A dict with `title` and `description` keys
+            A dict with `title` and `description` keys, and the page's `etag`
+            and `last_modified` validators (to refresh it with later)
+
+        Metadata is cached for all users by normalized URL (see
+        UrlMetadataCache), including failures to fetch it, so pages are only
+        fetched on a miss. Fetch errors are raised, or come back as no
+        metadata while they're cached. Fetches also wait their turn for the
+        page's host (see FetchScheduler), and may raise HostBusy or
+        HostUnavailable instead.
+        """
+        if not url:
+            return dict.fromkeys(METADATA_KEYS)
+        metadata_cache = UrlMetadataCache()
+        cache_key = url_hash(url)
+        cached = metadata_cache.get(cache_key)
+        if cached is not None:
+            return {key: cached.get(key) for key in METADATA_KEYS}
+
+        try:
+            metadata = LinkService._fetch_metadata(url, session)
+        except requests.RequestException:
+            metadata_cache.set(cache_key, {}, failed=True)
+            raise
+        metadata_cache.set(cache_key, metadata)
+        return metadata
+
+    @staticmethod
+    def _fetch_metadata(
+        url: str, session: requests.Session = None, validators: dict = None
+    ) -> Optional[dict]:
+        """Does the work of extract_metadata_from_url, without the cache. Given
+        validators, returns None if the page hasn't changed since.
         """
         title = None
         description = None
-        if url:
-            if url.startswith("https://twitter.com"):
-                # If we have a Twitter URL, we can use the API to get information
-                # rather than scrape the page directly:
-                twitter_service = TwitterService()
-                tweet_id = twitter_service.parse_tweet_id_from_url(url)
-                tweet = twitter_service.get_tweet_by_id(tweet_id)
-                title = tweet.title
-                description = tweet.text
-            else:
-                html_text = requests.get(url).text
-                selector = Selector(text=html_text)
-                title = selector.xpath("//title/text()").get()
-                description = selector.xpath(
-                    '//meta[@property="og:description"]/@content'
-                ).get()
-                if not description:
-                    description = selector.xpath(
-                        '//meta[@name="description"]/@content'
-                    ).get()
+        page_validators = {}
+        if url.startswith("https://twitter.com"):
+            # If we have a Twitter URL, we can use the API to get information
+            # rather than scrape the page directly:
+            twitter_service = TwitterService()
+            tweet_id = twitter_service.parse_tweet_id_from_url(url)
+            tweet = twitter_service.get_tweet_by_id(tweet_id)
+            title = tweet.title
+            description = tweet.text
+        else:
+            with FetchScheduler().slot(url):
+                metadata = fetch_page_metadata(url, session, validators)
+            if metadata is None and validators:
+                return None
+            metadata = metadata or {}
+            title = metadata.get("title")
+            description = metadata.get("description")
+            page_validators = metadata
         return {
             "title": title.strip() if title else None,
             "description": description.strip() if description else None,
+            "etag": page_validators.get("etag"),
+            "last_modified": page_validators.get("last_modified"),
+        }
+
+    def extract_metadata_from_urls(
+        self, urls: Dict[int, str]
+    ) -> Tuple[Dict[int, dict], Dict[int, float]]:
+        """Extracts metadata for a batch of links (see extract_metadata_from_url)
+        given their URLs by ID, fetching many at once (see _fetch_concurrently).
+
+        Returns the metadata by link ID, and the links to try again later
+        with how many seconds to wait first. Links whose pages couldn't be
+        fetched get no title or description.
+        """
+        results, retry_after = self._fetch_concurrently(
+            urls,
+            lambda link_id, session: self.extract_metadata_from_url(
+                urls[link_id], session
+            ),
+        )
+        metadata = {
+            link_id: result or dict.fromkeys(METADATA_KEYS)
+            for link_id, result in results.items()
         }
+        return metadata, retry_after
+
+    def _fetch_concurrently(
+        self,
+        urls: Dict[int, str],
+        fetch: Callable[[int, requests.Session], Optional[dict]],
+    ) -> Tuple[Dict[int, Optional[dict]], Dict[int, float]]:
+        """Calls `fetch` with each link ID (and a shared Session), up to
+        METADATA_BATCH_WORKERS at once, over a shared pool of connections.
+        Links are fetched taking turns between hosts, so a host with many
+        links doesn't hold up the rest.
+
+        Returns the results by link ID (None for links whose pages couldn't be
+        fetched), and the links to try again later (the ones that weren't done
+        within METADATA_BATCH_DEADLINE seconds, or whose hosts were busy, see
+        FetchScheduler) with how many seconds to wait first.
+        """
+        config = current_app.config
+        app = current_app._get_current_object()
+        workers = min(config["METADATA_BATCH_WORKERS"], len(urls)) or 1
+        session = fetch_session(workers)
+
+        def fetch_in_app_context(link_id: int) -> Optional[dict]:
+            # The app context isn't shared with other threads:
+            with app.app_context():
+                return fetch(link_id, session)
+
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            futures = {
+                executor.submit(fetch_in_app_context, link_id): link_id
+                for link_id in self._interleave_by_host(urls)
+            }
+            done, _ = wait(futures, timeout=config["METADATA_BATCH_DEADLINE"])
+        finally:
+            # Don't start on the rest after the deadline, or wait for fetches
+            # still going (they give up on their own, see iter_page_head):
+            executor.shutdown(wait=False, cancel_futures=True)
+            session.close()
+
+        results = {}
+        retry_after = {}
+        for future in done:
+            link_id = futures[future]
+            try:
+                results[link_id] = future.result()
+            except HostBusy as e:
+                retry_after[link_id] = e.retry_after
+            except Exception as e:
+                # One bad page shouldn't lose the rest of the batch:
+                logger.warning(f"Couldn't get metadata for {urls[link_id]}: {e}")
+                results[link_id] = None
+        for link_id in urls:
+            if link_id not in results:
+                retry_after.setdefault(link_id, 0)
+        return results, retry_after
+
+    @staticmethod
+    def _interleave_by_host(urls: Dict[int, str]) -> List[int]:
+        """Returns link IDs ordered so that each host's links are spread out:
+        the first link for every host, then the second, and so on.
+        """
+        by_host = {}
+        for link_id, url in urls.items():
+            by_host.setdefault(urlsplit(url).hostname, []).append(link_id)
+        return [
+            link_id
+            for turn in zip_longest(*by_host.values())
+            for link_id in turn
+            if link_id is not None
+        ]
+
+    def update_links_metadata(self, metadata: Dict[int, dict]) -> Dict[int, int]:
+        """Sets the titles and descriptions found for a batch of links (see
+        extract_metadata_from_urls), and their pages' validators, with a
+        single UPDATE, leaving alone any link that was given a title in the
+        meantime. Returns the user ID of each link that still exists, by
+        link ID.
+        """
+        owners = dict(
+            db.session.execute(
+                select(Link.id, Link.user_id).where(Link.id.in_(metadata))
+            ).all()
+        )
+        found = [
+            (link_id, found_metadata)
+            for link_id, found_metadata in metadata.items()
+            if link_id in owners
+            and (found_metadata["title"] or found_metadata["description"])
+        ]
+        if not found:
+            return owners
+
+        # Users are locked in a consistent order, so concurrent batches
+        # can't deadlock:
+        change_seqs = {
+            user_id: User.bump_data_version(user_id)
+            for user_id in sorted({owners[link_id] for link_id, _ in found})
+        }
+        new_values = self._metadata_values(
+            (
+                link_id,
+                found_metadata,
+                found_metadata,
+                change_seqs[owners[link_id]],
+            )
+            for link_id, found_metadata in found
+        )
+        updated_user_ids = (
+            db.session.execute(
+                update(Link)
+                .where(Link.id == new_values.c.id, Link.title.is_(None))
+                .values(
+                    title=new_values.c.title,
+                    description=func.coalesce(
+                        new_values.c.description, Link.description
+                    ),
+                    etag=new_values.c.etag,
+                    last_modified=new_values.c.last_modified,
+                    metadata_checked_at=datetime.now(timezone.utc),
+                    change_seq=new_values.c.change_seq,
+                )
+                .returning(Link.user_id)
+                .execution_options(synchronize_session=False)
+            )
+            .scalars()
+            .all()
+        )
+        db.session.commit()
+        for user_id in sorted(set(updated_user_ids)):
+            LinkEvents().links_changed(user_id)
+        return owners
+
+    def set_metadata_validators(self, link: Link, metadata: dict) -> None:
+        """Records that a link's title and description were just taken from
+        its page (see extract_metadata_from_url), with the page's validators,
+        so it can be refreshed later (see refresh_links_metadata).
+        """
+        link.etag = metadata.get("etag")
+        link.last_modified = metadata.get("last_modified")
+        link.metadata_checked_at = datetime.now(timezone.utc)
+        db.session.commit()
+
+    def refresh_links_metadata(self, budget: int) -> dict:
+        """Fetches the pages of up to `budget` links again, if their metadata
+        was taken from them more than METADATA_REFRESH_DAYS ago, unread and
+        recently saved links first. Requests are conditional, so pages that
+        haven't changed cost a `304` and aren't parsed. Titles and
+        descriptions that changed are updated (but not cleared) with a single
+        UPDATE, along with when each link was checked.
+
+        Returns how many links were `checked` and `changed`, and how many were
+        `deferred` to the next run (i.e. because their hosts were busy).
+        """
+        config = current_app.config
+        checked_before = datetime.now(timezone.utc) - timedelta(
+            days=config["METADATA_REFRESH_DAYS"]
+        )
+        due = {
+            link.id: link
+            for link in db.session.execute(
+                select(
+                    Link.id,
+                    Link.user_id,
+                    Link.url,
+                    Link.title,
+                    Link.description,
+                    Link.etag,
+                    Link.last_modified,
+                )
+                .where(
+                    Link.metadata_checked_at.isnot(None),
+                    Link.metadata_checked_at < checked_before,
+                )
+                .order_by(Link.read, Link.date_added.desc(), Link.id.desc())
+                .limit(budget)
+            )
+        }
+        results, retry_after = self._fetch_concurrently(
+            {link_id: link.url for link_id, link in due.items()},
+            lambda link_id, session: self._fetch_metadata(
+                due[link_id].url,
+                session,
+                {
+                    "etag": due[link_id].etag,
+                    "last_modified": due[link_id].last_modified,
+                },
+            ),
+        )
+
+        # Only changes are written; a page without a title (say, while it's
+        # down for maintenance) doesn't clear the one found before:
+        changes = {}
+        metadata_cache = UrlMetadataCache()
+        for link_id, result in results.items():
+            link = due[link_id]
+            if result is None:
+                continue
+            metadata_cache.set(url_hash(link.url), result)
+            if (result["title"] and result["title"] != link.title) or (
+                result["description"] and result["description"] != link.description
+            ):
+                changes[link_id] = result
+
+        change_seqs = {
+            user_id: User.bump_data_version(user_id)
+            for user_id in sorted({due[link_id].user_id for link_id in changes})
+        }
+        if results:
+            new_values = self._metadata_values(
+                (
+                    link_id,
+                    changes.get(link_id, {}),
+                    result or {},
+                    change_seqs.get(due[link_id].user_id)
+                    if link_id in changes
+                    else None,
+                )
+                for link_id, result in results.items()
+            )
+            db.session.execute(
+                update(Link)
+                # Links edited since they were picked aren't refreshed anymore:
+                .where(Link.id == new_values.c.id, Link.metadata_checked_at.isnot(None))
+                .values(
+                    title=func.coalesce(new_values.c.title, Link.title),
+                    description=func.coalesce(
+                        new_values.c.description, Link.description
+                    ),
+                    etag=func.coalesce(new_values.c.etag, Link.etag),
+                    last_modified=func.coalesce(
+                        new_values.c.last_modified, Link.last_modified
+                    ),
+                    metadata_checked_at=datetime.now(timezone.utc),
+                    change_seq=func.coalesce(new_values.c.change_seq, Link.change_seq),
+                )
+                .execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+        for user_id in change_seqs:
+            LinkEvents().links_changed(user_id)
+        return {
+            "checked": len(results),
+            "changed": len(changes),
+            "deferred": len(retry_after),
+        }
+
+    @staticmethod
+    def _metadata_values(rows: Iterable[tuple]) -> Values:
+        """Returns a VALUES list of metadata to update links with, from rows of
+        (link ID, metadata, page validators, change_seq).
+        """
+        title_length = Link.title.type.length
+        return values(
+            column("id", Integer),
+            column("title", Link.title.type),
+            column("description", Link.description.type),
+            column("etag", Link.etag.type),
+            column("last_modified", Link.last_modified.type),
+            column("change_seq", BigInteger),
+            name="new_values",
+        ).data(
+            [
+                (
+                    link_id,
+                    # Overly long titles would fail the whole batch:
+                    (metadata.get("title") or "")[:title_length] or None,
+                    metadata.get("description"),
+                    _truncate(validators.get("etag"), Link.etag),
+                    _truncate(validators.get("last_modified"), Link.last_modified),
+                    change_seq,
+                )
+                for link_id, metadata, validators, change_seq in rows
+            ]
+        )
+
+
+def _truncate(value: Optional[str], column) -> Optional[str]:
+    """Returns a validator, or None if it's too long to store (and send back)."""
+    return value if value and len(value) <= column.type.length else None
@@ -1,5 +1,6 @@
-from src.signals import link_created
-from src.tasks import populate_link_metadata
+from src.signals import link_created, links_created
+from src.outbox import Outbox
+from src.tasks import populate_link_metadata, populate_links_metadata
 
 
 def link_created_receive(sender, **kwargs):
@@ -7,8 +8,20 @@ def link_created_receive(sender, **kwargs):
     link_url = kwargs["link_url"]
     link_title = kwargs["link_title"]
     if not link_title:
-        populate_link_metadata.delay(link_id, link_url)
+        Outbox().add(populate_link_metadata.name, link_id, link_url)
+
+
+def links_created_receive(sender, **kwargs):
+    # Send every title-less link off in a single task, not one per link:
+    untitled_links = [
+        (link["link_id"], link["link_url"])
+        for link in kwargs["links"]
+        if not link["link_title"]
+    ]
+    if untitled_links:
+        Outbox().add(populate_links_metadata.name, untitled_links)
 
 
 # Subscribe to signals:
 link_created.connect(link_created_receive)
+links_created.connect(links_created_receive)
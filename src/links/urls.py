@@ -0,0 +1,63 @@
+"""Normalizes URLs so that variants of the same address (http/https, `www.`,
+trailing slashes, tracking params...) can be recognized as one link.
+"""
+
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+# Query params added by analytics/ad platforms that don't change the page:
+TRACKING_PARAMS = {
+    "fbclid",
+    "gclid",
+    "dclid",
+    "msclkid",
+    "yclid",
+    "igshid",
+    "mc_cid",
+    "mc_eid",
+    "_hsenc",
+    "_hsmi",
+    "ref_src",
+}
+TRACKING_PARAM_PREFIXES = ("utm_",)
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def is_tracking_param(name: str) -> bool:
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PARAM_PREFIXES)
+
+
+def normalize_url(url: str) -> str:
+    """Returns a canonical form of a URL for duplicate detection (not for
+    display or fetching). The scheme is dropped for http(s) URLs, the host
+    is lowercased without `www.`, default ports, fragments, trailing slashes
+    and tracking params are removed, and remaining params are sorted.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+
+    path = parts.path.rstrip("/") or "/"
+    params = sorted(
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not is_tracking_param(name)
+    )
+    query = f"?{urlencode(params)}" if params else ""
+    # Fragments usually point within a page, except for "#!" and "#/" routes
+    # used by single-page apps:
+    fragment = f"#{parts.fragment}" if parts.fragment[:1] in ("!", "/") else ""
+
+    prefix = "" if scheme in DEFAULT_PORTS else f"{scheme}://"
+    return f"{prefix}{host}{path}{query}{fragment}"
+
+
+def url_hash(url: str) -> str:
+    """Hashes the normalized form of a URL, for storing in `Link.url_hash`."""
+    return hashlib.sha1(normalize_url(url).encode("utf-8")).hexdigest()
@@ -6,6 +6,7 @@ from faker import Faker
 from faker.providers import internet, date_time, company, misc
 from src.model import User, Link, db
 from src.auth.service import AuthService
+from src.counters import CounterService
 from typing import List, Tuple
 
 fake = Faker("en_US")
@@ -45,6 +46,7 @@ def seed_fake_users(num_users: int = 30) -> List[User]:
 
 
 def seed_links(user_id: int, num_links: int = 30):
+    links = []
     for _ in range(num_links):
         link = Link(
             user_id=user_id,
@@ -54,6 +56,8 @@ def seed_links(user_id: int, num_links: int = 30):
             read=fake.boolean(chance_of_getting_true=50),
         )
         db.session.add(link)
+        links.append(link)
+    CounterService().links_added(links)
     db.session.commit()
 
 
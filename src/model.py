@@ -1,9 +1,36 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 from datetime import datetime, timezone
 from flask_sqlalchemy import SQLAlchemy
-from marshmallow import Schema, fields, ValidationError, post_load, EXCLUDE, validate
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from marshmallow import (
+    Schema,
+    fields,
+    ValidationError,
+    post_load,
+    validates_schema,
+    EXCLUDE,
+    validate,
+)
 from src.exceptions import InvalidUsage
 
-DISALLOWED_UPDATE_FIELDS = ("id", "user_id")
+DISALLOWED_UPDATE_FIELDS = (
+    "id",
+    "user_id",
+    "url_hash",
+    "search_vector",
+    "change_seq",
+    "etag",
+    "last_modified",
+    "metadata_checked_at",
+)
+# Most links that can be created (picked by ID for a bulk update/delete, or
+# looked up by URL) with one request:
+MAX_BATCH_LINKS = 500
+# Most changes (links, collections and deleted links) returned by one
+# GET /sync request:
+MAX_SYNC_CHANGES = 1000
+# The kinds of changes GET /sync returns, in the order they're synced:
+SYNC_STAGES = ("collections", "links", "deleted_links")
 
 # Initially, the database isn't bound to an app. This is so
 # we can bind to one while our app is being created in our
@@ -26,6 +53,18 @@ class User(db.Model):
     email = db.Column(db.String(255), nullable=True)
     external_uid = db.Column(db.String(255), nullable=True)
 
+    # Denormalized counters, maintained by CounterService on every link write:
+    link_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    read_link_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+
+    # Incremented on every change to the user's links or collections. Used
+    # to answer conditional requests without querying for the data itself:
+    data_version = db.Column(
+        db.BigInteger, nullable=False, default=0, server_default="0"
+    )
+
     links = db.relationship("Link", backref="user", lazy=True)
 
     def __repr__(self):
@@ -52,6 +91,23 @@ class User(db.Model):
     def user_at_uid(cls, uid: str):
         return cls.query.filter_by(external_uid=uid).first()
 
+    @classmethod
+    def bump_data_version(cls, user_id: int) -> int:
+        """Increments a user's data version in the current transaction (without
+        committing) and returns the new version.
+
+        This locks the user's row until the transaction ends, so each user's
+        writes commit in version order. Writes should bump the version before
+        changing links or collections, and use it as their `change_seq`.
+        """
+        return db.session.execute(
+            db.update(cls)
+            .where(cls.id == user_id)
+            .values(data_version=cls.data_version + 1)
+            .returning(cls.data_version)
+            .execution_options(synchronize_session=False)
+        ).scalar()
+
 
 class Link(db.Model):
     """Represents a link stored in the database. All datetimes are stored as UTC."""
@@ -68,11 +124,121 @@ class Link(db.Model):
     title = db.Column(db.String(512), nullable=True)
     read = db.Column(db.Boolean, nullable=False, default=False)
     description = db.Column(db.String)
+    # The owner's data version when the link last changed, for delta sync:
+    change_seq = db.Column(db.BigInteger, nullable=False, default=0, server_default="0")
+    # Hash of the normalized URL (see src.links.urls), unique per user so the
+    # same page can't be saved twice. Links saved before this existed may
+    # not have one:
+    url_hash = db.Column(db.String(40))
+    # When the title and description were last fetched from the page, and the
+    # page's validators then, to re-fetch it conditionally. Left empty for
+    # links whose title wasn't taken from the page (or was changed since):
+    metadata_checked_at = db.Column(db.DateTime)
+    etag = db.Column(db.String(256))
+    last_modified = db.Column(db.String(64))
+    # Generated from the title, description and words in the URL (minus the
+    # scheme), weighted in that order. Deferred so it isn't loaded with links:
+    search_vector = db.deferred(
+        db.Column(
+            TSVECTOR,
+            db.Computed(
+                "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+                "setweight(to_tsvector('english', coalesce(description, '')), 'B') || "
+                "setweight(to_tsvector('simple', regexp_replace("
+                "regexp_replace(url, '^[a-z]+://(www\\.)?', '', 'i'), "
+                "'[^[:alnum:]]+', ' ', 'g')), 'C')",
+                persisted=True,
+            ),
+        )
+    )
 
     def __repr__(self):
         return "<Link: {} [{}]>".format(self.url, self.id)
 
 
+# Indexes backing the filter/sort combinations used to list links (see
+# LinkService.filter_links). Links outside of a collection get partial indexes:
+db.Index(
+    "ix_link_user_read_collection_date",
+    Link.user_id,
+    Link.read,
+    Link.collection_id,
+    Link.date_added.desc(),
+    Link.id.desc(),
+)
+db.Index(
+    "ix_link_user_collection_date",
+    Link.user_id,
+    Link.collection_id,
+    Link.date_added.desc(),
+    Link.id.desc(),
+)
+db.Index(
+    "ix_link_user_read_date_no_collection",
+    Link.user_id,
+    Link.read,
+    Link.date_added.desc(),
+    Link.id.desc(),
+    postgresql_where=Link.collection_id.is_(None),
+)
+db.Index(
+    "ix_link_user_date_no_collection",
+    Link.user_id,
+    Link.date_added.desc(),
+    Link.id.desc(),
+    postgresql_where=Link.collection_id.is_(None),
+)
+db.Index("ix_link_search_vector", Link.search_vector, postgresql_using="gin")
+db.Index("ix_link_user_url_hash", Link.user_id, Link.url_hash, unique=True)
+db.Index("ix_link_user_change_seq", Link.user_id, Link.change_seq, Link.id)
+# Links to refresh the metadata of, in order (see refresh_links_metadata):
+db.Index(
+    "ix_link_metadata_refresh",
+    Link.read,
+    Link.date_added.desc(),
+    Link.id.desc(),
+    postgresql_where=Link.metadata_checked_at.isnot(None),
+)
+
+
+class LinkTombstone(db.Model):
+    """Records a deleted link, so clients syncing changes (see
+    src.sync.service) find out about it.
+    """
+
+    __tablename__ = "link_tombstone"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    link_id = db.Column(db.Integer, nullable=False)
+    # The owner's data version when the link was deleted:
+    change_seq = db.Column(db.BigInteger, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False)
+
+
+db.Index(
+    "ix_link_tombstone_user_change_seq",
+    LinkTombstone.user_id,
+    LinkTombstone.change_seq,
+    LinkTombstone.id,
+)
+
+
+class OutboxMessage(db.Model):
+    """A Celery task to send, written in the same transaction as the change
+    that called for it, and relayed to the broker afterwards (see
+    src.outbox).
+    """
+
+    __tablename__ = "outbox_message"
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    # The task's registered name, i.e. `src.tasks.populate_link_metadata`:
+    task = db.Column(db.String(255), nullable=False)
+    args = db.Column(JSONB, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+
+
 class Collection(db.Model):
     """Represents a collection of links in the database."""
 
@@ -85,8 +251,148 @@ class Collection(db.Model):
     archived = db.Column(db.Boolean)
     order = db.Column(db.Integer)
 
+    # Denormalized counters, maintained by CounterService on every link write:
+    link_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    read_link_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+    # The owner's data version when the collection (or its counters) last
+    # changed, for delta sync:
+    change_seq = db.Column(db.BigInteger, nullable=False, default=0, server_default="0")
+
+    @property
+    def unread_link_count(self) -> int:
+        return self.link_count - self.read_link_count
+
+
+db.Index(
+    "ix_collection_user_change_seq",
+    Collection.user_id,
+    Collection.change_seq,
+    Collection.id,
+)
+
 
 # Schema:
+class Cursor(fields.Field):
+    """An opaque pagination cursor. Serializes a `(date_added, id)` keyset
+    position into a URL-safe token, and deserializes a token back into one.
+    """
+
+    def _serialize(self, value, attr, obj, **kwargs):
+        if value is None:
+            return None
+        position, link_id = value
+        token = f"{self.position_to_str(position)}|{link_id}".encode("utf-8")
+        return urlsafe_b64encode(token).decode("ascii").rstrip("=")
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        try:
+            padded = value + "=" * (-len(value) % 4)
+            position, link_id = urlsafe_b64decode(padded).decode("utf-8").split("|")
+            return self.position_from_str(position), int(link_id)
+        except (ValueError, TypeError, AttributeError):
+            raise ValidationError("Not a valid cursor.")
+
+    def position_to_str(self, position) -> str:
+        return position.isoformat()
+
+    def position_from_str(self, value: str):
+        return datetime.fromisoformat(value)
+
+
+class SearchCursor(Cursor):
+    """An opaque cursor for search results, which are ordered by
+    `(rank, id)` instead.
+    """
+
+    def position_to_str(self, position) -> str:
+        # repr() round-trips floats exactly (ranks are float8s, see
+        # search_links), so ties in rank aren't skipped:
+        return repr(position)
+
+    def position_from_str(self, value: str):
+        return float(value)
+
+
+class SyncToken(fields.Field):
+    """An opaque token for GET /sync, marking how far a client has synced.
+    Serializes a dict of `since` and `until` (data versions bounding the
+    changes being synced, with no `until` before they're picked), `stage`
+    and `position` (where to continue from within them) and `issued_at`
+    (the timestamp `until` was picked at) into a URL-safe token, and
+    deserializes a token back into one.
+    """
+
+    def _serialize(self, value, attr, obj, **kwargs):
+        if value is None:
+            return None
+        change_seq, row_id = value["position"] or ("", "")
+        token = "|".join(
+            str(part)
+            for part in (
+                value["since"],
+                "" if value["until"] is None else value["until"],
+                value["stage"],
+                change_seq,
+                row_id,
+                value["issued_at"],
+            )
+        )
+        return urlsafe_b64encode(token.encode("utf-8")).decode("ascii").rstrip("=")
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        try:
+            padded = value + "=" * (-len(value) % 4)
+            since, until, stage, change_seq, row_id, issued_at = (
+                urlsafe_b64decode(padded).decode("utf-8").split("|")
+            )
+            if stage not in SYNC_STAGES:
+                raise ValueError(stage)
+            return {
+                "since": int(since),
+                "until": int(until) if until else None,
+                "stage": stage,
+                "position": (int(change_seq), int(row_id)) if row_id else None,
+                "issued_at": int(issued_at),
+            }
+        except (ValueError, TypeError, AttributeError):
+            raise ValidationError("Not a valid sync token.")
+
+
+class FieldList(fields.Field):
+    """A comma-separated list of field names that can be dumped by a given
+    schema (i.e. `id,url,title`), for requesting sparse fieldsets.
+    Deserializes to a sorted tuple of unique field names.
+    """
+
+    def __init__(self, schema, **kwargs):
+        super().__init__(**kwargs)
+        self.schema = schema
+
+    @property
+    def choices(self) -> set:
+        return {
+            name
+            for name, field in self.schema._declared_fields.items()
+            if not field.load_only
+        }
+
+    def _serialize(self, value, attr, obj, **kwargs):
+        if value is None:
+            return None
+        return ",".join(value)
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        if not isinstance(value, str):
+            raise ValidationError("Not a valid list of fields.")
+        names = {name.strip() for name in value.split(",") if name.strip()}
+        unknown = names - self.choices
+        if unknown:
+            raise ValidationError(f"Unknown field(s): {', '.join(sorted(unknown))}")
+        return tuple(sorted(names)) or None
+
+
 class UserSchema(Schema):
     id = fields.Int(required=True)
     name = fields.Str()
@@ -103,12 +409,19 @@ class LinkSchema(Schema):
 
     id = fields.Int(dump_only=True)
     date_added = fields.DateTime(format="%Y-%m-%d %H:%M")
-    url = fields.URL(required=True, relative=False, require_tld=True)
+    url = fields.URL(
+        required=True,
+        relative=False,
+        require_tld=True,
+        validate=validate.Length(max=2048),
+    )
     user_id = fields.Int(required=True, load_only=True)
-    title = fields.Str(allow_none=True)
+    title = fields.Str(allow_none=True, validate=validate.Length(max=512))
     read = fields.Bool(default=False)
     description = fields.Str(allow_none=True)
-    collection_id = fields.Int(allow_none=True)
+    collection_id = fields.Int(
+        allow_none=True, validate=validate.Range(min=1, max=2**31 - 1)
+    )
 
     @post_load
     def make_link(self, data, **kwargs):
@@ -126,9 +439,19 @@ class CollectionSchema(Schema):
     icon = fields.Str()
     archived = fields.Bool(default=False)
     order = fields.Integer()
+    link_count = fields.Int(dump_only=True)
+    unread_link_count = fields.Int(dump_only=True)
+
 
+class LinkFieldsSchema(Schema):
+    """Schema to validate the `fields` URL param on link endpoints, which
+    restricts the link fields that are loaded and returned.
+    """
 
-class LinkQuerySchema(Schema):
+    field_names = FieldList(LinkSchema, data_key="fields", allow_none=True)
+
+
+class LinkQuerySchema(LinkFieldsSchema):
     """Schema to validate GET /links endpoint URL params."""
 
     page = fields.Int(default=1, validate=validate.Range(min=1))
@@ -137,6 +460,102 @@ class LinkQuerySchema(Schema):
         validate=validate.OneOf(["unread", "read", "all"]), default="unread"
     )
     collection = fields.Int(allow_none=True)
+    # When a cursor is passed in, keyset pagination is used instead of
+    # page/per_page (page is ignored):
+    cursor = Cursor(allow_none=True)
+
+
+class LinkBatchSchema(Schema):
+    """Schema to validate the body of POST /links/batch. Each link is
+    validated separately with LinkSchema, so one bad link doesn't fail the
+    rest.
+    """
+
+    links = fields.List(
+        fields.Dict(),
+        required=True,
+        validate=validate.Length(min=1, max=MAX_BATCH_LINKS),
+    )
+
+
+class LinkLookupSchema(Schema):
+    """Schema to validate the body of POST /links/lookup."""
+
+    urls = fields.List(
+        fields.Str(),
+        required=True,
+        validate=validate.Length(min=1, max=MAX_BATCH_LINKS),
+    )
+
+
+class LinkFilterSchema(Schema):
+    """Schema for picking out a user's links with the same params as
+    GET /links: `show` read/unread/all links (default "unread"), from a
+    `collection` (or links without a collection if it isn't given).
+    """
+
+    show = fields.Str(
+        validate=validate.OneOf(["unread", "read", "all"]), missing="unread"
+    )
+    collection = fields.Int(allow_none=True)
+
+
+class LinkSelectionSchema(Schema):
+    """Schema to validate which links a bulk PATCH or DELETE /links request
+    applies to: either a list of link `ids`, or a `filter`.
+    """
+
+    ids = fields.List(
+        fields.Int(), validate=validate.Length(min=1, max=MAX_BATCH_LINKS)
+    )
+    filter = fields.Nested(LinkFilterSchema)
+
+    @validates_schema
+    def validate_selection(self, data, **kwargs):
+        if ("ids" in data) == ("filter" in data):
+            raise ValidationError("Pass either ids or a filter.")
+
+
+class LinkChangesSchema(Schema):
+    """Schema for the changes that can be made to many links at once."""
+
+    read = fields.Bool()
+    collection_id = fields.Int(allow_none=True)
+
+    @validates_schema
+    def validate_changes(self, data, **kwargs):
+        if not data:
+            raise ValidationError("No changes were given.")
+
+
+class LinkBulkUpdateSchema(LinkSelectionSchema):
+    """Schema to validate the body of PATCH /links."""
+
+    changes = fields.Nested(LinkChangesSchema, required=True)
+
+
+class LinkSearchQuerySchema(LinkFieldsSchema):
+    """Schema to validate GET /links/search endpoint URL params. Results are
+    filtered like GET /links, but paginated by cursor only.
+    """
+
+    q = fields.Str(required=True, validate=validate.Length(min=1, max=256))
+    per_page = fields.Int(default=20, validate=validate.Range(min=1))
+    show = fields.Str(
+        validate=validate.OneOf(["unread", "read", "all"]), default="unread"
+    )
+    collection = fields.Int(allow_none=True)
+    cursor = SearchCursor(allow_none=True)
+
+
+class LinkSearchResultsSchema(Schema):
+    """Schema for returning a page of search results from the
+    GET /links/search endpoint, best matches first.
+    """
+
+    per_page = fields.Int(default=20)
+    next_cursor = SearchCursor()
+    links = fields.List(fields.Nested(LinkSchema))
 
 
 class MultipleLinkSchema(Schema):
@@ -149,4 +568,24 @@ class MultipleLinkSchema(Schema):
     total_pages = fields.Int(default=1)
     next_page = fields.Int()
     per_page = fields.Int(default=20)
+    next_cursor = Cursor()
+    links = fields.List(fields.Nested(LinkSchema))
+
+
+class SyncQuerySchema(Schema):
+    """Schema to validate GET /sync endpoint URL params."""
+
+    since = SyncToken(allow_none=True)
+    limit = fields.Int(
+        missing=500, validate=validate.Range(min=1, max=MAX_SYNC_CHANGES)
+    )
+
+
+class SyncResultsSchema(Schema):
+    """Schema for returning a page of changes from the GET /sync endpoint."""
+
+    collections = fields.List(fields.Nested(CollectionSchema))
     links = fields.List(fields.Nested(LinkSchema))
+    deleted_links = fields.List(fields.Int())
+    has_more = fields.Bool()
+    next_token = SyncToken()
@@ -0,0 +1,69 @@
+"""A transactional outbox for Celery tasks, so requests don't wait on (or
+depend on) the broker.
+
+Tasks are added as rows in the caller's transaction, so they're committed or
+rolled back along with the writes that called for them, and relayed to the
+broker in batches afterwards (see relay). Delivery is at-least-once: a
+relay that fails after sending a task, but before deleting it, sends it
+again next time, so tasks should be safe to run twice.
+"""
+
+from datetime import datetime, timezone
+from typing import Iterable
+from flask import current_app
+from sqlalchemy import delete
+from src import celery
+from src.model import OutboxMessage, db
+
+
+class Outbox:
+    def add(self, task: str, *args) -> None:
+        """Adds a task to send, by its registered name, with JSON-serializable
+        arguments. Doesn't commit.
+        """
+        self.add_many(task, [args])
+
+    def add_many(self, task: str, args_list: Iterable[tuple]) -> None:
+        """Adds a task to send once for each tuple of arguments, with a single
+        INSERT. Doesn't commit.
+        """
+        created_at = datetime.now(timezone.utc)
+        rows = [
+            {"task": task, "args": list(args), "created_at": created_at}
+            for args in args_list
+        ]
+        if rows:
+            db.session.execute(OutboxMessage.__table__.insert(), rows)
+
+    def relay(self, batch_size: int = None) -> int:
+        """Sends waiting tasks to the broker, oldest first, in batches of
+        `batch_size` (by default, OUTBOX_BATCH_SIZE) until there are none
+        left, deleting them once sent. Returns how many were sent.
+
+        Batches are locked while they're sent, and skipped by other relays
+        running at the same time. If the broker fails, the tasks sent so far
+        are deleted before the error is raised.
+        """
+        batch_size = batch_size or current_app.config["OUTBOX_BATCH_SIZE"]
+        relayed = 0
+        while True:
+            messages = (
+                OutboxMessage.query.order_by(OutboxMessage.id)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            sent = []
+            try:
+                for message in messages:
+                    celery.send_task(message.task, args=message.args)
+                    sent.append(message.id)
+            finally:
+                if sent:
+                    db.session.execute(
+                        delete(OutboxMessage).where(OutboxMessage.id.in_(sent))
+                    )
+                db.session.commit()
+            relayed += len(sent)
+            if len(messages) < batch_size:
+                return relayed
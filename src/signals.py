@@ -1,4 +1,7 @@
 """Signals used throughout the application for async task processing and notifications.
+
+Signals for new links are sent before their transaction commits, so receivers
+can queue tasks in the outbox (see src.outbox) atomically with the links.
 """
 
 from blinker import Namespace
@@ -6,3 +9,4 @@ from blinker import Namespace
 espresso_signals = Namespace()
 
 link_created = espresso_signals.signal("link-created")
+links_created = espresso_signals.signal("links-created")
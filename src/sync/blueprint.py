@@ -0,0 +1,31 @@
+"""Blueprint for syncing changes to a user's links and collections.
+"""
+
+from flask import Blueprint, request
+from src.auth.service import current_user
+from src.auth.decorators import requires_auth
+from src.links.serializers import link_page_response
+from src.model import SyncQuerySchema, SyncResultsSchema
+from .service import SyncService
+
+sync_bp = Blueprint("sync_bp", __name__)
+
+
+@sync_bp.route("", methods=["GET"])
+@requires_auth(allowed=["jwt", "api-key"])
+def sync():
+    """Returns the current user's links and collections that changed since
+    the `since` URL param (the `next_token` of a previous response), and the
+    IDs of links deleted since. Without `since`, every link and collection
+    is returned. While `has_more` is true, keep requesting with the new
+    `next_token`; once it's false, save the token for the next sync. Returns
+    a 410 if the token is too old, in which case sync again from scratch.
+    """
+    user = current_user()
+    query_params = SyncQuerySchema().load(
+        {"since": request.args.get("since"), "limit": request.args.get("limit", 500)}
+    )
+    changes = SyncService().get_changes(
+        user.id, query_params["since"], query_params["limit"]
+    )
+    return link_page_response(changes, schema_class=SyncResultsSchema)
@@ -0,0 +1,144 @@
+"""Works out what changed in a user's links and collections since a client
+last synced, so mobile clients can keep a local copy up to date.
+
+Every write to a user's links or collections bumps their data version and
+stamps the rows it touches with it as `change_seq` (deleted links leave a
+LinkTombstone instead). Since the bump locks the user's row until the write
+commits, a user's changes are committed in `change_seq` order, and every
+change at or below the current data version is already visible.
+
+A sync covers the changes in a window of data versions, `(since, until]`,
+where `until` is the data version when the window's first page was
+requested. The window is returned in pages of collections, then links, then
+deleted links, each ordered by `(change_seq, id)`. The last page's token
+starts the next window from `until`.
+"""
+
+import time
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import tuple_
+from src.model import Collection, Link, LinkTombstone, User, db, SYNC_STAGES
+from src.exceptions import InvalidUsage
+from src.links.serializers import LinkRecord, link_columns, record_columns
+
+
+class SyncService:
+    def get_changes(self, user_id: int, token: dict = None, limit: int = 500) -> dict:
+        """Returns up to `limit` of a user's changes after a sync token (see
+        SyncToken), or all of their links and collections if there's no
+        token, along with a token to continue from.
+
+        Raises an InvalidUsage error (410 Gone) if the token is older than
+        deleted links are kept for, since some deletes could be missed.
+        """
+        if token is None:
+            token = {
+                "since": -1,
+                "until": None,
+                "stage": SYNC_STAGES[0],
+                "position": None,
+                "issued_at": None,
+            }
+        elif token["issued_at"] < time.time() - self._retention().total_seconds():
+            raise InvalidUsage(
+                "This sync token has expired, sync again without one", status_code=410
+            )
+        if token["until"] is None:
+            # Start a new window, up to the changes committed so far:
+            token = {
+                **token,
+                "until": User.query.get(user_id).data_version,
+                "issued_at": int(time.time()),
+            }
+
+        changes = {stage: [] for stage in SYNC_STAGES}
+        next_token = None
+        remaining = limit
+        start = SYNC_STAGES.index(token["stage"])
+        for stage in SYNC_STAGES[start:]:
+            position = token["position"] if stage == token["stage"] else None
+            # Fetch one extra row to find out whether there's more to sync:
+            rows = self._changed_rows(
+                stage, user_id, token["since"], token["until"], position, remaining + 1
+            )
+            changes[stage] = rows[:remaining]
+            if len(rows) > remaining:
+                last = changes[stage][-1] if remaining else None
+                next_token = {
+                    **token,
+                    "stage": stage,
+                    "position": (last.change_seq, last.id) if last else position,
+                }
+                break
+            remaining -= len(rows)
+
+        has_more = next_token is not None
+        if not has_more:
+            # Everything up to `until` is synced, so start the next window:
+            next_token = {
+                **token,
+                "since": token["until"],
+                "until": None,
+                "stage": SYNC_STAGES[0],
+                "position": None,
+            }
+        return {
+            "collections": changes["collections"],
+            "links": changes["links"],
+            "deleted_links": [
+                tombstone.link_id for tombstone in changes["deleted_links"]
+            ],
+            "has_more": has_more,
+            "next_token": next_token,
+        }
+
+    def _changed_rows(
+        self,
+        stage: str,
+        user_id: int,
+        since: int,
+        until: int,
+        position: tuple,
+        limit: int,
+    ) -> list:
+        """Returns up to `limit` of a user's changed rows of one kind in the
+        window `(since, until]`, after a `(change_seq, id)` position.
+        """
+        if stage == "deleted_links" and since < 0:
+            # A first sync has nothing to delete:
+            return []
+        model = {
+            "collections": Collection,
+            "links": Link,
+            "deleted_links": LinkTombstone,
+        }[stage]
+        query = model.query.filter(
+            model.user_id == user_id,
+            model.change_seq > since,
+            model.change_seq <= until,
+        ).order_by(model.change_seq, model.id)
+        if position:
+            query = query.filter(tuple_(model.change_seq, model.id) > position)
+
+        if stage == "links":
+            column_names = record_columns(None, "id", "change_seq")
+            rows = query.with_entities(*link_columns(column_names)).limit(limit).all()
+            return LinkRecord.from_rows(column_names, rows)
+        return query.limit(limit).all()
+
+    def prune_tombstones(self, days: int = None) -> int:
+        """Deletes tombstones of links deleted more than `days` ago (by
+        default, SYNC_TOMBSTONE_DAYS) and commits. Returns how many were
+        deleted.
+        """
+        retention = timedelta(days=days) if days is not None else self._retention()
+        deleted_count = LinkTombstone.query.filter(
+            LinkTombstone.deleted_at < datetime.now(timezone.utc) - retention
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted_count
+
+    @staticmethod
+    def _retention() -> timedelta:
+        return timedelta(days=current_app.config["SYNC_TOMBSTONE_DAYS"])
@@ -1,6 +1,11 @@
 from src import celery
 from src.links.service import LinkService
+from src.links.scheduler import HostBusy, HostUnavailable
+from src.events.service import LinkEvents
+from src.outbox import Outbox
+from flask import current_app
 from logging import Logger
+import requests
 
 logger = Logger("task_logger")
 
@@ -10,6 +15,92 @@ def populate_link_metadata(link_id, link_url):
     """Adds title and description data to a link."""
     logger.info(f"Received title-less link with ID {link_id}: {link_url}")
     link_service = LinkService()
-    link = link_service.get_link(link_id)
-    metadata = link_service.extract_metadata_from_url(link_url)
-    link_service.update_link(link, metadata)
+    link = link_service.find_link(link_id)
+    if link is None:
+        # Deleted before its metadata could be fetched:
+        return
+    try:
+        metadata = link_service.extract_metadata_from_url(link_url)
+    except HostBusy as e:
+        # Come back once the host can take it, rather than wait here:
+        populate_link_metadata.apply_async((link_id, link_url), countdown=e.retry_after)
+        return
+    except (requests.RequestException, HostUnavailable) as e:
+        # Like in a batch, a page that can't be fetched just has no metadata:
+        logger.warning(f"Couldn't get metadata for {link_url}: {e}")
+        metadata = None
+    if metadata:
+        link_service.update_link(link, metadata)
+        if metadata["title"] or metadata["description"]:
+            link_service.set_metadata_validators(link, metadata)
+    if not metadata or not metadata["title"]:
+        # There may be nothing to update, but clients waiting for the title
+        # (see GET /events) can stop:
+        LinkEvents().publish(
+            link.user_id, "link_metadata_missing", {"link_id": link_id}
+        )
+
+
+@celery.task
+def populate_links_metadata(links):
+    """Adds title and description data to a batch of links, given as
+    (link_id, link_url) pairs. Their pages are fetched concurrently, and
+    links that aren't done by the batch's deadline (or whose hosts are busy)
+    are sent off in a new batch.
+    """
+    logger.info(f"Received {len(links)} title-less links")
+    link_service = LinkService()
+    urls = dict(links)
+    metadata, retry_after = link_service.extract_metadata_from_urls(urls)
+    owners = link_service.update_links_metadata(metadata)
+    link_events = LinkEvents()
+    for link_id, found_metadata in metadata.items():
+        if link_id in owners and not found_metadata["title"]:
+            link_events.publish(
+                owners[link_id], "link_metadata_missing", {"link_id": link_id}
+            )
+    if retry_after:
+        # Links that aren't due yet will wait for their hosts again:
+        populate_links_metadata.apply_async(
+            ([(link_id, urls[link_id]) for link_id in retry_after],),
+            countdown=min(retry_after.values()),
+        )
+
+
+@celery.task
+def refresh_links_metadata():
+    """Checks whether the pages of links saved a while ago have changed, and
+    updates their titles and descriptions if so (run periodically, see
+    CeleryConfig.beat_schedule).
+    """
+    counts = LinkService().refresh_links_metadata(
+        current_app.config["METADATA_REFRESH_BUDGET"]
+    )
+    logger.info(
+        f"Refreshed metadata for {counts['checked']} links"
+        f" ({counts['changed']} changed, {counts['deferred']} deferred)"
+    )
+
+
+@celery.task
+def relay_outbox():
+    """Sends tasks queued in the outbox to the broker (run periodically, see
+    CeleryConfig.beat_schedule).
+    """
+    relayed = Outbox().relay()
+    if relayed:
+        logger.info(f"Relayed {relayed} tasks from the outbox")
+
+
+@celery.task
+def save_queued_links():
+    """Saves links queued as quick saves (run periodically, see
+    CeleryConfig.beat_schedule).
+    """
+    counts = LinkService().save_queued_links(
+        current_app.config["QUICK_SAVE_BATCH_SIZE"]
+    )
+    if counts["saved"] or counts["failed"]:
+        logger.info(
+            f"Saved {counts['saved']} queued links ({counts['failed']} invalid)"
+        )
@@ -7,6 +7,8 @@ os.environ["DB_DATABASE"] = "espresso_test"
 os.environ["FIREBASE_ENABLED"] = "0"
 
 import pytest
+import fakeredis
+from unittest.mock import patch
 from src import create_app
 from flask_migrate import upgrade
 from sqlalchemy import text
@@ -31,7 +33,10 @@ def scoped_app():
     # Once the app fixture is no longer needed, drop the tables:
     with app.app_context():
         db.engine.execute(
-            text('drop table link, "user", "collection", alembic_version;')
+            text(
+                'drop table link, link_tombstone, outbox_message, "user", "collection",'
+                " alembic_version;"
+            )
         )
 
 
@@ -39,6 +44,8 @@ def scoped_app():
 def clear_database(scoped_app):
     """Clears the data in every table before each test run."""
     with scoped_app.app_context():
+        # Discard anything a previous test left uncommitted in the session:
+        db.session.rollback()
         meta = db.metadata
         for table in reversed(meta.sorted_tables):
             db.engine.execute(table.delete())
@@ -67,3 +74,16 @@ def test_user(scoped_app) -> Tuple[User, str]:
 def runner(scoped_app):
     """Test CLI runner to test admin CLI commands"""
     return scoped_app.test_cli_runner()
+
+
+@pytest.fixture
+def fake_redis(scoped_app):
+    """Points the application's cache Redis at an in-memory fake for the
+    duration of a test.
+    """
+    url = "redis://fake-redis/2"
+    client = fakeredis.FakeRedis()
+    with patch.dict(scoped_app.config, {"CACHE_REDIS_URL": url}), patch.dict(
+        "src.cache._clients", {url: client}
+    ):
+        yield client
@@ -0,0 +1,178 @@
+import pytest
+import redis
+from unittest.mock import patch
+from requests import ConnectionError
+from src.cache import LinkPageCache, LinkUrlFilter, UrlMetadataCache
+from src.links.service import LinkService
+from src.links.urls import url_hash
+from src.model import Link
+from .factories import LinkFactory, UserFactory
+from .test_fetch import html_response
+
+
+@pytest.fixture
+def link_cache_enabled(scoped_app, fake_redis):
+    with patch.dict(scoped_app.config, {"LINK_CACHE_ENABLED": True}):
+        yield fake_redis
+
+
+def test_link_pages_are_cached(
+    scoped_app, scoped_client, test_user, link_cache_enabled
+):
+    """A repeated request for the same page should be served from the cache,
+    and be identical to the original response.
+    """
+    user, api_key = test_user
+    LinkFactory.create_batch(3, user=user, collection_id=None, read=False)
+    headers = {"x-api-key": api_key}
+
+    first = scoped_client.get("/v1/links?per_page=2", headers=headers)
+    with patch("src.links.blueprint.LinkService.get_many_links") as get_many_links:
+        second = scoped_client.get("/v1/links?per_page=2", headers=headers)
+        get_many_links.assert_not_called()
+
+    assert second.data == first.data
+    assert LinkPageCache().stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_writes_invalidate_cached_pages(scoped_client, test_user, link_cache_enabled):
+    user, api_key = test_user
+    headers = {"x-api-key": api_key}
+    before = scoped_client.get("/v1/links", headers=headers).get_json()
+
+    scoped_client.post(
+        "/v1/links", headers=headers, json={"url": "https://a.com", "title": "A"}
+    )
+    after = scoped_client.get("/v1/links", headers=headers).get_json()
+
+    assert len(after["links"]) == len(before["links"]) + 1
+
+
+def test_cache_is_opt_in(scoped_client, test_user, fake_redis):
+    user, api_key = test_user
+    scoped_client.get("/v1/links", headers={"x-api-key": api_key})
+    assert fake_redis.keys("cache:links:*") == []
+
+
+def test_cache_errors_fall_through(scoped_client, test_user, link_cache_enabled):
+    user, api_key = test_user
+    with patch.object(link_cache_enabled, "get", side_effect=redis.ConnectionError):
+        rv = scoped_client.get("/v1/links", headers={"x-api-key": api_key})
+    assert rv.status_code == 200
+
+
+def test_cache_stats_command(runner, link_cache_enabled):
+    link_cache_enabled.set(LinkPageCache.HITS_KEY, 3)
+    link_cache_enabled.set(LinkPageCache.MISSES_KEY, 1)
+    result = runner.invoke(args=["admin", "cache_stats", "--reset"])
+    assert "Hit rate: 75.0%" in result.output
+    assert link_cache_enabled.get(LinkPageCache.HITS_KEY) is None
+
+
+def test_link_url_filter(scoped_app, fake_redis):
+    """The filter should never miss a saved URL, whether it was saved before
+    the filter was built or after.
+    """
+    user = UserFactory()
+    link_service = LinkService()
+    link_service.create_link(Link(url="https://a.com", title="A", user_id=user.id))
+    url_filter = LinkUrlFilter()
+    saved, unsaved = url_hash("https://a.com"), url_hash("https://b.com")
+
+    assert url_filter.might_contain(user.id, [saved, unsaved]) == [True, False]
+
+    link_service.create_link(Link(url="https://b.com", title="B", user_id=user.id))
+    assert url_filter.might_contain(user.id, [saved, unsaved]) == [True, True]
+
+
+def test_link_url_filter_rebuilds_incomplete_filters(scoped_app, fake_redis):
+    """Adding to a filter that expired shouldn't leave a partial one that's
+    trusted.
+    """
+    user = UserFactory()
+    LinkService().create_link(Link(url="https://a.com", title="A", user_id=user.id))
+    fake_redis.delete(LinkUrlFilter.KEY.format(user_id=user.id))
+    LinkService().create_link(Link(url="https://b.com", title="B", user_id=user.id))
+
+    url_hashes = [url_hash("https://a.com"), url_hash("https://b.com")]
+    assert LinkUrlFilter().might_contain(user.id, url_hashes) == [True, True]
+
+
+def test_link_url_filter_only_adds_to_existing_filters(scoped_app, fake_redis):
+    """Saving links shouldn't create filters (that wouldn't expire) for users
+    who've never looked URLs up.
+    """
+    user = UserFactory()
+    key = LinkUrlFilter.KEY.format(user_id=user.id)
+    LinkService().create_link(Link(url="https://a.com", title="A", user_id=user.id))
+    assert not fake_redis.exists(key)
+
+    LinkUrlFilter().might_contain(user.id, [url_hash("https://a.com")])
+    fake_redis.persist(key)
+    LinkService().create_link(Link(url="https://b.com", title="B", user_id=user.id))
+    assert 0 < fake_redis.ttl(key) <= scoped_app.config["LINK_URL_FILTER_TTL"]
+
+
+def test_link_url_filter_discards_builds_that_raced_writes(scoped_app, fake_redis):
+    user = UserFactory()
+    url_filter = LinkUrlFilter()
+    with patch.object(LinkUrlFilter, "_data_version", side_effect=[1, 2]):
+        url_filter.build(user.id)
+    assert not fake_redis.exists(LinkUrlFilter.KEY.format(user_id=user.id))
+
+
+def test_link_url_filter_errors_fall_through(scoped_app, fake_redis):
+    user = UserFactory()
+    with patch.object(fake_redis, "pipeline", side_effect=redis.ConnectionError):
+        assert LinkUrlFilter().might_contain(user.id, [url_hash("https://a.com")]) == [
+            True
+        ]
+
+
+def test_url_metadata_is_cached(scoped_app, fake_redis):
+    """Saving the same page again (under any form of its URL) shouldn't fetch
+    it again.
+    """
+    response = html_response(b"<title>Never Gonna</title>")
+    response.headers["ETag"] = '"v1"'
+    with patch("src.links.fetch.requests.get", return_value=response) as get:
+        first = LinkService.extract_metadata_from_url("https://example.com/a")
+        second = LinkService.extract_metadata_from_url(
+            "http://www.example.com/a/?utm_source=rss"
+        )
+    assert (
+        first
+        == second
+        == {
+            "title": "Never Gonna",
+            "description": None,
+            "etag": '"v1"',
+            "last_modified": None,
+        }
+    )
+    get.assert_called_once()
+    key = UrlMetadataCache.KEY.format(url_hash=url_hash("https://example.com/a"))
+    assert fake_redis.ttl(key) == scoped_app.config["METADATA_CACHE_TTL"]
+    assert UrlMetadataCache().stats() == {
+        "hits": 1,
+        "negative_hits": 0,
+        "misses": 1,
+        "hit_rate": 0.5,
+    }
+
+
+def test_url_metadata_failures_are_cached(scoped_app, fake_redis):
+    with patch("src.links.fetch.requests.get", side_effect=ConnectionError) as get:
+        with pytest.raises(ConnectionError):
+            LinkService.extract_metadata_from_url("https://example.com/down")
+        metadata = LinkService.extract_metadata_from_url("https://example.com/down")
+    assert metadata == {
+        "title": None,
+        "description": None,
+        "etag": None,
+        "last_modified": None,
+    }
+    get.assert_called_once()
+    key = UrlMetadataCache.KEY.format(url_hash=url_hash("https://example.com/down"))
+    assert fake_redis.ttl(key) == scoped_app.config["METADATA_CACHE_NEGATIVE_TTL"]
+    assert UrlMetadataCache().stats()["negative_hits"] == 1
@@ -0,0 +1,85 @@
+import pytest
+from unittest.mock import patch
+from .factories import LinkFactory, UserFactory
+
+
+@pytest.mark.parametrize(
+    "url", ["/v1/links", "/v1/collections", "/v1/auth/user", "/v1/links/{link_id}"]
+)
+def test_read_endpoints_answer_if_none_match(scoped_client, test_user, url):
+    """Read endpoints should return a weak ETag, and a bodiless 304 when
+    that ETag is sent back and nothing has changed.
+    """
+    user, api_key = test_user
+    link = LinkFactory(user=user)
+    url = url.format(link_id=link.id)
+    rv = scoped_client.get(url, headers={"x-api-key": api_key})
+    assert rv.status_code == 200
+    etag = rv.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    rv = scoped_client.get(url, headers={"x-api-key": api_key, "If-None-Match": etag})
+    assert rv.status_code == 304
+    assert rv.data == b""
+    assert rv.headers["ETag"] == etag
+
+
+def test_304_checks_link_access(scoped_client, test_user):
+    """A current ETag shouldn't get a 304 for a link that doesn't exist, or
+    that belongs to someone else.
+    """
+    user, api_key = test_user
+    other_link = LinkFactory(user=UserFactory())
+    headers = {"x-api-key": api_key}
+    etag = scoped_client.get("/v1/links", headers=headers).headers["ETag"]
+
+    rv = scoped_client.get(
+        "/v1/links/999999", headers={**headers, "If-None-Match": etag}
+    )
+    assert rv.status_code == 404
+    rv = scoped_client.get(
+        f"/v1/links/{other_link.id}", headers={**headers, "If-None-Match": etag}
+    )
+    assert rv.status_code == 403
+
+
+def test_304_skips_listing_query(scoped_client, test_user):
+    user, api_key = test_user
+    rv = scoped_client.get("/v1/links", headers={"x-api-key": api_key})
+    etag = rv.headers["ETag"]
+
+    with patch("src.links.blueprint.LinkService.get_many_links") as get_many_links:
+        rv = scoped_client.get(
+            "/v1/links", headers={"x-api-key": api_key, "If-None-Match": etag}
+        )
+        assert rv.status_code == 304
+        get_many_links.assert_not_called()
+
+
+def test_writes_change_etag(scoped_client, test_user):
+    """Creating, updating or deleting a link, or creating a collection, should
+    invalidate previously issued ETags.
+    """
+    user, api_key = test_user
+    headers = {"x-api-key": api_key}
+    etags = [scoped_client.get("/v1/links", headers=headers).headers["ETag"]]
+
+    rv = scoped_client.post(
+        "/v1/links", headers=headers, json={"url": "https://a.com", "title": "A"}
+    )
+    link_id = rv.get_json()["id"]
+    etags.append(scoped_client.get("/v1/links", headers=headers).headers["ETag"])
+
+    scoped_client.patch(f"/v1/links/{link_id}", headers=headers, json={"read": True})
+    etags.append(scoped_client.get("/v1/links", headers=headers).headers["ETag"])
+
+    scoped_client.post("/v1/collections", headers=headers, json={"name": "Reading"})
+    etags.append(scoped_client.get("/v1/links", headers=headers).headers["ETag"])
+
+    scoped_client.delete(f"/v1/links/{link_id}", headers=headers)
+    etags.append(scoped_client.get("/v1/links", headers=headers).headers["ETag"])
+
+    assert len(set(etags)) == len(etags)
+
+    rv = scoped_client.get("/v1/links", headers={**headers, "If-None-Match": etags[0]})
+    assert rv.status_code == 200
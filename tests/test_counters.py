@@ -0,0 +1,90 @@
+from tests.factories import UserFactory, LinkFactory, CollectionFactory
+from src.links.service import LinkService
+from src.collections.service import CollectionService
+from src.importer.service import JSONImporter
+from src.counters import CounterService
+from src.model import Link, db
+
+
+def test_counters_follow_link_writes(scoped_app):
+    """Creating, updating and deleting links through LinkService should keep
+    the user and collection counters in step.
+    """
+    user = UserFactory()
+    collection = CollectionFactory(user=user, archived=False)
+    link_service = LinkService()
+
+    link = link_service.create_link(
+        Link(
+            url="https://example.com",
+            title="Example",
+            user_id=user.id,
+            collection_id=collection.id,
+        )
+    )
+    assert (user.link_count, user.read_link_count) == (1, 0)
+    assert (collection.link_count, collection.unread_link_count) == (1, 1)
+
+    link_service.update_link(link, {"read": True})
+    assert (user.link_count, user.read_link_count) == (1, 1)
+    assert (collection.link_count, collection.unread_link_count) == (1, 0)
+
+    link_service.update_link(link, {"collection_id": None})
+    assert collection.link_count == 0
+    assert user.link_count == 1
+
+    link_service.delete_link(link)
+    assert (user.link_count, user.read_link_count) == (0, 0)
+
+
+def test_counters_follow_import_and_archive(scoped_app):
+    user = UserFactory()
+    collection = CollectionFactory(user=user, archived=False)
+    importer = JSONImporter()
+    links = importer.transform_links(
+        [
+            {"url": "https://example.com", "read": True},
+            {"url": "https://example.org", "collection_id": collection.id},
+        ],
+        user_id=user.id,
+    )
+    importer.load_links(links)
+    assert (user.link_count, user.read_link_count) == (2, 1)
+    assert collection.link_count == 1
+
+    CollectionService().archive_collection(collection.id)
+    assert collection.link_count == 0
+    assert user.link_count == 2
+
+
+def test_recount(scoped_app):
+    """Links written behind the service's back should be picked up by a
+    recount, and only drifted rows reported.
+    """
+    user = UserFactory()
+    collection = CollectionFactory(user=user)
+    LinkFactory.create_batch(3, user=user, collection_id=collection.id, read=True)
+    LinkFactory.create_batch(2, user=user, collection_id=None, read=False)
+    untouched_user = UserFactory()
+    db.session.commit()
+    data_versions = (user.data_version, untouched_user.data_version)
+
+    assert CounterService().recount() == (1, 1)
+    assert (user.link_count, user.read_link_count) == (5, 3)
+    assert (collection.link_count, collection.read_link_count) == (3, 3)
+    assert untouched_user.link_count == 0
+    # Cached and synced counts should be replaced:
+    assert user.data_version == data_versions[0] + 1
+    assert collection.change_seq == user.data_version
+    assert untouched_user.data_version == data_versions[1]
+
+    assert CounterService().recount(user_id=user.id) == (0, 0)
+
+
+def test_recount_links_command(runner):
+    user = UserFactory()
+    LinkFactory.create_batch(2, user=user, collection_id=None)
+    db.session.commit()
+
+    result = runner.invoke(args=["admin", "recount_links", "--user-id", user.id])
+    assert "Corrected 1 user(s) and 0 collection(s)" in result.output
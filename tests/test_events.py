@@ -0,0 +1,166 @@
+import json
+import pytest
+from unittest.mock import patch
+from requests import HTTPError, Response
+from src.events.service import LinkEvents
+from src.links.scheduler import HostUnavailable
+from src.links.service import LinkService
+from src.model import Link, db
+from src.links.tasks import populate_link_metadata, populate_links_metadata
+from .factories import LinkFactory
+
+
+@pytest.fixture
+def link_events(scoped_app, fake_redis):
+    with patch.dict(
+        scoped_app.config, {"LINK_EVENTS_HEARTBEAT": 1, "LINK_EVENTS_MAX_AGE": 5}
+    ):
+        yield fake_redis
+
+
+def parse_event(chunk: str) -> tuple:
+    fields = dict(line.split(": ", 1) for line in chunk.strip().split("\n"))
+    return fields["event"], json.loads(fields["data"])
+
+
+def test_link_changes_are_streamed(scoped_client, test_user, link_events):
+    user, api_key = test_user
+    headers = {"x-api-key": api_key}
+    # Opening a stream gives back the database session:
+    db.session.commit()
+    rv = scoped_client.get("/v1/events", headers=headers, buffered=False)
+    assert rv.mimetype == "text/event-stream"
+    stream = iter(rv.response)
+    assert "event: ready" in next(stream).decode("utf-8")
+
+    link_id = scoped_client.post(
+        "/v1/links", headers=headers, json={"url": "https://a.com", "title": "A"}
+    ).get_json()["id"]
+    event, data = parse_event(next(stream).decode("utf-8"))
+    assert event == "link_created"
+    assert data["link"]["id"] == link_id
+
+    scoped_client.patch(f"/v1/links/{link_id}", headers=headers, json={"read": True})
+    event, data = parse_event(next(stream).decode("utf-8"))
+    assert event == "link_updated"
+    assert data["link"]["read"] is True
+
+    scoped_client.delete(f"/v1/links/{link_id}", headers=headers)
+    assert parse_event(next(stream).decode("utf-8")) == (
+        "link_deleted",
+        {"link_id": link_id},
+    )
+
+    # Idle streams are kept alive:
+    assert next(stream) == b": keep-alive\n\n"
+    rv.close()
+
+
+def test_metadata_task_publishes_events(scoped_app, test_user, link_events):
+    user, api_key = test_user
+    link_events_service = LinkEvents()
+    stream = link_events_service.stream(user.id)
+    next(stream)
+
+    with patch(
+        "src.links.service.LinkService.extract_metadata_from_url",
+        return_value={"title": None, "description": None},
+    ):
+        rv = scoped_app.test_client().post(
+            "/v1/links", headers={"x-api-key": api_key}, json={"url": "https://b.com"}
+        )
+        link_id = rv.get_json()["id"]
+        next(stream)
+        populate_link_metadata(link_id, "https://b.com")
+
+    assert parse_event(next(stream)) == ("link_metadata_missing", {"link_id": link_id})
+    stream.close()
+
+
+@pytest.mark.parametrize(
+    "error", (HTTPError(response=Response()), HostUnavailable("b.com"))
+)
+def test_metadata_task_publishes_fetch_errors(
+    scoped_app, test_user, link_events, error
+):
+    """Clients waiting on a link's title should hear about pages that can't be
+    fetched too.
+    """
+    user, api_key = test_user
+    link = LinkFactory(user=user, title=None, description="Kept")
+    db.session.commit()
+    stream = LinkEvents().stream(user.id)
+    next(stream)
+
+    with patch(
+        "src.links.service.LinkService.extract_metadata_from_url", side_effect=error
+    ):
+        populate_link_metadata(link.id, link.url)
+
+    assert parse_event(next(stream)) == ("link_metadata_missing", {"link_id": link.id})
+    assert link.description == "Kept"
+    stream.close()
+
+
+def test_batch_metadata_task(scoped_app, test_user, link_events):
+    """Links missing metadata should be published, and links not done by the
+    batch's deadline should be sent off again.
+    """
+    user, api_key = test_user
+    rv = scoped_app.test_client().post(
+        "/v1/links/batch",
+        headers={"x-api-key": api_key},
+        json={"links": [{"url": "https://a.com"}, {"url": "https://b.com"}]},
+    )
+    first_id, second_id = [result["link"]["id"] for result in rv.get_json()["results"]]
+    stream = LinkEvents().stream(user.id)
+    next(stream)
+
+    with patch(
+        "src.links.service.LinkService.extract_metadata_from_urls",
+        return_value=({first_id: {"title": None, "description": None}}, {second_id: 3}),
+    ), patch("src.links.tasks.populate_links_metadata.apply_async") as apply_async:
+        populate_links_metadata(
+            [(first_id, "https://a.com"), (second_id, "https://b.com")]
+        )
+
+    assert parse_event(next(stream)) == ("link_metadata_missing", {"link_id": first_id})
+    apply_async.assert_called_once_with(([(second_id, "https://b.com")],), countdown=3)
+    stream.close()
+
+
+def test_quick_save_events(scoped_app, test_user, link_events):
+    """Clients should find out which link a quick save became."""
+    user, api_key = test_user
+    rv = scoped_app.test_client().post(
+        "/v1/links?async=1",
+        headers={"x-api-key": api_key},
+        json={"url": "https://a.com"},
+    )
+    stream = LinkEvents().stream(user.id)
+    next(stream)
+
+    LinkService().save_queued_links(batch_size=10)
+
+    link = Link.query.one()
+    assert parse_event(next(stream)) == ("links_changed", {})
+    assert parse_event(next(stream)) == (
+        "quick_save_done",
+        {"id": rv.get_json()["id"], "link_id": link.id},
+    )
+    stream.close()
+
+
+def test_events_other_users_links_are_not_streamed(scoped_app, link_events):
+    link_events_service = LinkEvents()
+    stream = link_events_service.stream(1)
+    next(stream)
+    link_events_service.link_deleted(2, 30)
+    assert next(stream) == ": keep-alive\n\n"
+    stream.close()
+
+
+def test_events_need_redis(scoped_client, test_user):
+    user, api_key = test_user
+    rv = scoped_client.get("/v1/events", headers={"x-api-key": api_key})
+    assert rv.status_code == 503
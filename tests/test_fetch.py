@@ -0,0 +1,81 @@
+import io
+import pytest
+from unittest.mock import patch
+from requests import Response
+from src.links.fetch import fetch_page_metadata, iter_page_head
+
+HEAD = b"<html><head><title>Never Gonna</title></head>"
+
+
+class Body(io.BytesIO):
+    """A response body that can still tell how much was read once closed."""
+
+    def close(self):
+        pass
+
+
+def html_response(body: bytes, content_type: str = "text/html") -> Response:
+    response = Response()
+    response.status_code = 200
+    response.headers["Content-Type"] = content_type
+    response.raw = Body(body)
+    return response
+
+
+def test_fetch_stops_after_head(scoped_app):
+    response = html_response(HEAD + b"<body>" + b"x" * 1024 * 1024)
+    assert "".join(iter_page_head(response)) == HEAD.decode("utf-8")
+    assert response.raw.tell() < 1024 * 1024
+
+    response = html_response(HEAD + b"<body>" + b"x" * 1024 * 1024)
+    with patch("src.links.fetch.requests.get", return_value=response) as get:
+        assert fetch_page_metadata("https://example.com")["title"] == "Never Gonna"
+    assert response.raw.tell() < 1024 * 1024
+    assert get.call_args.kwargs["stream"] is True
+    assert get.call_args.kwargs["timeout"] == (
+        scoped_app.config["METADATA_CONNECT_TIMEOUT"],
+        scoped_app.config["METADATA_READ_TIMEOUT"],
+    )
+
+
+def test_fetch_is_capped(scoped_app):
+    response = html_response(b"<html><head>" + b"x" * 100 * 1024)
+    with patch.dict(scoped_app.config, {"METADATA_MAX_BYTES": 20 * 1024}):
+        assert len("".join(iter_page_head(response))) == 20 * 1024
+
+
+def test_fetch_skips_other_content(scoped_app):
+    response = html_response(b"%PDF-1.4", content_type="application/pdf")
+    with patch("src.links.fetch.requests.get", return_value=response):
+        assert fetch_page_metadata("https://example.com/paper.pdf") is None
+    assert response.raw.tell() == 0
+
+
+@pytest.mark.parametrize(
+    ("body", "content_type"),
+    (
+        ('<meta charset="iso-8859-1"><title>Café</title>', "text/html"),
+        ("<title>Café</title>", "text/html; charset=ISO-8859-1"),
+    ),
+)
+def test_fetch_decodes_declared_charset(scoped_app, body, content_type):
+    response = html_response(body.encode("iso-8859-1"), content_type)
+    with patch("src.links.fetch.requests.get", return_value=response):
+        assert fetch_page_metadata("https://example.com")["title"] == "Café"
+
+
+def test_fetch_page_metadata(scoped_app):
+    body = (
+        b'<html><head><meta property="og:description" content="Give you up">'
+        b"<title>Never Gonna</title><link rel=stylesheet href=/a.css>"
+        + b"<script>var x = 1;</script>" * 5000
+        + b"</head><body>"
+        + b"x" * 1024 * 1024
+    )
+    response = html_response(body)
+    with patch("src.links.fetch.requests.get", return_value=response):
+        metadata = fetch_page_metadata("https://example.com")
+
+    assert metadata["title"] == "Never Gonna"
+    assert metadata["description"] == "Give you up"
+    assert response.raw.tell() < 1024 * 1024
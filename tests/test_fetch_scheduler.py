@@ -0,0 +1,109 @@
+import pytest
+from unittest.mock import patch
+from requests import ConnectionError, HTTPError, Response
+from src.links.scheduler import FetchScheduler, HostBusy, HostUnavailable
+from src.links.tasks import populate_link_metadata
+from .factories import LinkFactory
+
+
+@pytest.fixture
+def scheduler(scoped_app, fake_redis):
+    with patch.dict(
+        scoped_app.config,
+        {
+            "METADATA_HOST_CONCURRENCY": 2,
+            "METADATA_HOST_RATE": 100,
+            "METADATA_HOST_MAX_WAIT": 0,
+            "METADATA_HOST_BACKOFF": 0,
+            "METADATA_HOST_FAILURES": 3,
+        },
+    ):
+        yield FetchScheduler()
+
+
+def http_error(status_code: int, headers: dict = None) -> HTTPError:
+    response = Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    return HTTPError(response=response)
+
+
+def fail(scheduler: FetchScheduler, url: str, error: Exception):
+    with pytest.raises((type(error), HostBusy)):
+        with scheduler.slot(url):
+            raise error
+
+
+def test_fetches_are_limited_per_host(scheduler):
+    with scheduler.slot("https://a.com/1"), scheduler.slot("https://a.com/2"):
+        with pytest.raises(HostBusy):
+            with scheduler.slot("https://a.com/3"):
+                pass
+        # Other hosts have slots of their own:
+        with scheduler.slot("https://b.com/1"):
+            pass
+    # Slots are given back:
+    with scheduler.slot("https://a.com/3"):
+        pass
+
+
+def test_fetches_are_rate_limited(scheduler):
+    scheduler.rate = 2
+    with patch("src.links.scheduler.time.time", return_value=1000.75):
+        for page in range(2):
+            with scheduler.slot(f"https://a.com/{page}"):
+                pass
+        with pytest.raises(HostBusy) as busy:
+            with scheduler.slot("https://a.com/2"):
+                pass
+    assert busy.value.retry_after == 0.25
+
+
+def test_hosts_are_backed_off(scheduler):
+    """Hosts asking to slow down should be left alone for as long as they ask,
+    and the page tried again later.
+    """
+    with pytest.raises(HostBusy) as busy:
+        with scheduler.slot("https://a.com/1"):
+            raise http_error(429, {"Retry-After": "30"})
+    assert busy.value.retry_after == 30
+
+    with pytest.raises(HostBusy) as busy:
+        with scheduler.slot("https://a.com/2"):
+            pass
+    assert 29 < busy.value.retry_after <= 30
+
+
+def test_circuit_opens_for_failing_hosts(scheduler, fake_redis):
+    for page in range(2):
+        fail(scheduler, f"https://a.com/{page}", ConnectionError())
+    # Missing pages don't count against the host:
+    fail(scheduler, "https://a.com/missing", http_error(404))
+    for page in range(3):
+        fail(scheduler, f"https://a.com/{page}", http_error(503))
+
+    with pytest.raises(HostUnavailable):
+        with scheduler.slot("https://a.com/4"):
+            pass
+
+    # Once it closes, the next failure opens it straight away:
+    fake_redis.delete(scheduler.key("a.com", "circuit"))
+    fail(scheduler, "https://a.com/4", ConnectionError())
+    assert fake_redis.exists(scheduler.key("a.com", "circuit"))
+
+    # ...and a success closes it for good:
+    fake_redis.delete(scheduler.key("a.com", "circuit"))
+    with scheduler.slot("https://a.com/4"):
+        pass
+    fail(scheduler, "https://a.com/5", ConnectionError())
+    assert not fake_redis.exists(scheduler.key("a.com", "circuit"))
+
+
+def test_metadata_task_waits_for_busy_hosts(scoped_app):
+    link = LinkFactory(title=None)
+    with patch(
+        "src.links.service.LinkService.extract_metadata_from_url",
+        side_effect=HostBusy("a.com", 12),
+    ), patch("src.links.tasks.populate_link_metadata.apply_async") as apply_async:
+        populate_link_metadata(link.id, link.url)
+    apply_async.assert_called_once_with((link.id, link.url), countdown=12)
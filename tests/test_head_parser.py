@@ -0,0 +1,96 @@
+import pytest
+from src.links.html import HeadParser, parse_head
+
+PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>
+  Never Gonna &amp; Give You Up
+</title>
+<meta name="description" content="A meta description">
+<meta property="og:title" content="Never Gonna (OG)">
+<meta property="og:description" content="Give you up &#8212; let you down">
+<link rel="stylesheet" href="/main.css">
+<link rel="Canonical" href="https://example.com/never-gonna">
+<script>var head = "</title><title>Not this</title>";</script>
+</head>
+<body>
+<meta property="og:description" content="Not from the body">
+<svg><title>Icon</title></svg>
+</body>
+</html>
+"""
+
+
+def test_parse_head():
+    assert parse_head([PAGE]) == {
+        "title": "Never Gonna & Give You Up",
+        "description": "Give you up — let you down",
+        "canonical_url": "https://example.com/never-gonna",
+    }
+
+
+@pytest.mark.parametrize("chunk_size", (1, 7, 64))
+def test_parse_head_in_chunks(chunk_size):
+    chunks = [PAGE[i : i + chunk_size] for i in range(0, len(PAGE), chunk_size)]
+    consumed = []
+
+    def feed():
+        for chunk in chunks:
+            consumed.append(chunk)
+            yield chunk
+
+    assert parse_head(feed()) == parse_head([PAGE])
+    # The body isn't read:
+    assert len("".join(consumed)) < PAGE.index("Not from the body")
+
+
+@pytest.mark.parametrize(
+    ("html", "metadata"),
+    (
+        (
+            '<HTML><HEAD><META NAME="description" CONTENT="Old school">'
+            "<TITLE>Legacy</TITLE><BODY><title>Late</title>",
+            {"title": "Legacy", "description": "Old school", "canonical_url": None},
+        ),
+        (
+            '<head><meta property="og:title" content=" Only OG "><title> </title>',
+            {"title": "Only OG", "description": None, "canonical_url": None},
+        ),
+        (
+            "<head><!-- <title>Commented out</title> --><title>A &gt; B</title>"
+            "<meta content='Quoted > and &quot;' name=description>",
+            {"title": "A > B", "description": 'Quoted > and "', "canonical_url": None},
+        ),
+        (
+            "<head><title>Cut off",
+            {"title": "Cut off", "description": None, "canonical_url": None},
+        ),
+        ("", {"title": None, "description": None, "canonical_url": None}),
+    ),
+)
+def test_parse_head_edge_cases(html, metadata):
+    assert parse_head([html]) == metadata
+
+
+def test_head_parser_stops_at_body():
+    parser = HeadParser()
+    parser.feed("<title>A</title><body>")
+    assert parser.done
+    parser.feed("<title>B</title>")
+    assert parser.metadata()["title"] == "A"
+
+
+def test_head_parser_stops_when_complete():
+    parser = HeadParser()
+    parser.feed(
+        '<head><title>A</title><link rel="canonical" href="https://a.com">'
+        '<meta property="og:description" content="B"><meta property="og:title" '
+    )
+    assert parser.done
+    assert parser.metadata() == {
+        "title": "A",
+        "description": "B",
+        "canonical_url": "https://a.com",
+    }
@@ -0,0 +1,60 @@
+import pytest
+from src.idempotency import IdempotencyStore
+from src.model import Link, OutboxMessage
+
+
+@pytest.mark.parametrize(
+    ("url", "body"),
+    (
+        ("/v1/links", {"url": "https://apple.com"}),
+        ("/v1/links/batch", {"links": [{"url": "https://apple.com"}]}),
+        ("/v1/import/json", {"links": [{"url": "https://apple.com"}]}),
+    ),
+)
+def test_retries_are_replayed(scoped_client, test_user, fake_redis, url, body):
+    """Retrying a request with the same Idempotency-Key should return the first
+    response, without saving the link (or queueing its metadata) again.
+    """
+    user, api_key = test_user
+    headers = {"x-api-key": api_key, "Idempotency-Key": "retry-me"}
+    first = scoped_client.post(url, headers=headers, json=body)
+    # Deleting the link shows the request isn't run again:
+    Link.query.delete()
+
+    retry = scoped_client.post(url, headers=headers, json=body)
+    assert (retry.status_code, retry.data) == (first.status_code, first.data)
+    assert retry.headers.get("Location") == first.headers.get("Location")
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert Link.query.count() == 0
+    assert OutboxMessage.query.count() <= 1
+
+
+def test_keys_are_per_request(scoped_client, test_user, fake_redis):
+    user, api_key = test_user
+    headers = {"x-api-key": api_key, "Idempotency-Key": "once"}
+    scoped_client.post("/v1/links", headers=headers, json={"url": "https://a.com"})
+    rv = scoped_client.post("/v1/links", headers=headers, json={"url": "https://b.com"})
+    assert rv.status_code == 422
+    assert Link.query.count() == 1
+
+
+def test_keys_in_progress(scoped_client, test_user, fake_redis):
+    user, api_key = test_user
+    store = IdempotencyStore()
+    store.claim(store.key(user.id, "link_bp.post_link", "busy"), "other")
+    rv = scoped_client.post(
+        "/v1/links",
+        headers={"x-api-key": api_key, "Idempotency-Key": "busy"},
+        json={"url": "https://a.com"},
+    )
+    assert rv.status_code == 409
+    assert Link.query.count() == 0
+
+
+def test_failed_requests_can_be_retried(scoped_client, test_user, fake_redis):
+    user, api_key = test_user
+    headers = {"x-api-key": api_key, "Idempotency-Key": "fix-it"}
+    rv = scoped_client.post("/v1/links", headers=headers, json={"url": "not a url"})
+    assert rv.status_code == 422
+    rv = scoped_client.post("/v1/links", headers=headers, json={"url": "https://a.com"})
+    assert rv.status_code == 201
@@ -0,0 +1,131 @@
+"""Regression tests making sure the link listing and search queries are
+served by indexes rather than sequential scans over the whole link table.
+"""
+
+import json
+import random
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import insert
+from src.model import Link, db
+from src.links.service import LinkService
+from .factories import UserFactory, CollectionFactory
+
+NUM_USERS = 30
+LINKS_PER_USER = 300
+SEARCH_LINKS = 20_000
+
+
+@pytest.fixture
+def seeded_user(scoped_app):
+    """Seeds a realistically-sized link table, and returns one of the users
+    along with one of their collections.
+    """
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    users = UserFactory.create_batch(NUM_USERS)
+    collections = [CollectionFactory(user=user, archived=False) for user in users]
+    db.session.flush()
+    rows = [
+        {
+            "user_id": user.id,
+            "date_added": now - timedelta(minutes=rng.randrange(500_000)),
+            "url": f"https://example.com/{user.id}/{n}",
+            "title": f"Link {n}",
+            "read": rng.random() < 0.5,
+            "collection_id": collection.id if rng.random() < 0.3 else None,
+        }
+        for user, collection in zip(users, collections)
+        for n in range(LINKS_PER_USER)
+    ]
+    db.session.execute(insert(Link), rows)
+    db.session.commit()
+    db.session.execute("analyze link")
+    return users[0], collections[0]
+
+
+@pytest.fixture
+def search_user(seeded_user):
+    """Seeds one user with enough links that going through all of them is
+    slower than searching the GIN index, and returns them. A few of their
+    links mention espresso.
+    """
+    user = UserFactory()
+    db.session.flush()
+    rows = [
+        {
+            "user_id": user.id,
+            "url": f"https://example.com/{user.id}/{n}",
+            "title": f"Espresso {n}" if n % 1000 == 0 else f"Link {n}",
+            "read": False,
+        }
+        for n in range(SEARCH_LINKS)
+    ]
+    db.session.execute(insert(Link), rows)
+    db.session.commit()
+    db.session.execute("analyze link")
+    return user
+
+
+def scanned_tables(plan: dict):
+    """Yields (node type, relation name) for every node in an EXPLAIN plan."""
+    yield plan["Node Type"], plan.get("Relation Name")
+    for child in plan.get("Plans", []):
+        yield from scanned_tables(child)
+
+
+def index_names(plan: dict):
+    """Yields the name of every index used in an EXPLAIN plan."""
+    if "Index Name" in plan:
+        yield plan["Index Name"]
+    for child in plan.get("Plans", []):
+        yield from index_names(child)
+
+
+def explain(query) -> dict:
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    result = db.session.connection().exec_driver_sql(
+        f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+    )
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+@pytest.mark.parametrize("show", ["all", "read", "unread"])
+@pytest.mark.parametrize("in_collection", [True, False])
+@pytest.mark.parametrize("with_cursor", [True, False])
+def test_link_listing_uses_indexes(seeded_user, show, in_collection, with_cursor):
+    user, collection = seeded_user
+    link_service = LinkService()
+    collection_id = collection.id if in_collection else None
+
+    query = link_service.filter_links(user.id, show, collection_id).order_by(
+        Link.date_added.desc(), Link.id.desc()
+    )
+    if with_cursor:
+        middle = query.offset(LINKS_PER_USER // 10).first()
+        query = query.filter(
+            db.tuple_(Link.date_added, Link.id) < link_service._cursor_for(middle)
+        )
+    plan = explain(query.limit(20))
+
+    nodes = list(scanned_tables(plan))
+    assert ("Seq Scan", "link") not in nodes, json.dumps(plan, indent=2)
+    assert any(relation == "link" for _, relation in nodes)
+
+
+def test_link_search_uses_index(search_user):
+    """The GIN index should be used to find a user's links matching rare
+    search terms, rather than going through all of their links.
+    """
+    # Freshly inserted rows sit in the GIN index's pending list (making it
+    # look expensive) until a vacuum merges them in, so merge them now:
+    db.session.execute("select gin_clean_pending_list('ix_link_search_vector')")
+    link_service = LinkService()
+    params = {"q": "espresso", "per_page": 20, "show": "all"}
+    query = link_service._search_query(search_user.id, params, ("id", "title"))
+    plan = explain(query.limit(params["per_page"] + 1))
+
+    assert "ix_link_search_vector" in index_names(plan), json.dumps(plan, indent=2)
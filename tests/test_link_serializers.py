@@ -0,0 +1,42 @@
+import pytest
+from unittest.mock import patch
+from flask import jsonify
+from src.links.service import LinkService
+from src.links.serializers import link_list_schema_for, link_page_response
+from src.model import Link
+from .factories import UserFactory, LinkFactory
+
+
+@pytest.mark.parametrize(
+    "field_names",
+    [
+        None,
+        ("id", "title", "url"),
+        ("date_added",),
+        ("collection_id", "description", "read"),
+    ],
+)
+@pytest.mark.parametrize("pretty", [True, False])
+def test_fast_path_matches_schema(scoped_app, field_names, pretty):
+    """Pages serialized from LinkRecords should be byte-identical to the
+    Marshmallow schema's output for the same ORM instances.
+    """
+    user = UserFactory()
+    LinkFactory(user=user, collection_id=None, title=None, description=None)
+    LinkFactory(user=user, collection_id=None, title="Café ☕️", read=True)
+    LinkFactory(user=user, collection_id=None, description='A <b>bold</b> "claim"')
+    params = {"page": 1, "per_page": 2, "show": "all", "field_names": field_names}
+
+    with patch.dict(scoped_app.config, {"JSONIFY_PRETTYPRINT_REGULAR": pretty}):
+        page = LinkService().get_many_links(user.id, params)
+        fast_body = link_page_response(page, field_names).get_data()
+
+        orm_page = {
+            **page,
+            "links": [Link.query.get(link.id) for link in page["links"]],
+        }
+        schema_body = jsonify(
+            link_list_schema_for(field_names).dump(orm_page)
+        ).get_data()
+
+    assert fast_body == schema_body
@@ -1,8 +1,17 @@
-from tests.factories import UserFactory, LinkFactory
+from tests.factories import UserFactory, LinkFactory, CollectionFactory
 from src.links.service import LinkService
+from src.counters import CounterService
+from src.exceptions import InvalidUsage
+from src.model import Link, OutboxMessage, db
+from sqlalchemy import event
 from werkzeug.exceptions import NotFound
 from unittest.mock import patch
+from requests import ConnectionError, Response
+from datetime import datetime, timedelta, timezone
+import io
 import pytest
+import threading
+import time
 
 SAMPLE_OG_DESCRIPTION_TAG = """
 <html>
@@ -106,13 +115,22 @@ def test_get_links_show_param(scoped_app, show_param):
         assert all((x == False for x in read_statuses))
 
 
+def html_response(body: bytes, content_type: str = "text/html") -> Response:
+    """A streamable response to return from a patched `requests.get`."""
+    response = Response()
+    response.status_code = 200
+    response.headers["Content-Type"] = content_type
+    response.raw = io.BytesIO(body)
+    return response
+
+
 def test_create_link_without_title(scoped_app):
     """When creating a link without a title, the service should
     try to fetch the title from the website's HTML
     """
 
-    with patch("src.links.service.requests") as mock_requests:
-        mock_requests.get.return_value.text = "<title>Never Gonna</title>"
+    with patch("src.links.fetch.requests.get") as get:
+        get.return_value = html_response(b"<title>Never Gonna</title>")
 
         link = LinkFactory(title=None)
         link.title = LinkService.extract_metadata_from_url(link.url).get("title")
@@ -127,8 +145,361 @@ def test_extract_metadata_from_url(scoped_app, sample_html):
     a title and either meta description/object graph description tags.
     """
 
-    with patch("src.links.service.requests") as mock_requests:
-        mock_requests.get.return_value.text = sample_html
+    with patch("src.links.fetch.requests.get") as get:
+        get.return_value = html_response(sample_html.encode("utf-8"))
         metadata = LinkService.extract_metadata_from_url("https://sample.com")
         assert metadata["title"] == "Never Gonna"
         assert metadata["description"] == "Give you up"
+
+
+def test_extract_metadata_from_urls(scoped_app):
+    """Pages in a batch should be fetched at the same time, and links not done
+    by the batch's deadline should be left for later.
+    """
+    # Both pages have to be requested before either is answered:
+    both_requested = threading.Barrier(2, timeout=5)
+
+    def get(url, **kwargs):
+        if url == "https://slow.com":
+            time.sleep(1)
+        elif url == "https://down.com":
+            raise ConnectionError()
+        else:
+            both_requested.wait()
+        return html_response(b"<title>Never Gonna</title>")
+
+    urls = {
+        1: "https://a.com",
+        2: "https://b.com",
+        3: "https://down.com",
+        4: "https://slow.com",
+    }
+    with patch.dict(scoped_app.config, {"METADATA_BATCH_DEADLINE": 0.5}), patch(
+        "src.links.fetch.requests.Session.get", side_effect=get
+    ):
+        metadata, retry_after = LinkService().extract_metadata_from_urls(urls)
+
+    found = {
+        "title": "Never Gonna",
+        "description": None,
+        "etag": None,
+        "last_modified": None,
+    }
+    assert metadata == {1: found, 2: found, 3: dict.fromkeys(found)}
+    assert retry_after == {4: 0}
+
+
+def test_update_links_metadata(scoped_app):
+    """Metadata for a batch of links should be written with a single UPDATE,
+    without overwriting titles given in the meantime.
+    """
+    user, other_user = UserFactory(), UserFactory()
+    untitled = LinkFactory(user=user, title=None, description="Kept")
+    retitled = LinkFactory(user=user, title="Given", collection_id=None)
+    other_users_link = LinkFactory(user=other_user, title=None, collection_id=None)
+    missing = LinkFactory(user=other_user, title=None, collection_id=None)
+    db.session.flush()
+    metadata = {
+        untitled.id: {"title": "A" * 600, "description": None},
+        retitled.id: {"title": "Found", "description": "Found"},
+        other_users_link.id: {"title": None, "description": "Found"},
+        missing.id: {"title": None, "description": None},
+        1000: {"title": "Deleted", "description": None},
+    }
+    version = user.data_version
+    statements = []
+
+    def record_statement(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record_statement)
+    try:
+        owners = LinkService().update_links_metadata(metadata)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record_statement)
+
+    assert owners == {
+        untitled.id: user.id,
+        retitled.id: user.id,
+        other_users_link.id: other_user.id,
+        missing.id: other_user.id,
+    }
+    assert len([s for s in statements if s.startswith("UPDATE link")]) == 1
+    assert (untitled.title, untitled.description) == ("A" * 512, "Kept")
+    assert (retitled.title, retitled.description) == ("Given", None)
+    assert (other_users_link.title, other_users_link.description) == (None, "Found")
+    assert untitled.change_seq == user.data_version > version
+
+
+def test_refresh_links_metadata(scoped_app):
+    """Links due for a refresh should be checked with conditional requests,
+    unread and recently saved first, and only updated if their pages changed.
+    """
+    user = UserFactory()
+    stale = datetime.now(timezone.utc) - timedelta(days=30)
+    fields = {"user": user, "collection_id": None, "metadata_checked_at": stale}
+    unchanged = LinkFactory(
+        url="https://a.com",
+        title="Same",
+        etag='"a1"',
+        read=False,
+        date_added=datetime(2021, 1, 1),
+        **fields,
+    )
+    changed = LinkFactory(
+        url="https://b.com",
+        title="Old",
+        last_modified="Wed, 21 Oct 2015 07:28:00 GMT",
+        read=False,
+        date_added=datetime(2020, 1, 1),
+        **fields,
+    )
+    LinkFactory(url="https://read.com", read=True, **fields)
+    LinkFactory(
+        url="https://older.com", read=False, date_added=datetime(2000, 1, 1), **fields
+    )
+    LinkFactory(url="https://edited.com", user=user, metadata_checked_at=None)
+    db.session.flush()
+    version, unchanged_seq = user.data_version, unchanged.change_seq
+    requested = {}
+
+    def get(url, headers, **kwargs):
+        requested[url] = headers
+        if url == "https://a.com":
+            response = html_response(b"")
+            response.status_code = 304
+            return response
+        response = html_response(b"<title>New</title>")
+        response.headers["ETag"] = '"b2"'
+        return response
+
+    with patch("src.links.fetch.requests.Session.get", side_effect=get):
+        counts = LinkService().refresh_links_metadata(2)
+
+    assert counts == {"checked": 2, "changed": 1, "deferred": 0}
+    assert requested["https://a.com"]["If-None-Match"] == '"a1"'
+    assert requested["https://b.com"]["If-Modified-Since"] == changed.last_modified
+    assert set(requested) == {"https://a.com", "https://b.com"}
+    assert (unchanged.title, unchanged.change_seq) == ("Same", unchanged_seq)
+    assert (changed.title, changed.etag) == ("New", '"b2"')
+    assert changed.change_seq == user.data_version > version
+    for link in (unchanged, changed):
+        assert link.metadata_checked_at > stale.replace(tzinfo=None)
+
+
+def test_user_edits_arent_refreshed(scoped_app):
+    link = LinkFactory(metadata_checked_at=datetime(2020, 1, 1), etag='"a1"')
+    LinkService().update_link(link, {"title": "Mine"})
+    assert (link.metadata_checked_at, link.etag) == (None, None)
+
+
+def test_get_links_cursor_pagination(scoped_app):
+    """Following next_cursor from page to page should visit every link exactly
+    once, newest first, and stop with no cursor on the last page.
+    """
+    user = UserFactory()
+    LinkFactory.create_batch(25, user=user, collection_id=None)
+    link_service = LinkService()
+    params = {"page": 1, "per_page": 10, "show": "all"}
+
+    response = link_service.get_many_links(user.id, params)
+    seen = [link.id for link in response["links"]]
+    while response["next_cursor"]:
+        params["cursor"] = response["next_cursor"]
+        response = link_service.get_many_links(user.id, params)
+        assert response["page"] is None
+        seen.extend(link.id for link in response["links"])
+
+    assert len(seen) == 25
+    assert len(set(seen)) == 25
+    positions = [link_service._cursor_for(link_service.get_link(id)) for id in seen]
+    assert positions == sorted(positions, reverse=True)
+
+
+def test_get_links_loads_only_requested_fields(scoped_app):
+    """Sparse fieldsets should be pushed down to the columns selected from the
+    database, along with anything needed to paginate.
+    """
+    user = UserFactory()
+    LinkFactory.create_batch(3, user=user, collection_id=None)
+    statements = []
+
+    def record_statement(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    params = {"page": 1, "per_page": 2, "show": "all", "field_names": ("url",)}
+    event.listen(db.engine, "before_cursor_execute", record_statement)
+    try:
+        response = LinkService().get_many_links(user.id, params)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record_statement)
+
+    listing_query = next(s for s in statements if "LIMIT" in s)
+    assert "link.url" in listing_query
+    assert "link.description" not in listing_query
+    assert "link.title" not in listing_query
+    for link in response["links"]:
+        assert link.url
+        assert not hasattr(link, "description")
+
+
+def test_update_links_by_filter(scoped_app):
+    """Bulk updates should only touch the user's links matching the filter,
+    and keep counters in step.
+    """
+    user = UserFactory()
+    collection = CollectionFactory(user=user, archived=False)
+    other_collection = CollectionFactory(user=user, archived=False)
+    LinkFactory.create_batch(3, user=user, collection_id=collection.id, read=False)
+    LinkFactory(user=user, collection_id=collection.id, read=True)
+    LinkFactory.create_batch(2, user=user, collection_id=None, read=False)
+    LinkFactory(collection_id=collection.id, read=False)  # Someone else's link
+    CounterService().recount()
+
+    link_service = LinkService()
+    version = user.data_version
+    selection = {"filter": {"show": "unread", "collection": collection.id}}
+    updated = link_service.update_links(user.id, selection, {"read": True})
+    assert updated == 3
+    assert user.data_version > version
+    assert Link.query.filter_by(user_id=user.id, read=False).count() == 2
+
+    # Links already in the target state aren't counted (or written):
+    selection = {"filter": {"show": "all", "collection": collection.id}}
+    changes = {"collection_id": other_collection.id, "read": True}
+    assert link_service.update_links(user.id, selection, changes) == 4
+
+    assert (collection.link_count, other_collection.read_link_count) == (0, 4)
+    assert CounterService().recount() == (0, 0)
+
+
+def test_delete_links_by_ids(scoped_app):
+    user = UserFactory()
+    links = LinkFactory.create_batch(3, user=user, collection_id=None)
+    someone_elses_link = LinkFactory(collection_id=None)
+    CounterService().recount()
+    ids = [links[0].id, links[1].id, someone_elses_link.id]
+
+    assert LinkService().delete_links(user.id, {"ids": ids}) == 2
+
+    assert user.link_count == 1
+    assert Link.query.get(someone_elses_link.id) is not None
+    assert CounterService().recount() == (0, 0)
+
+
+def test_search_links(scoped_app):
+    """Search should match titles, descriptions and URL words, rank title
+    matches first, and page through results with a cursor.
+    """
+    user = UserFactory()
+    in_url = LinkFactory(
+        user=user,
+        collection_id=None,
+        read=False,
+        title="Other",
+        description=None,
+        url="https://example.com/cooking/pasta",
+    )
+    in_description = LinkFactory(
+        user=user,
+        collection_id=None,
+        read=False,
+        title="Dinner ideas",
+        description="Fresh pasta recipes",
+        url="https://example.com/a",
+    )
+    in_title = LinkFactory(
+        user=user,
+        collection_id=None,
+        read=False,
+        title="Pasta recipes",
+        description=None,
+        url="https://example.com/b",
+    )
+    LinkFactory(
+        user=user,
+        collection_id=None,
+        read=True,
+        title="Pasta",
+        url="https://example.com/c",
+    )
+    LinkFactory(
+        collection_id=None, read=False, title="Pasta", url="https://example.com/d"
+    )
+    db.session.commit()
+
+    link_service = LinkService()
+    params = {"q": "pasta", "per_page": 2, "show": "unread"}
+    first_page = link_service.search_links(user.id, params)
+    assert [link.id for link in first_page["links"]] == [in_title.id, in_description.id]
+    assert first_page["next_cursor"]
+
+    second_page = link_service.search_links(
+        user.id, {**params, "cursor": first_page["next_cursor"]}
+    )
+    assert [link.id for link in second_page["links"]] == [in_url.id]
+    assert second_page["next_cursor"] is None
+
+    # Stemming applies to titles and descriptions:
+    params = {"q": "recipe", "per_page": 20, "show": "unread"}
+    results = link_service.search_links(user.id, params)
+    assert {link.id for link in results["links"]} == {in_title.id, in_description.id}
+
+
+def test_create_link_returns_existing_duplicate(scoped_app):
+    """Saving a URL the user already has should return their existing link,
+    without counting it or fetching its metadata again.
+    """
+    user = UserFactory()
+    link_service = LinkService()
+    link = link_service.create_link(
+        Link(url="https://example.com/a", title="A", user_id=user.id, read=True)
+    )
+    version = user.data_version
+
+    duplicate = link_service.create_link(
+        Link(url="http://www.example.com/a/?utm_source=rss", user_id=user.id)
+    )
+    assert duplicate.id == link.id
+    assert duplicate.read is True
+    assert OutboxMessage.query.count() == 0
+    assert (user.link_count, user.data_version) == (1, version)
+
+    # Other users can save the same URL:
+    other_link = link_service.create_link(
+        Link(url="https://example.com/a", title="A", user_id=UserFactory().id)
+    )
+    assert other_link.id != link.id
+
+
+def test_create_link_bumps_duplicate(scoped_app):
+    user = UserFactory()
+    link_service = LinkService()
+    link = link_service.create_link(
+        Link(url="https://example.com/a", title="A", user_id=user.id, read=True)
+    )
+    date_added = link.date_added
+
+    with patch.dict(scoped_app.config, {"DUPLICATE_LINKS": "bump"}):
+        duplicate = link_service.create_link(
+            Link(url="https://example.com/a", user_id=user.id)
+        )
+    assert duplicate.id == link.id
+    assert duplicate.date_added > date_added
+    assert duplicate.read is False
+    assert (user.link_count, user.read_link_count) == (1, 0)
+
+
+def test_update_link_to_duplicate_url(scoped_app):
+    user = UserFactory()
+    link_service = LinkService()
+    first = link_service.create_link(
+        Link(url="https://example.com/a", title="A", user_id=user.id)
+    )
+    second = link_service.create_link(
+        Link(url="https://example.com/b", title="B", user_id=user.id)
+    )
+    with pytest.raises(InvalidUsage) as e:
+        link_service.update_link(second, {"url": "https://example.com/a/"})
+    assert e.value.status_code == 409
+    assert e.value.payload == {"link_id": first.id}
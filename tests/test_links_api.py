@@ -1,6 +1,13 @@
+import gzip
+import json
 import pytest
-from src.model import Link, LinkSchema
-from .factories import LinkFactory
+from sqlalchemy import event
+from unittest.mock import patch
+from src.auth.service import AuthService
+from src.links.quick_save import QuickSaveQueue
+from src.links.service import LinkService
+from src.model import Link, LinkSchema, OutboxMessage, db
+from .factories import LinkFactory, UserFactory
 
 
 def test_no_api_key_should_401(scoped_client):
@@ -38,6 +45,30 @@ def test_links_response(scoped_client, test_user):
     assert "per_page" in json_data
     assert "page" in json_data
     assert "total_pages" in json_data
+    assert "next_cursor" in json_data
+
+
+def test_links_cursor(scoped_client, test_user):
+    """Passing next_cursor back as the cursor param should return the next
+    page of links, and a malformed cursor should fail validation.
+    """
+    user, api_key = test_user
+    LinkFactory.create_batch(3, user=user, collection_id=None, read=False)
+    rv = scoped_client.get("/v1/links?per_page=2", headers={"x-api-key": api_key})
+    first_page = rv.get_json()
+    assert first_page["next_cursor"]
+
+    rv = scoped_client.get(
+        f"/v1/links?per_page=2&cursor={first_page['next_cursor']}",
+        headers={"x-api-key": api_key},
+    )
+    second_page = rv.get_json()
+    assert len(second_page["links"]) == 1
+    assert second_page["next_cursor"] is None
+
+    rv = scoped_client.get("/v1/links?cursor=nope", headers={"x-api-key": api_key})
+    assert rv.status_code == 422
+    assert "cursor" in rv.get_json()["issues"]
 
 
 @pytest.mark.parametrize(
@@ -170,3 +201,421 @@ def test_link_patch(
             updated_link = Link.query.get(link.id)
             for key, value in payload.items():
                 assert getattr(updated_link, key) == value
+
+
+def test_links_sparse_fields(scoped_client, test_user):
+    """The fields param should restrict the link fields returned from both
+    the listing and single link endpoints.
+    """
+    user, api_key = test_user
+    link = LinkFactory(user=user, collection_id=None, read=False)
+    headers = {"x-api-key": api_key}
+
+    rv = scoped_client.get("/v1/links?fields=id,url,title", headers=headers)
+    json_data = rv.get_json()
+    assert set(json_data["links"][0]) == {"id", "url", "title"}
+    assert "total_links" in json_data
+
+    rv = scoped_client.get(f"/v1/links/{link.id}?fields=url", headers=headers)
+    assert rv.get_json() == {"url": link.url}
+
+
+@pytest.mark.parametrize(
+    "url", ["/v1/links?fields=id,nope", "/v1/links/1?fields=user_id"]
+)
+def test_links_sparse_fields_invalid(scoped_client, test_user, url):
+    user, api_key = test_user
+    rv = scoped_client.get(url, headers={"x-api-key": api_key})
+    assert rv.status_code == 422
+    assert "fields" in rv.get_json()["issues"]
+
+
+def _export_lines(scoped_client, api_key: str, **headers) -> list:
+    rv = scoped_client.get(
+        "/v1/links/export", headers={"x-api-key": api_key, **headers}
+    )
+    assert rv.status_code == 200
+    assert rv.is_streamed
+    assert rv.mimetype == "application/x-ndjson"
+    body = rv.data
+    if rv.content_encoding == "gzip":
+        body = gzip.decompress(body)
+    return [json.loads(line) for line in body.decode("utf-8").splitlines()]
+
+
+def test_export_links(scoped_client, test_user):
+    """Exporting should stream every link as one JSON object per line, oldest
+    first, and gzip the stream when the client accepts it.
+    """
+    user, api_key = test_user
+    links = LinkFactory.create_batch(5, user=user, collection_id=None)
+    LinkFactory(collection_id=None)  # Someone else's link
+
+    lines = _export_lines(scoped_client, api_key)
+    assert [line["id"] for line in lines] == [link.id for link in links]
+    assert lines == LinkSchema(many=True).dump(links)
+
+    assert _export_lines(scoped_client, api_key, **{"Accept-Encoding": "gzip"}) == lines
+
+
+def test_export_links_round_trips_through_import(scoped_client, test_user):
+    """Lines from an export should import as the same links."""
+    user, api_key = test_user
+    LinkFactory.create_batch(3, user=user, collection_id=None, title="Título ✓")
+    exported = _export_lines(scoped_client, api_key)
+
+    other_user = UserFactory()
+    api_pair = AuthService.generate_api_key()
+    other_user.api_key = api_pair.hashed_key
+    rv = scoped_client.post(
+        "/v1/import/json",
+        json={"links": exported},
+        headers={"x-api-key": api_pair.api_key},
+    )
+    assert rv.get_json()["links_imported"] == 3
+
+    imported = _export_lines(scoped_client, api_pair.api_key)
+    ignored = ("id", "user_id")
+    assert [
+        {k: v for k, v in line.items() if k not in ignored} for line in imported
+    ] == [{k: v for k, v in line.items() if k not in ignored} for line in exported]
+
+
+def test_post_links_batch(scoped_client, test_user):
+    """Valid links in a batch should be created with a single INSERT, and
+    invalid ones reported by position without failing the rest.
+    """
+    user, api_key = test_user
+    statements = []
+
+    def record_statement(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record_statement)
+    try:
+        rv = scoped_client.post(
+            "/v1/links/batch",
+            headers={"x-api-key": api_key},
+            json={
+                "links": [
+                    {"url": "https://apple.com", "title": "Apple"},
+                    {"url": "not a url", "title": "Nope"},
+                    {"url": "https://google.com", "title": "Google", "read": True},
+                    {"url": "https://github.com", "title": "G" * 513},
+                ]
+            },
+        )
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record_statement)
+
+    assert rv.status_code == 207
+    json_data = rv.get_json()
+    assert json_data["links_created"] == 2
+    assert json_data["errors"] == 2
+    statuses = [result["status"] for result in json_data["results"]]
+    assert statuses == [201, 422, 201, 422]
+    assert "url" in json_data["results"][1]["issues"]
+    assert "title" in json_data["results"][3]["issues"]
+    assert json_data["results"][0]["link"]["title"] == "Apple"
+    assert json_data["results"][2]["link"]["read"] is True
+    assert len([s for s in statements if s.startswith("INSERT INTO link")]) == 1
+
+    created_ids = [json_data["results"][i]["link"]["id"] for i in (0, 2)]
+    links = Link.query.filter(Link.id.in_(created_ids)).order_by(Link.id).all()
+    assert [link.url for link in links] == ["https://apple.com", "https://google.com"]
+    assert all(link.user_id == user.id for link in links)
+    assert user.link_count == 2
+    assert user.read_link_count == 1
+
+
+@pytest.mark.parametrize(
+    "item, field",
+    (
+        ({"url": "https://apple.com/" + "a" * 2048}, "url"),
+        ({"url": "https://apple.com", "collection_id": 2**31}, "collection_id"),
+        ({"url": "https://apple.com", "collection_id": 0}, "collection_id"),
+    ),
+)
+def test_post_links_batch_checks_column_limits(scoped_client, test_user, item, field):
+    """Values that don't fit their columns should fail their own item, not
+    the INSERT for the whole batch.
+    """
+    user, api_key = test_user
+    rv = scoped_client.post(
+        "/v1/links/batch",
+        headers={"x-api-key": api_key},
+        json={"links": [{"url": "https://google.com"}, item]},
+    )
+    assert rv.status_code == 207
+    results = rv.get_json()["results"]
+    assert [result["status"] for result in results] == [201, 422]
+    assert list(results[1]["issues"]) == [field]
+
+
+def test_post_link_quick_save(scoped_client, test_user, fake_redis):
+    """Quick saves should only be queued, and saved in a batch later (links
+    that turn out to be invalid are left out).
+    """
+    user, api_key = test_user
+    headers = {"x-api-key": api_key}
+    rv = scoped_client.post(
+        "/v1/links?async=1",
+        headers=headers,
+        json={"url": "https://apple.com", "title": "Apple"},
+    )
+    assert rv.status_code == 202
+    assert rv.get_json()["status"] == "queued"
+    scoped_client.post(
+        "/v1/links?async=1",
+        headers=headers,
+        json={"url": "https://google.com", "read": "maybe"},
+    )
+    assert Link.query.count() == 0
+
+    assert LinkService().save_queued_links(batch_size=1) == {"saved": 1, "failed": 1}
+    link = Link.query.one()
+    assert (link.url, link.title, link.user_id) == (
+        "https://apple.com",
+        "Apple",
+        user.id,
+    )
+    assert fake_redis.llen(QuickSaveQueue.KEY) == 0
+
+
+def test_quick_save_skips_links_the_database_rejects(test_user, fake_redis):
+    """A queued link that's valid but can't be inserted shouldn't hold up the
+    rest of the queue.
+    """
+    user, api_key = test_user
+    db.session.commit()
+    queue = QuickSaveQueue()
+    # A user deleted since they queued it:
+    queue.push(user.id + 1000, {"url": "https://apple.com"})
+    queue.push(user.id, {"url": "https://google.com"})
+
+    assert LinkService().save_queued_links(batch_size=10) == {"saved": 1, "failed": 1}
+    assert [link.url for link in Link.query] == ["https://google.com"]
+    assert fake_redis.llen(QuickSaveQueue.KEY) == 0
+
+
+@pytest.mark.parametrize("url", ("apple", "ftp://apple.com", "https://apple", None))
+def test_post_link_quick_save_checks_url(scoped_client, test_user, fake_redis, url):
+    user, api_key = test_user
+    rv = scoped_client.post(
+        "/v1/links?async=1", headers={"x-api-key": api_key}, json={"url": url}
+    )
+    assert rv.status_code == 422
+    assert fake_redis.llen(QuickSaveQueue.KEY) == 0
+
+
+def test_post_link_quick_save_needs_redis(scoped_client, test_user):
+    user, api_key = test_user
+    rv = scoped_client.post(
+        "/v1/links?async=1",
+        headers={"x-api-key": api_key},
+        json={"url": "https://apple.com"},
+    )
+    assert rv.status_code == 201
+
+
+def test_post_links_batch_sends_untitled_links_in_one_task(scoped_client, test_user):
+    user, api_key = test_user
+    rv = scoped_client.post(
+        "/v1/links/batch",
+        headers={"x-api-key": api_key},
+        json={
+            "links": [
+                {"url": "https://apple.com"},
+                {"url": "https://google.com", "title": "Google"},
+                {"url": "https://github.com"},
+            ]
+        },
+    )
+    assert rv.status_code == 201
+    ids = [result["link"]["id"] for result in rv.get_json()["results"]]
+    message = OutboxMessage.query.one()
+    assert message.task == "src.tasks.populate_links_metadata"
+    assert message.args == [
+        [[ids[0], "https://apple.com"], [ids[2], "https://github.com"]]
+    ]
+
+
+@pytest.mark.parametrize(
+    "body", ({}, {"links": []}, {"links": [{"url": "https://apple.com"}] * 501})
+)
+def test_post_links_batch_invalid_body(scoped_client, test_user, body):
+    user, api_key = test_user
+    rv = scoped_client.post(
+        "/v1/links/batch", headers={"x-api-key": api_key}, json=body
+    )
+    assert rv.status_code == 422
+    assert "links" in rv.get_json()["issues"]
+
+
+def test_bulk_update_and_delete_links(scoped_client, test_user):
+    user, api_key = test_user
+    links = LinkFactory.create_batch(3, user=user, collection_id=None, read=False)
+    headers = {"x-api-key": api_key}
+
+    rv = scoped_client.patch(
+        "/v1/links",
+        headers=headers,
+        json={"ids": [link.id for link in links[:2]], "changes": {"read": True}},
+    )
+    assert rv.get_json()["links_updated"] == 2
+
+    rv = scoped_client.delete(
+        "/v1/links", headers=headers, json={"filter": {"show": "read"}}
+    )
+    assert rv.get_json()["links_deleted"] == 2
+    assert [link.id for link in Link.query.filter_by(user_id=user.id)] == [links[2].id]
+
+
+@pytest.mark.parametrize(
+    "body",
+    (
+        {},
+        {"ids": [1], "filter": {"show": "all"}, "changes": {"read": True}},
+        {"ids": [1], "changes": {}},
+        {"ids": [1], "changes": {"title": "Not allowed in bulk"}},
+        {"filter": {"show": "archived"}, "changes": {"read": True}},
+    ),
+)
+def test_bulk_update_links_invalid_body(scoped_client, test_user, body):
+    user, api_key = test_user
+    rv = scoped_client.patch("/v1/links", headers={"x-api-key": api_key}, json=body)
+    assert rv.status_code == 422
+
+
+def test_search_links(scoped_client, test_user):
+    user, api_key = test_user
+    link = LinkFactory(user=user, collection_id=None, read=False, title="Espresso")
+    LinkFactory(user=user, collection_id=None, read=False, title="Tea")
+    headers = {"x-api-key": api_key}
+
+    rv = scoped_client.get(
+        "/v1/links/search?q=espresso&fields=id,title", headers=headers
+    )
+    assert rv.status_code == 200
+    assert rv.get_json() == {
+        "links": [{"id": link.id, "title": "Espresso"}],
+        "next_cursor": None,
+        "per_page": 20,
+    }
+
+    rv = scoped_client.get("/v1/links/search", headers=headers)
+    assert rv.status_code == 422
+    assert "q" in rv.get_json()["issues"]
+
+
+def test_search_links_pages_through_tied_ranks(scoped_client, test_user):
+    """Links ranked the same (with a rank that isn't exact as a float) should
+    all be reachable through the cursor, one page at a time.
+    """
+    user, api_key = test_user
+    links = [
+        LinkFactory(
+            user=user,
+            collection_id=None,
+            read=False,
+            title="Other",
+            description="Fresh coffee",
+            url=f"https://example.com/{i}",
+        )
+        for i in range(5)
+    ]
+    headers = {"x-api-key": api_key}
+
+    seen = []
+    url = "/v1/links/search?q=coffee&per_page=1"
+    rv = scoped_client.get(url, headers=headers)
+    while True:
+        seen.extend(link["id"] for link in rv.get_json()["links"])
+        cursor = rv.get_json()["next_cursor"]
+        if not cursor:
+            break
+        rv = scoped_client.get(f"{url}&cursor={cursor}", headers=headers)
+
+    assert seen == sorted((link.id for link in links), reverse=True)
+
+
+def test_post_duplicate_links(scoped_client, test_user):
+    """Saving a URL again should return the existing link with a 200, both one
+    at a time and in batches.
+    """
+    user, api_key = test_user
+    headers = {"x-api-key": api_key}
+    rv = scoped_client.post(
+        "/v1/links", headers=headers, json={"url": "https://apple.com", "title": "A"}
+    )
+    assert rv.status_code == 201
+    link_id = rv.get_json()["id"]
+
+    rv = scoped_client.post(
+        "/v1/links", headers=headers, json={"url": "http://www.apple.com/"}
+    )
+    assert rv.status_code == 200
+    assert rv.get_json()["id"] == link_id
+
+    rv = scoped_client.post(
+        "/v1/links/batch",
+        headers=headers,
+        json={
+            "links": [
+                {"url": "https://apple.com/?utm_source=x"},
+                {"url": "https://google.com", "title": "Google"},
+                {"url": "https://www.google.com", "title": "Google again"},
+            ]
+        },
+    )
+    json_data = rv.get_json()
+    assert [result["status"] for result in json_data["results"]] == [200, 201, 200]
+    assert json_data["links_created"] == 1
+    assert json_data["results"][0]["link"]["id"] == link_id
+    ids = [result["link"]["id"] for result in json_data["results"][1:]]
+    assert ids[0] == ids[1]
+    assert user.link_count == 2
+
+    rv = scoped_client.post(
+        "/v1/import/json",
+        headers=headers,
+        json={"links": [{"url": "https://apple.com"}, {"url": "https://github.com"}]},
+    )
+    assert rv.get_json()["links_imported"] == 1
+    assert rv.get_json()["duplicates"] == 1
+
+
+def test_lookup_links(scoped_client, test_user, fake_redis):
+    """Looking up URLs should return the IDs of saved links, and answer for
+    URLs ruled out by the filter without querying the links table.
+    """
+    user, api_key = test_user
+    headers = {"x-api-key": api_key}
+    rv = scoped_client.post(
+        "/v1/links", headers=headers, json={"url": "https://apple.com", "title": "A"}
+    )
+    link_id = rv.get_json()["id"]
+    LinkFactory(collection_id=None, url="https://google.com")  # Someone else's
+
+    urls = ["http://www.apple.com/", "https://google.com", "https://github.com"]
+    statements = []
+
+    def record_statement(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    rv = scoped_client.post("/v1/links/lookup", headers=headers, json={"urls": urls})
+    assert rv.get_json()["results"] == [
+        {"url": "http://www.apple.com/", "link_id": link_id},
+        {"url": "https://google.com", "link_id": None},
+        {"url": "https://github.com", "link_id": None},
+    ]
+
+    event.listen(db.engine, "before_cursor_execute", record_statement)
+    try:
+        rv = scoped_client.post(
+            "/v1/links/lookup", headers=headers, json={"urls": urls[1:]}
+        )
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record_statement)
+    assert [result["link_id"] for result in rv.get_json()["results"]] == [None, None]
+    assert not [s for s in statements if "FROM link" in s]
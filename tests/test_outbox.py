@@ -0,0 +1,69 @@
+import pytest
+from unittest.mock import call, patch
+from kombu.exceptions import OperationalError
+from src.links.service import LinkService
+from src.model import Link, OutboxMessage, db
+from src.outbox import Outbox
+from .factories import UserFactory
+
+
+def test_new_links_queue_tasks_in_their_transaction(scoped_app):
+    """Saving a link shouldn't talk to the broker, and its task should only be
+    queued if the link is committed.
+    """
+    user = UserFactory()
+    db.session.commit()
+    with patch("src.outbox.celery.send_task") as send_task:
+        link = LinkService().create_link(
+            Link(url="https://example.com", user_id=user.id)
+        )
+    send_task.assert_not_called()
+    message = OutboxMessage.query.one()
+    assert (message.task, message.args) == (
+        "src.tasks.populate_link_metadata",
+        [link.id, "https://example.com"],
+    )
+
+    Outbox().add("src.tasks.populate_link_metadata", 1, "https://rolled.back")
+    db.session.rollback()
+    assert OutboxMessage.query.count() == 1
+
+
+def test_relay_outbox(scoped_app):
+    outbox = Outbox()
+    outbox.add_many("src.tasks.populate_link_metadata", [(1, "a"), (2, "b"), (3, "c")])
+    db.session.commit()
+
+    with patch("src.outbox.celery.send_task") as send_task:
+        assert outbox.relay(batch_size=2) == 3
+
+    assert send_task.call_args_list == [
+        call("src.tasks.populate_link_metadata", args=[1, "a"]),
+        call("src.tasks.populate_link_metadata", args=[2, "b"]),
+        call("src.tasks.populate_link_metadata", args=[3, "c"]),
+    ]
+    assert OutboxMessage.query.count() == 0
+
+
+def test_relay_outbox_keeps_unsent_tasks(scoped_app):
+    """Tasks the broker didn't take should stay in the outbox, for the next
+    relay to send.
+    """
+    outbox = Outbox()
+    outbox.add_many("src.tasks.populate_link_metadata", [(1, "a"), (2, "b")])
+    db.session.commit()
+
+    with patch(
+        "src.outbox.celery.send_task", side_effect=[None, OperationalError()]
+    ), pytest.raises(OperationalError):
+        outbox.relay()
+
+    assert [message.args for message in OutboxMessage.query] == [[2, "b"]]
+
+
+def test_relay_outbox_command(scoped_app, runner):
+    Outbox().add("src.tasks.populate_link_metadata", 1, "a")
+    db.session.commit()
+    with patch("src.outbox.celery.send_task"):
+        result = runner.invoke(args=["admin", "relay_outbox"])
+    assert "Relayed 1 task(s)." in result.output
@@ -0,0 +1,126 @@
+import time
+import pytest
+from src.model import LinkTombstone, SyncResultsSchema
+from .factories import CollectionFactory, LinkFactory
+
+
+def sync(client, api_key, token=None, limit=None):
+    params = {}
+    if token:
+        params["since"] = token
+    if limit:
+        params["limit"] = limit
+    return client.get("/v1/sync", headers={"x-api-key": api_key}, query_string=params)
+
+
+def test_sync_returns_only_changes_since_token(scoped_client, test_user):
+    user, api_key = test_user
+    headers = {"x-api-key": api_key}
+    collection = CollectionFactory(user=user, archived=False)
+    rv = scoped_client.post(
+        "/v1/links/batch",
+        headers=headers,
+        json={
+            "links": [
+                {"url": f"https://example.com/{n}", "title": f"Link {n}"}
+                for n in range(3)
+            ]
+        },
+    )
+    link_ids = [result["link"]["id"] for result in rv.get_json()["results"]]
+
+    rv = sync(scoped_client, api_key)
+    assert rv.status_code == 200
+    body = rv.get_json()
+    assert body["has_more"] is False
+    assert [c["id"] for c in body["collections"]] == [collection.id]
+    assert [link["id"] for link in body["links"]] == link_ids
+    assert body["deleted_links"] == []
+
+    # Nothing changed yet:
+    rv = sync(scoped_client, api_key, body["next_token"])
+    assert rv.get_json()["links"] == []
+    token = rv.get_json()["next_token"]
+
+    scoped_client.patch(
+        f"/v1/links/{link_ids[0]}", headers=headers, json={"read": True}
+    )
+    scoped_client.delete(f"/v1/links/{link_ids[1]}", headers=headers)
+    rv = scoped_client.post(
+        "/v1/links",
+        headers=headers,
+        json={"url": "https://example.com/new", "title": "New"},
+    )
+    new_link_id = rv.get_json()["id"]
+
+    body = sync(scoped_client, api_key, token).get_json()
+    assert [link["id"] for link in body["links"]] == [link_ids[0], new_link_id]
+    assert body["links"][0]["read"] is True
+    assert body["deleted_links"] == [link_ids[1]]
+    assert body["collections"] == []
+
+    # Bulk deletes leave tombstones too:
+    scoped_client.delete("/v1/links", headers=headers, json={"ids": [link_ids[2]]})
+    body = sync(scoped_client, api_key, body["next_token"]).get_json()
+    assert body["links"] == []
+    assert body["deleted_links"] == [link_ids[2]]
+
+
+def test_sync_pages_through_every_change(scoped_client, test_user):
+    user, api_key = test_user
+    collections = CollectionFactory.create_batch(2, user=user, archived=False)
+    links = LinkFactory.create_batch(5, user=user, collection_id=None)
+
+    seen_collections, seen_links = [], []
+    token = None
+    for _ in range(10):
+        body = sync(scoped_client, api_key, token, limit=2).get_json()
+        assert len(body["collections"]) + len(body["links"]) <= 2
+        seen_collections += [c["id"] for c in body["collections"]]
+        seen_links += [link["id"] for link in body["links"]]
+        token = body["next_token"]
+        if not body["has_more"]:
+            break
+
+    assert sorted(seen_collections) == sorted(c.id for c in collections)
+    assert sorted(seen_links) == sorted(link.id for link in links)
+
+
+def test_sync_expired_token(scoped_app, scoped_client, test_user):
+    user, api_key = test_user
+    old_token = SyncResultsSchema().dump(
+        {
+            "next_token": {
+                "since": 0,
+                "until": 0,
+                "stage": "collections",
+                "position": None,
+                "issued_at": int(time.time())
+                - (scoped_app.config["SYNC_TOMBSTONE_DAYS"] + 1) * 86400,
+            }
+        }
+    )["next_token"]
+
+    rv = sync(scoped_client, api_key, old_token)
+    assert rv.status_code == 410
+
+
+@pytest.mark.parametrize("token", ("not-a-token", "MXwyfG5vcGV8fHww"))
+def test_sync_invalid_token(scoped_client, test_user, token):
+    user, api_key = test_user
+    rv = sync(scoped_client, api_key, token)
+    assert rv.status_code == 422
+
+
+def test_prune_tombstones(runner, scoped_client, test_user):
+    user, api_key = test_user
+    links = LinkFactory.create_batch(2, user=user, collection_id=None)
+    for link in links:
+        scoped_client.delete(f"/v1/links/{link.id}", headers={"x-api-key": api_key})
+    assert LinkTombstone.query.count() == 2
+
+    result = runner.invoke(args=["admin", "prune_tombstones", "--days", "1"])
+    assert "Deleted 0 tombstone(s)" in result.output
+    result = runner.invoke(args=["admin", "prune_tombstones", "--days", "-1"])
+    assert "Deleted 2 tombstone(s)" in result.output
+    assert LinkTombstone.query.count() == 0
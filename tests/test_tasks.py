@@ -0,0 +1,41 @@
+import threading
+from unittest.mock import patch
+from flask import current_app
+from src import celery, init_celery
+from src.tasks import populate_link_metadata, relay_outbox
+from src.model import db
+
+
+def test_metadata_task_skips_deleted_links(scoped_app):
+    with patch(
+        "src.links.service.LinkService.extract_metadata_from_url"
+    ) as extract_metadata:
+        populate_link_metadata(1000, "https://example.com")
+    extract_metadata.assert_not_called()
+
+
+def test_tasks_run_in_their_own_app_context(scoped_app):
+    """Tasks run by a worker should get a fresh app context (and database
+    session) from the worker's app, and give them back once done.
+    """
+    apps = []
+    sessions = []
+
+    def relay():
+        apps.append(current_app._get_current_object())
+        sessions.append(db.session())
+        return 0
+
+    init_celery(scoped_app)
+    try:
+        with patch("src.outbox.Outbox.relay", side_effect=relay):
+            # Worker threads have no app context of their own:
+            thread = threading.Thread(target=relay_outbox)
+            thread.start()
+            thread.join()
+    finally:
+        celery.flask_app = None
+
+    assert apps == [scoped_app]
+    # The session was removed with the context, and isn't the test's:
+    assert sessions[0] is not db.session()
@@ -0,0 +1,30 @@
+import pytest
+from src.links.urls import normalize_url, url_hash
+
+
+@pytest.mark.parametrize(
+    ("url", "normalized"),
+    (
+        ("https://example.com", "example.com/"),
+        ("http://www.Example.com/", "example.com/"),
+        ("https://example.com:443/a/b/", "example.com/a/b"),
+        ("https://example.com:8080/a", "example.com:8080/a"),
+        ("https://example.com/A?b=2&a=1", "example.com/A?a=1&b=2"),
+        (
+            "https://example.com/a?utm_source=rss&UTM_Medium=x&fbclid=1&id=3",
+            "example.com/a?id=3",
+        ),
+        ("https://example.com/a#comments", "example.com/a"),
+        ("https://example.com/#!/inbox", "example.com/#!/inbox"),
+        ("ftp://example.com/file", "ftp://example.com/file"),
+    ),
+)
+def test_normalize_url(url, normalized):
+    assert normalize_url(url) == normalized
+
+
+def test_url_hash():
+    assert url_hash("https://www.example.com/a/?utm_campaign=x") == url_hash(
+        "http://example.com/a"
+    )
+    assert url_hash("https://example.com/a") != url_hash("https://example.com/b")